@@ -0,0 +1,140 @@
+"""
+Predicción por lotes de partidos (jornada completa) sin pasar por el modo interactivo.
+
+Carga dataset, estado de serving y modelos UNA sola vez, construye todos los
+vectores de features y ejecuta una única pasada por modelo sobre el lote.
+
+Entrada: CSV o NDJSON con columnas estilo football-data
+    HomeTeam, AwayTeam, AvgH, AvgD, AvgA, Div (Div opcional)
+    (también se aceptan home, away, h, d, a, league)
+
+Salida: NDJSON (.ndjson/.jsonl), CSV (.csv) o Parquet (.parquet), una fila por partido.
+Con --ladder se escribe además la escalera completa de líneas over/under de
+corners y tiros (markets.ladder_table), una fila por partido, mercado, lado y línea.
+
+Uso:
+    python src/batch_predict.py jornada.csv -o data/predicciones_jornada.csv
+    python src/batch_predict.py jornada.csv --ladder data/lineas_jornada.csv
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import pandas as pd
+
+# Alias de columnas aceptados en la entrada
+COLUMN_ALIASES = {
+    'home': 'HomeTeam', 'away': 'AwayTeam',
+    'h': 'AvgH', 'd': 'AvgD', 'a': 'AvgA',
+    'league': 'Div',
+}
+REQUIRED_COLUMNS = ['HomeTeam', 'AwayTeam', 'AvgH', 'AvgD', 'AvgA']
+
+
+def read_fixtures(path):
+    """
+    Lee la lista de partidos desde CSV o NDJSON.
+
+    Returns:
+        list: dicts con HomeTeam, AwayTeam, AvgH, AvgD, AvgA y Div
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.ndjson', '.jsonl', '.json'):
+        with open(path, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        fixtures = pd.DataFrame(rows)
+    else:
+        fixtures = pd.read_csv(path)
+
+    fixtures = fixtures.rename(columns={k: v for k, v in COLUMN_ALIASES.items() if k in fixtures.columns})
+    missing = [c for c in REQUIRED_COLUMNS if c not in fixtures.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas en {path}: {', '.join(missing)}")
+    if 'Div' not in fixtures.columns:
+        fixtures['Div'] = None
+    fixtures = fixtures[REQUIRED_COLUMNS + ['Div']]
+    fixtures = fixtures.astype(object).where(fixtures.notna(), None)
+    return fixtures.to_dict('records')
+
+
+def write_predictions(records, path):
+    """Escribe las predicciones según la extensión del archivo de salida."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.ndjson', '.jsonl'):
+        with open(path, 'w', encoding='utf-8') as f:
+            for rec in records:
+                clean = {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in rec.items()}
+                f.write(json.dumps(clean, ensure_ascii=False) + '\n')
+    elif ext == '.parquet':
+        pd.DataFrame(records).to_parquet(path, index=False)
+    else:
+        pd.DataFrame(records).to_csv(path, index=False)
+
+
+def write_table(table, path):
+    """Escribe un DataFrame con el mismo criterio de formato que write_predictions."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.ndjson', '.jsonl', '.parquet'):
+        write_predictions(table.to_dict('records'), path)
+    else:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        table.to_csv(path, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Predicción por lotes de partidos")
+    parser.add_argument('fixtures', help="CSV o NDJSON con los partidos")
+    parser.add_argument('-o', '--output', default='data/batch_predictions.csv',
+                        help="Archivo de salida (.csv, .ndjson/.jsonl, .parquet)")
+    parser.add_argument('--ladder', metavar='PATH',
+                        help="Escribe también la escalera de líneas over/under de corners y tiros")
+    args = parser.parse_args(argv)
+
+    try:
+        fixtures = read_fixtures(args.fixtures)
+    except Exception as e:
+        print(f"[ERROR] No se pudo leer {args.fixtures}: {e}")
+        return 1
+
+    # Motor de predicción (xgboost, scipy) solo cuando hay partidos que predecir
+    from markets import ladder_table
+    from predict import load_dataset, load_models, predict_fixtures
+    from serving_state import load_serving_state
+
+    t0 = time.perf_counter()
+    df = load_dataset()
+    state = load_serving_state(df)
+    models = load_models()
+    t_load = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    records = predict_fixtures(fixtures, df=df, state=state, models=models)
+    t_pred = time.perf_counter() - t0
+
+    try:
+        write_predictions(records, args.output)
+        if args.ladder:
+            t0 = time.perf_counter()
+            ladder = ladder_table(records)
+            write_table(ladder, args.ladder)
+            print(f"[OK] {len(ladder)} líneas over/under en {time.perf_counter() - t0:.2f}s -> {args.ladder}")
+    except ImportError as e:
+        print(f"[ERROR] Formato de salida no disponible: {e}")
+        return 1
+
+    errors = [r for r in records if r.get('Error')]
+    for r in errors:
+        print(f"[WARN] {r['HomeTeam']} vs {r['AwayTeam']}: {r['Error']}")
+    n = len(records)
+    print(f"[INFO] Recursos cargados en {t_load:.2f}s")
+    print(f"[OK] {n - len(errors)}/{n} partidos predichos en {t_pred:.2f}s "
+          f"({t_pred / max(n, 1) * 1000:.1f} ms/partido) -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""
+Features cruzadas de un emparejamiento (local vs visitante).
+
+Las fórmulas viven aquí UNA vez y las usan los dos lados:
+    preprocessor.py  -> columnas del dataset de entrenamiento (Series de pandas)
+    predict.py       -> recálculo para el rival ACTUAL de cada partido (arrays numpy)
+
+Todas son element-wise sobre arrays o Series, así que matchup_features()
+calcula las features de miles de partidos en una sola pasada.
+"""
+
+import numpy as np
+
+N_GAMES = 5
+
+# Features cruzadas que se recalculan para el rival ACTUAL (orden fijo)
+CROSS_FEATURES = (
+    'Home_vs_Away_Shot_Advantage', 'Away_vs_Home_Shot_Advantage',
+    'Match_Shot_Expectancy_Home', 'Match_Shot_Expectancy_Away',
+    'Match_Corner_Expectancy_Home', 'Match_Corner_Expectancy_Away',
+    'Home_Defense_Efficiency', 'Away_Defense_Efficiency',
+    'Position_Diff', 'Points_Diff', 'GD_Diff',
+    'Home_vs_Away_Quality', 'Away_vs_Home_Quality',
+    'opponent_position_home', 'opponent_position_away',
+    'opponent_points_home', 'opponent_points_away',
+    'opponent_gd_home', 'opponent_gd_away',
+    'Home_Attacking_vs_Away_Defense', 'Away_Attacking_vs_Home_Defense',
+    'Expected_Shots_Home', 'Expected_Shots_Away',
+    'Expected_ST_Home', 'Expected_ST_Away',
+    'Expected_Shots_Home_V2', 'Expected_Shots_Away_V2',
+    'Home_Possession_EWM', 'Away_Possession_EWM',
+    'Expected_Shots_Home_With_Possession', 'Expected_Shots_Away_With_Possession',
+    'Expected_ST_Home_Possession', 'Expected_ST_Away_Possession',
+    'diff_Shots', 'exp_Total_Shots', 'exp_Total_Corners',
+    'Shot_Share_Home', 'Corner_Share_Home',
+    'Direct_SoT_Home', 'Direct_SoT_Away', 'Cross_SoT_Home', 'Cross_SoT_Away',
+    'SoT_Expectancy_Home', 'SoT_Expectancy_Away',
+    'Conceded_SoT_Home', 'Conceded_SoT_Away',
+    'SoT_Dominance_Home', 'SoT_Dominance_Away',
+    'Fast_SoT_Home', 'Fast_SoT_Away', 'Fast_Shots_Home', 'Fast_Shots_Away',
+)
+
+# Estado por equipo que necesitan las fórmulas: campo -> (columna, valor por defecto).
+# El defecto es un número o el nombre de otro campo ya resuelto (se usa si la
+# columna falta o es NaN en la fila del equipo).
+TEAM_STATE_FIELDS = {
+    's': (f'rolling_S_{N_GAMES}_{{role}}', 10),
+    'c': (f'rolling_C_{N_GAMES}_{{role}}', 5),
+    'st': (f'rolling_ST_{N_GAMES}_{{role}}', 4),
+    'opp_s': (f'rolling_OppS_{N_GAMES}_{{role}}', 10),
+    'opp_c': (f'rolling_OppC_{N_GAMES}_{{role}}', 5),
+    'opp_st': (f'rolling_OppST_{N_GAMES}_{{role}}', 4),
+    's_role': (f'rolling_S_{N_GAMES}_Role_{{role}}', 's'),
+    'st_role': (f'rolling_ST_{N_GAMES}_Role_{{role}}', 'st'),
+    'aggression': ('{role}_Aggression_Score', 0.5),
+    'vulnerability': ('{role}_Defensive_Vulnerability', 0),
+    'permissiveness': ('{role}_Defensive_Permissiveness', 0),
+    'accuracy': ('{role}_Shot_Accuracy', 0.35),
+    'sot_rate': ('EWM_SoT_Rate_{role}', 0.3),
+    'opp_sot_rate': ('EWM_OppSoT_Rate_{role}', 0.3),
+    'conceded_sot': ('EWM_OppST_Role_{role}', 'opp_st'),
+    'fast_sot': ('EWM_ST_Fast_{role}', 'st_role'),
+    'fast_shots': ('EWM_S_Fast_{role}', 's_role'),
+    'poss': ('rolling_Poss_{role}', np.nan),  # posesión real (solo CL)
+}
+
+
+# ── Fórmulas (compartidas con preprocessor.py) ─────────────────────────
+
+def fill_nan(values, fallback):
+    """values con los NaN sustituidos por fallback (equivale a Series.fillna)."""
+    return np.where(np.isnan(values), fallback, values)
+
+
+def shot_advantage(shots, rival_conceded):
+    """Mis tiros vs lo que concede el rival."""
+    return (shots - rival_conceded) / 2
+
+
+def match_expectancy(own, rival_conceded):
+    """Promedio de mi ataque y la defensa del rival."""
+    return (own + rival_conceded) / 2
+
+
+def defense_efficiency(conceded_target, conceded):
+    """Cuántos tiros recibe pero evita que sean peligrosos."""
+    return (conceded_target + 0.1) / (conceded + 0.1)
+
+
+def quality_ratio(position, rival_position):
+    """Calidad relativa según posición en la tabla."""
+    return (position / (rival_position + 0.1)) - 1
+
+
+def attacking_vs_defense(aggression, rival_vulnerability):
+    """Mi agresión × vulnerabilidad defensiva del rival."""
+    return aggression * (1 + np.clip(rival_vulnerability, -1, 1))
+
+
+def expected_shots(shots_role, rival_permissiveness):
+    """Mis tiros por rol × permisividad del rival."""
+    return shots_role * (1 + rival_permissiveness * 0.5)
+
+
+def expected_shots_v2(shots, rival_vulnerability):
+    """Expected shots con el estilo defensivo del rival."""
+    return shots * (1 + np.clip(rival_vulnerability, -0.5, 0.5) * 0.3)
+
+
+def possession_ewm(shots, rival_shots):
+    """Posesión estimada (%) a partir del reparto de tiros."""
+    return shots / (shots + rival_shots + 0.1) * 100
+
+
+def expected_st(expected_shots, accuracy):
+    """Tiros a puerta esperados: tiros esperados × precisión propia."""
+    return expected_shots * accuracy
+
+
+def with_possession(shots, possession):
+    """Equipos con 60%+ posesión deberían tirar más."""
+    return shots * (1 + (possession - 50) / 100)
+
+
+def expected_st_possession(shots_with_possession, accuracy, possession):
+    """A más posesión, mejor coordinación = mejor precisión esperada."""
+    return shots_with_possession * accuracy * (1 + (possession - 50) / 200)
+
+
+def share(own, rival):
+    """Porcentaje que aporta cada equipo (total 0 -> divisor 1)."""
+    total = own + rival
+    return own / np.where(total == 0, 1, total)
+
+
+def direct_sot(shots_role, sot_rate, st_role):
+    """SoT directos: tiros por rol × tasa de precisión (sin tasa, los SoT por rol)."""
+    return fill_nan(shots_role * sot_rate, st_role)
+
+
+def cross_sot(shots_role, rival_opp_sot_rate, direct):
+    """SoT contra el rival: mis tiros × SoT que concede el rival (sin dato, los directos)."""
+    return fill_nan(shots_role * rival_opp_sot_rate, direct)
+
+
+def sot_expectancy(direct, cross):
+    """Estimación SoT final: 60% propia + 40% según el rival."""
+    return direct * 0.6 + cross * 0.4
+
+
+def sot_dominance(expectancy, conceded):
+    """Ratio SoT propios vs concedidos (>1 = equipo domina)."""
+    return expectancy / (conceded + 0.1)
+
+
+# ── Versión vectorizada para predicción ───────────────────────────────
+
+def state_columns(role):
+    """Columnas del dataset que necesita team_state para un rol ('Home'/'Away')."""
+    return [template.format(role=role) for template, _ in TEAM_STATE_FIELDS.values()]
+
+
+def team_state(columns, role):
+    """
+    Resuelve los campos de TEAM_STATE_FIELDS con sus valores por defecto.
+
+    Args:
+        columns (dict): columna -> array (n,) con NaN donde falte el dato
+        role (str): 'Home' o 'Away'
+
+    Returns:
+        dict: campo -> array (n,)
+    """
+    state = {}
+    for field, (template, default) in TEAM_STATE_FIELDS.items():
+        fallback = state[default] if isinstance(default, str) else default
+        state[field] = fill_nan(columns[template.format(role=role)], fallback)
+    return state
+
+
+def matchup_features(home, away, h_standing, a_standing):
+    """
+    Features cruzadas de n emparejamientos a la vez.
+
+    Args:
+        home, away (dict): Estado por equipo (team_state) del local y del visitante
+        h_standing, a_standing (dict): 'position', 'points', 'gd' -> array (n,)
+
+    Returns:
+        dict: feature -> array (n,) con las claves de CROSS_FEATURES
+    """
+    f = {}
+    # --- PASO 6: Defense Fatigue (ofensiva vs defensa del RIVAL ACTUAL) ---
+    f['Home_vs_Away_Shot_Advantage'] = shot_advantage(home['s'], away['opp_s'])
+    f['Away_vs_Home_Shot_Advantage'] = shot_advantage(away['s'], home['opp_s'])
+    f['Match_Shot_Expectancy_Home'] = match_expectancy(home['s'], away['opp_s'])
+    f['Match_Shot_Expectancy_Away'] = match_expectancy(away['s'], home['opp_s'])
+    f['Match_Corner_Expectancy_Home'] = match_expectancy(home['c'], away['opp_c'])
+    f['Match_Corner_Expectancy_Away'] = match_expectancy(away['c'], home['opp_c'])
+    f['Home_Defense_Efficiency'] = defense_efficiency(home['opp_st'], home['opp_s'])
+    f['Away_Defense_Efficiency'] = defense_efficiency(away['opp_st'], away['opp_s'])
+
+    # --- PASO 7: Position Gap (posiciones ACTUALES de la tabla) ---
+    f['Position_Diff'] = h_standing['position'] - a_standing['position']
+    f['Points_Diff'] = h_standing['points'] - a_standing['points']
+    f['GD_Diff'] = h_standing['gd'] - a_standing['gd']
+    f['Home_vs_Away_Quality'] = quality_ratio(h_standing['position'], a_standing['position'])
+    f['Away_vs_Home_Quality'] = quality_ratio(a_standing['position'], h_standing['position'])
+    # opponent_*: en el contexto actual = datos del rival ACTUAL
+    f['opponent_position_home'] = a_standing['position']
+    f['opponent_position_away'] = h_standing['position']
+    f['opponent_points_home'] = a_standing['points']
+    f['opponent_points_away'] = h_standing['points']
+    f['opponent_gd_home'] = a_standing['gd']
+    f['opponent_gd_away'] = h_standing['gd']
+
+    # --- Agresión cruzada y Expected Shots ---
+    f['Home_Attacking_vs_Away_Defense'] = attacking_vs_defense(home['aggression'], away['vulnerability'])
+    f['Away_Attacking_vs_Home_Defense'] = attacking_vs_defense(away['aggression'], home['vulnerability'])
+    f['Expected_Shots_Home'] = expected_shots(home['s_role'], away['permissiveness'])
+    f['Expected_Shots_Away'] = expected_shots(away['s_role'], home['permissiveness'])
+    f['Expected_ST_Home'] = expected_st(f['Expected_Shots_Home'], home['accuracy'])
+    f['Expected_ST_Away'] = expected_st(f['Expected_Shots_Away'], away['accuracy'])
+    f['Expected_Shots_Home_V2'] = expected_shots_v2(home['s'], away['vulnerability'])
+    f['Expected_Shots_Away_V2'] = expected_shots_v2(away['s'], home['vulnerability'])
+
+    # --- Posesión (EWM de tiros; la real de CL sustituye en Expected Shots) ---
+    f['Home_Possession_EWM'] = possession_ewm(home['s'], away['s'])
+    f['Away_Possession_EWM'] = possession_ewm(away['s'], home['s'])
+    shots_poss_h = with_possession(f['Expected_Shots_Home_V2'], f['Home_Possession_EWM'])
+    shots_poss_a = with_possession(f['Expected_Shots_Away_V2'], f['Away_Possession_EWM'])
+    f['Expected_ST_Home_Possession'] = expected_st_possession(shots_poss_h, home['accuracy'], f['Home_Possession_EWM'])
+    f['Expected_ST_Away_Possession'] = expected_st_possession(shots_poss_a, away['accuracy'], f['Away_Possession_EWM'])
+    f['Expected_Shots_Home_With_Possession'] = np.where(
+        np.isnan(home['poss']), shots_poss_h, with_possession(f['Expected_Shots_Home_V2'], home['poss']))
+    f['Expected_Shots_Away_With_Possession'] = np.where(
+        np.isnan(away['poss']), shots_poss_a, with_possession(f['Expected_Shots_Away_V2'], away['poss']))
+
+    # --- Diferencias, totales y shares ---
+    f['diff_Shots'] = home['s'] - away['s']
+    f['exp_Total_Shots'] = home['s'] + away['s']
+    f['exp_Total_Corners'] = home['c'] + away['c']
+    f['Shot_Share_Home'] = share(home['s'], away['s'])
+    f['Corner_Share_Home'] = share(home['c'], away['c'])
+
+    # --- SoT: tasa propia y concesión del RIVAL ACTUAL ---
+    f['Direct_SoT_Home'] = direct_sot(home['s_role'], home['sot_rate'], home['st_role'])
+    f['Direct_SoT_Away'] = direct_sot(away['s_role'], away['sot_rate'], away['st_role'])
+    f['Cross_SoT_Home'] = cross_sot(home['s_role'], away['opp_sot_rate'], f['Direct_SoT_Home'])
+    f['Cross_SoT_Away'] = cross_sot(away['s_role'], home['opp_sot_rate'], f['Direct_SoT_Away'])
+    f['SoT_Expectancy_Home'] = sot_expectancy(f['Direct_SoT_Home'], f['Cross_SoT_Home'])
+    f['SoT_Expectancy_Away'] = sot_expectancy(f['Direct_SoT_Away'], f['Cross_SoT_Away'])
+    f['Conceded_SoT_Home'] = home['conceded_sot']
+    f['Conceded_SoT_Away'] = away['conceded_sot']
+    f['SoT_Dominance_Home'] = sot_dominance(f['SoT_Expectancy_Home'], f['Conceded_SoT_Home'])
+    f['SoT_Dominance_Away'] = sot_dominance(f['SoT_Expectancy_Away'], f['Conceded_SoT_Away'])
+    f['Fast_SoT_Home'] = home['fast_sot']
+    f['Fast_SoT_Away'] = away['fast_sot']
+    f['Fast_Shots_Home'] = home['fast_shots']
+    f['Fast_Shots_Away'] = away['fast_shots']
+    return f
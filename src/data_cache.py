@@ -0,0 +1,84 @@
+"""
+Caché en memoria de dataset_final.csv compartida por todo el proceso.
+
+main.py ejecuta preprocesado, entrenamiento y predicción en el mismo proceso:
+en lugar de que cada etapa vuelva a leer el CSV, todas piden el DataFrame a
+DATA_CACHE. Cada entrada se versiona con la huella del archivo (tamaño +
+mtime, la misma de serving_state): si el CSV cambia en disco se vuelve a
+leer; si lo acaba de escribir el preprocesado, este registra el DataFrame
+con put() y nadie tiene que leerlo.
+
+El DataFrame se comparte: quien necesite modificarlo debe trabajar sobre una
+copia.
+"""
+
+import threading
+import pandas as pd
+from serving_state import DATASET_PATH, dataset_fingerprint
+
+
+def read_dataset(path=DATASET_PATH):
+    """
+    Lee dataset_final.csv con la fecha como datetime (para ordenar bien).
+    round_trip: los float se leen exactos, igual que el DataFrame que
+    registra el preprocesado con put().
+    """
+    df = pd.read_csv(path, float_precision='round_trip')
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df
+
+
+class DataCache:
+    """
+    DataFrames por ruta, válidos mientras la huella del archivo no cambie.
+
+    Atributos:
+        loads: lecturas reales de disco
+        hits: peticiones servidas desde memoria
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+
+    def get(self, path=DATASET_PATH):
+        """
+        DataFrame del dataset, leyéndolo solo si no está en memoria o el
+        archivo cambió desde la última lectura.
+
+        Raises:
+            FileNotFoundError: si el archivo no existe
+        """
+        with self._lock:
+            fingerprint = dataset_fingerprint(path)
+            entry = self._entries.get(path)
+            if entry is not None and fingerprint is not None and entry[0] == fingerprint:
+                self.hits += 1
+                return entry[1]
+            df = read_dataset(path)
+            self._entries[path] = (fingerprint, df)
+            self.loads += 1
+            return df
+
+    def put(self, df, path=DATASET_PATH):
+        """Registra un DataFrame recién escrito en path (con la huella actual del archivo)."""
+        with self._lock:
+            self._entries[path] = (dataset_fingerprint(path), df)
+
+    def version(self, path=DATASET_PATH):
+        """Huella de la entrada en memoria (None si no está cargada)."""
+        entry = self._entries.get(path)
+        return entry[0] if entry else None
+
+    def invalidate(self, path=None):
+        """Descarta una entrada (o todas)."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+
+DATA_CACHE = DataCache()
@@ -0,0 +1,236 @@
+"""
+Plan compilado de ensamblado de features.
+
+Cada modelo espera sus columnas en un orden fijo (feature_names_in_). En vez
+de clasificar cada columna en cada predicción (cadena de if/elif con tests de
+subcadena), FeaturePlan decide UNA vez por esquema de dónde sale cada columna:
+
+    market/odds/rest/H2H -> vector de contexto del partido (fixture_context)
+    is_<LIGA>            -> indicador de liga del partido
+    home / away          -> fila del equipo local / visitante
+    cross                -> features cruzadas del emparejamiento (cross_features.py)
+
+y lo guarda como arrays de índices. Ensamblar la matriz de entrada queda en
+unos pocos gathers de numpy sobre una matriz float32 preasignada (el mismo
+tipo que XGBoost usa internamente, así que las predicciones no cambian).
+"""
+
+import numpy as np
+from cross_features import CROSS_FEATURES
+
+# Campos del vector de contexto del partido (orden fijo)
+CONTEXT_FIELDS = (
+    'market_h', 'market_d', 'market_a',
+    'odds_h', 'odds_d', 'odds_a', 'odds_std',
+    'rest_days',
+    'h2h_dominance', 'h2h_total', 'h2h_draws', 'h2h_home_wins', 'h2h_away_wins',
+    'h2h_home_rate', 'h2h_away_rate',
+)
+_CONTEXT_INDEX = {name: i for i, name in enumerate(CONTEXT_FIELDS)}
+
+_CROSS_SET = frozenset(CROSS_FEATURES)
+_CROSS_INDEX = {name: i for i, name in enumerate(CROSS_FEATURES)}
+
+_LEGACY_H2H = {
+    'H2H_Total': 'h2h_total',
+    'H2H_Draws': 'h2h_draws',
+    'H2H_Home_Wins': 'h2h_home_wins',
+    'H2H_Away_Wins': 'h2h_away_wins',
+    'H2H_Home_Win_Rate': 'h2h_home_rate',
+    'H2H_Away_Win_Rate': 'h2h_away_rate',
+}
+
+
+_indexers = {}
+
+
+def _row_positions(index, cols):
+    """Posiciones de cols en index (origen, destino), cacheadas por disposición de columnas."""
+    entries = _indexers.setdefault(cols, [])
+    for known, src, dst in entries:
+        # Las filas del mismo dataset comparten índice (is_ / equals son O(1) en ese caso)
+        if index.is_(known) or index.equals(known):
+            return src, dst
+    idx = index.get_indexer(list(cols))
+    src, dst = idx[idx >= 0], np.flatnonzero(idx >= 0)
+    entries.append((index, src, dst))
+    return src, dst
+
+
+def row_matrix(rows, cols):
+    """
+    Valores de cols en cada fila como matriz float64 (n, len(cols)), con NaN
+    donde la fila no tiene la columna. Las filas son TeamRow (vector + layout,
+    el camino de serving) o Series de pandas.
+    """
+    cols = tuple(cols)
+    out = np.full((len(rows), len(cols)), np.nan)
+    for i, row in enumerate(rows):
+        layout = getattr(row, 'layout', None)
+        if layout is not None:
+            src, dst = layout.positions(cols)
+            out[i, dst] = row.values[src]
+        else:
+            src, dst = _row_positions(row.index, cols)
+            out[i, dst] = row.to_numpy()[src]
+    return out
+
+
+def fixture_context(h, d, a, match_league, h2h, h2h_weight=1.0):
+    """
+    Vector de contexto del partido en el orden de CONTEXT_FIELDS.
+
+    Args:
+        h, d, a (float): Cuotas 1X2
+        match_league (str): Liga del partido
+        h2h (dict): Resultado de get_h2h / ServingState.h2h
+        h2h_weight (float): Factor para atenuar H2H
+
+    Returns:
+        np.ndarray: float64 de longitud len(CONTEXT_FIELDS)
+    """
+    sum_inv = (1/h) + (1/d) + (1/a)
+    h2h_n = h2h.get('h2h_matches', 0)
+    wins_a = h2h.get('h2h_wins_a', 0)
+    wins_b = h2h.get('h2h_wins_b', 0)
+    # Rango: -1 (visitante domina) a +1 (local domina)
+    dominance = (wins_a - wins_b) / h2h_n * h2h_weight if h2h_n > 0 else 0
+    return np.array([
+        (1/h) / sum_inv, (1/d) / sum_inv, (1/a) / sum_inv,
+        h, d, a, np.std([h, d, a]),
+        # Días de descanso — 4 para CL (entre semana), 7 para doméstica
+        4.0 if match_league == 'CL' else 7.0,
+        dominance,
+        h2h_n * h2h_weight,
+        h2h.get('h2h_draws', 0) * h2h_weight,
+        wins_a * h2h_weight,
+        wins_b * h2h_weight,
+        (wins_a / max(h2h_n, 1)) * h2h_weight,
+        (wins_b / max(h2h_n, 1)) * h2h_weight,
+    ], dtype=np.float64)
+
+
+def classify_column(col):
+    """
+    Origen de una columna del modelo 1X2 (misma prioridad que la antigua
+    cadena if/elif de predict_final_boss).
+
+    Returns:
+        tuple: (tipo, clave) con tipo en 'context', 'league', 'home', 'away', 'const'
+    """
+    # A. Probabilidades de Mercado
+    if 'Market_Prob' in col:
+        if '_H' in col: return 'context', 'market_h'
+        if '_D' in col: return 'context', 'market_d'
+        if '_A' in col: return 'context', 'market_a'
+        return 'const', None
+    # B. Cuotas puras
+    if 'AvgH' in col: return 'context', 'odds_h'
+    if 'AvgD' in col: return 'context', 'odds_d'
+    if 'AvgA' in col: return 'context', 'odds_a'
+    if 'Odds_Std' in col: return 'context', 'odds_std'
+    # C. Liga como feature
+    if col.startswith('is_'): return 'league', col[3:]
+    # D. Días de descanso
+    if col in ('home_rest_days', 'away_rest_days'): return 'context', 'rest_days'
+    # E. H2H (H2H_Dominance + legacy)
+    if col == 'H2H_Dominance': return 'context', 'h2h_dominance'
+    if col.startswith('H2H_'):
+        if col in _LEGACY_H2H: return 'context', _LEGACY_H2H[col]
+        return 'const', None
+    # F/G. Prefijo Home/Away o sufijo _Home/_Away
+    if col.startswith('Home') or '_Home' in col: return 'home', col
+    if col.startswith('Away') or '_Away' in col: return 'away', col
+    # H. Indicador home/away en minúsculas (opponent_*_home, etc.)
+    if 'home' in col.lower(): return 'home', col
+    if 'away' in col.lower(): return 'away', col
+    # I/J. diff_/exp_ y fallback: desde la fila local
+    return 'home', col
+
+
+class FeaturePlan:
+    """
+    Mapeo compilado columna -> origen para un esquema de modelo.
+
+    Args:
+        feature_names: Columnas del modelo (feature_names_in_)
+        base_names: Columnas del modelo 1X2. Las columnas que no estén aquí
+            (propias de los modelos de tiros) se toman de la fila local o
+            visitante según el sufijo _Home/_Away.
+    """
+
+    def __init__(self, feature_names, base_names=None):
+        names = [str(c) for c in feature_names]
+        base = set(names) if base_names is None else {str(c) for c in base_names}
+        self.feature_names = tuple(names)
+        self.n_features = len(names)
+
+        groups = {'home': [], 'away': [], 'cross': [], 'context': [], 'league': []}
+        for pos, col in enumerate(names):
+            if col in _CROSS_SET:
+                kind, key = 'cross', col
+            elif col in base:
+                kind, key = classify_column(col)
+            elif '_Home' in col:
+                kind, key = 'home', col
+            elif '_Away' in col:
+                kind, key = 'away', col
+            else:
+                kind, key = 'home', col
+            if kind != 'const':  # las constantes se quedan en 0
+                groups[kind].append((pos, key))
+
+        def _split(kind):
+            pairs = groups[kind]
+            return np.array([p for p, _ in pairs], dtype=np.intp), [k for _, k in pairs]
+
+        self.home_pos, self.home_cols = _split('home')
+        self.away_pos, self.away_cols = _split('away')
+        self.cross_pos, cross_cols = _split('cross')
+        self.cross_idx = np.array([_CROSS_INDEX[c] for c in cross_cols], dtype=np.intp)
+        self.context_pos, context_keys = _split('context')
+        self.context_idx = np.array([_CONTEXT_INDEX[k] for k in context_keys], dtype=np.intp)
+        self.league_pos, league_codes = _split('league')
+        self.league_codes = np.array(league_codes, dtype=object)
+
+    def assemble(self, fixtures, cross):
+        """
+        Matriz de entrada (n, n_features) float32 para una lista de contextos
+        de prepare_fixture. Las columnas ausentes y los NaN quedan en 0.
+
+        Args:
+            fixtures: Contextos de prepare_fixture
+            cross: Matriz (n, len(CROSS_FEATURES)) de features cruzadas
+        """
+        X = np.zeros((len(fixtures), self.n_features), dtype=np.float32)
+        if self.home_cols:
+            X[:, self.home_pos] = row_matrix([fx['h_row'] for fx in fixtures], self.home_cols)
+        if self.away_cols:
+            X[:, self.away_pos] = row_matrix([fx['a_row'] for fx in fixtures], self.away_cols)
+        X[:, self.cross_pos] = cross[:, self.cross_idx]
+        context = np.array([fx['context'] for fx in fixtures]).reshape(len(fixtures), -1)
+        X[:, self.context_pos] = context[:, self.context_idx]
+        leagues = np.array([fx['match_league'] for fx in fixtures], dtype=object)
+        X[:, self.league_pos] = leagues[:, None] == self.league_codes[None, :]
+        X[np.isnan(X)] = 0  # Seguro final: ningún NaN llega a los modelos
+        return X
+
+
+_plans = {}
+
+
+def get_plan(feature_names, base_names=None):
+    """
+    FeaturePlan de un esquema (compilado una vez y cacheado).
+
+    Args:
+        feature_names: Columnas del modelo (feature_names_in_ o el esquema del manifest)
+        base_names: Columnas del modelo 1X2 (definen qué columnas siguen su clasificación)
+    """
+    names = tuple(str(c) for c in feature_names)
+    base = tuple(str(c) for c in base_names) if base_names is not None else names
+    key = (names, base)
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _plans[key] = FeaturePlan(names, base)
+    return plan
@@ -0,0 +1,141 @@
+"""
+Motor de inferencia sobre los Booster nativos de XGBoost.
+
+Los wrappers sklearn (predict / predict_proba) revalidan la entrada y la
+convierten en cada llamada. El motor extrae los Booster una vez, ensambla
+cada matriz de features una sola vez por lote (la de tiros la comparten los
+siete regresores) y llama a Booster.inplace_predict directamente. Los
+Booster son independientes, así que con varios núcleos se ejecutan en
+paralelo en un pool de hilos (XGBoost libera el GIL durante la predicción).
+
+Las salidas son idénticas a las de los wrappers: mismo rango de árboles
+(best_iteration si hubo early stopping) y misma matriz float32. Con un
+ModelSet (model_registry) cada modelo se carga al pedir su salida.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from feature_plan import get_plan
+from model_registry import SEPARATE_MODEL_PATHS
+
+# Salida de run_models -> modelo
+MODEL_OUTPUTS = {
+    'prob_1x2_raw': 'result',
+    'mu_c': 'corners',
+    'mu_s': 'shots_total',
+    'mu_t': 'shots_target',
+}
+SEPARATE_OUTPUTS = {
+    'mu_hs': 'shots_home',
+    'mu_as': 'shots_away',
+    'mu_hst': 'shots_target_home',
+    'mu_ast': 'shots_target_away',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Pool de hilos compartido por todos los motores (uno por proceso)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = min(len(MODEL_OUTPUTS) + len(SEPARATE_OUTPUTS), os.cpu_count() or 1)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='booster')
+        return _executor
+
+
+def _iteration_range(model):
+    """Rango de árboles que usaría el wrapper sklearn."""
+    try:
+        return (0, model.best_iteration + 1)
+    except AttributeError:
+        return (0, 0)
+
+
+def _feature_names(models, name):
+    """Esquema de un modelo; con un ModelSet se lee del manifest sin cargar el modelo."""
+    if hasattr(models, 'schema'):
+        return models.schema(name)
+    return models[name].feature_names_in_
+
+
+class InferenceEngine:
+    """
+    Ejecuta los modelos de un diccionario (load_models) sobre un lote.
+    Cada Booster se obtiene la primera vez que se pide su salida, así que con
+    un ModelSet solo se cargan de disco los modelos que se usan.
+
+    Args:
+        models: Diccionario de modelos entrenados (o ModelSet)
+        parallel (bool, optional): Ejecutar los Booster en paralelo; por defecto
+            solo si la máquina tiene más de un núcleo
+    """
+
+    def __init__(self, models, parallel=None):
+        self.models = models
+        self.outputs = dict(MODEL_OUTPUTS)
+        if all(name in models for name in SEPARATE_MODEL_PATHS):
+            self.outputs.update(SEPARATE_OUTPUTS)
+        base = _feature_names(models, 'result')
+        self._plans = {}
+        for name in set(self.outputs.values()):
+            # Los modelos de tiros completan sus columnas según el esquema del 1X2
+            self._plans[name] = get_plan(_feature_names(models, name),
+                                         None if name == 'result' else base)
+        self._boosters = {}
+        self.parallel = (os.cpu_count() or 1) > 1 if parallel is None else parallel
+
+    def _booster(self, name):
+        entry = self._boosters.get(name)
+        if entry is None:
+            model = self.models[name]
+            entry = self._boosters[name] = (model.get_booster(), _iteration_range(model))
+        return entry
+
+    def warm(self):
+        """
+        Carga ya todos los Booster de las salidas (lee los modelos del
+        ModelSet). Una recarga en caliente lo llama antes de publicar la
+        instantánea para que la primera petición no pague la lectura de disco.
+
+        Returns:
+            InferenceEngine: el propio motor
+        """
+        for name in set(self.outputs.values()):
+            self._booster(name)
+        return self
+
+    def _predict(self, name, X):
+        booster, iteration_range = self._booster(name)
+        # Las columnas ya vienen en el orden del modelo (FeaturePlan)
+        return booster.inplace_predict(X, iteration_range=iteration_range, validate_features=False)
+
+    def run(self, fixtures, cross, outputs=None):
+        """
+        Predicciones de los modelos para un lote.
+
+        Args:
+            fixtures: Contextos de prepare_fixture
+            cross: Matriz de features cruzadas (predict.fixture_cross_features)
+            outputs (list, optional): Salidas a calcular (por defecto todas)
+
+        Returns:
+            dict: salida -> array alineado con fixtures ('prob_1x2_raw' (n, 3), 'mu_c', ...)
+        """
+        outputs = self.outputs if outputs is None else {out: self.outputs[out] for out in outputs}
+        # Una matriz por esquema distinto (los regresores de tiros comparten la suya)
+        matrices = {}
+        for name in set(outputs.values()):
+            plan = self._plans[name]
+            if plan not in matrices:
+                matrices[plan] = plan.assemble(fixtures, cross)
+        tasks = {out: (name, matrices[self._plans[name]]) for out, name in outputs.items()}
+
+        if not self.parallel:
+            return {out: self._predict(name, X) for out, (name, X) in tasks.items()}
+        executor = _get_executor()
+        futures = {out: executor.submit(self._predict, name, X) for out, (name, X) in tasks.items()}
+        return {out: future.result() for out, future in futures.items()}
@@ -0,0 +1,176 @@
+"""
+Consultas de análisis sobre el log de predicciones (SQLite).
+
+Las agregaciones (ROI, acierto, calibración) se resuelven en SQL sobre los
+índices del LogStore (fecha, liga, mercado, equipo, estado), así que solo
+llega a pandas la tabla resumen, nunca el log completo.
+
+Uso:
+    python src/log_analytics.py --by league
+    python src/log_analytics.py --by market,line --league E0 --since 2026-01-01
+    python src/log_analytics.py --by month --team Arsenal
+    python src/log_analytics.py --calibration --bins 10
+"""
+
+import argparse
+import sys
+import pandas as pd
+from log_store import LOG_DB_PATH
+
+SETTLED = ('Win', 'Loss', 'Push')
+
+# Dimensión de agrupación -> expresión SQL
+GROUP_KEYS = {
+    'league': "COALESCE(Div, '?')",
+    'market': ("RTRIM(CASE WHEN INSTR(Event_Type, ' +') > 0 "
+               "THEN SUBSTR(Event_Type, 1, INSTR(Event_Type, ' +') - 1) ELSE Event_Type END)"),
+    'event': 'Event_Type',
+    'line': 'Over_Line',
+    'month': 'SUBSTR(Date_Prediction, 1, 7)',
+    'team': ("CASE WHEN INSTR(Notes, 'Equipo:') > 0 "
+             "THEN TRIM(SUBSTR(Notes, INSTR(Notes, 'Equipo:') + 7)) ELSE HomeTeam END"),
+}
+
+_AGGREGATES = """
+    COUNT(*) AS n,
+    SUM(Status = 'Win') AS wins,
+    SUM(Status = 'Loss') AS losses,
+    SUM(Status = 'Push') AS pushes,
+    SUM(CASE WHEN Kelly_Amount > 0 THEN 1 ELSE 0 END) AS bets,
+    SUM(CASE WHEN Kelly_Amount > 0 THEN Kelly_Amount ELSE 0 END) AS staked,
+    SUM(CASE WHEN Kelly_Amount > 0 THEN Payout ELSE 0 END) AS profit,
+    AVG(Prob_IA) AS avg_prob
+"""
+
+
+def _where(league=None, market=None, team=None, since=None, until=None, settled=True):
+    """Condición WHERE (con parámetros) que aprovecha los índices del log."""
+    clauses, params = [], []
+    if settled:
+        clauses.append(f"Status IN ({', '.join('?' * len(SETTLED))})")
+        params.extend(SETTLED)
+    if league:
+        clauses.append('Div = ?')
+        params.append(league)
+    if market:
+        # Rango de prefijo en vez de LIKE: usa el índice de Event_Type
+        clauses.append('Event_Type >= ? AND Event_Type < ?')
+        params.extend([market, market + '\uffff'])
+    if team:
+        clauses.append('(HomeTeam = ? OR AwayTeam = ?)')
+        params.extend([team, team])
+    if since:
+        clauses.append('Date_Prediction >= ?')
+        params.append(since)
+    if until:
+        clauses.append('Date_Prediction < ?')
+        params.append(until)
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+def _finish(df):
+    """Añade ROI y acierto a una tabla de agregados."""
+    decided = df['wins'] + df['losses']
+    df['hit_rate'] = (df['wins'] / decided.where(decided > 0)).astype(float)
+    df['roi'] = (df['profit'] / df['staked'].where(df['staked'] > 0)).astype(float)
+    return df
+
+
+def breakdown(store, by=('league',), **filters):
+    """
+    ROI y acierto de las predicciones liquidadas agrupados por una o varias
+    dimensiones de GROUP_KEYS.
+
+    Args:
+        store: LogStore
+        by: Dimensiones ('league', 'market', 'event', 'line', 'month', 'team')
+        **filters: league, market (prefijo de Event_Type), team, since, until (fechas ISO)
+
+    Returns:
+        pd.DataFrame: una fila por grupo con n, wins, losses, pushes, bets,
+                      staked, profit, avg_prob, hit_rate, roi
+
+    Raises:
+        ValueError: si alguna dimensión no existe
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    unknown = [k for k in by if k not in GROUP_KEYS]
+    if unknown:
+        raise ValueError(f"Dimensiones desconocidas: {', '.join(unknown)} "
+                         f"(disponibles: {', '.join(GROUP_KEYS)})")
+    where, params = _where(**filters)
+    keys = ', '.join(f'{GROUP_KEYS[k]} AS {k}' for k in by)
+    sql = (f'SELECT {keys}, {_AGGREGATES} FROM predictions{where} '
+           f'GROUP BY {", ".join(by)} ORDER BY {", ".join(by)}')
+    columns, rows = store.query(sql, params)
+    return _finish(pd.DataFrame(rows, columns=columns))
+
+
+def totals(store, **filters):
+    """Agregado global de las predicciones liquidadas (dict con las columnas de breakdown)."""
+    where, params = _where(**filters)
+    columns, rows = store.query(f'SELECT {_AGGREGATES} FROM predictions{where}', params)
+    return _finish(pd.DataFrame(rows, columns=columns)).iloc[0].to_dict()
+
+
+def calibration(store, bins=10, **filters):
+    """
+    Calibración de Prob_IA: frecuencia real de acierto por tramo de
+    probabilidad predicha (se excluyen los push).
+
+    Returns:
+        pd.DataFrame: bin, prob_lo, prob_hi, n, avg_prob, hit_rate, gap (hit_rate - avg_prob)
+    """
+    where, params = _where(**filters)
+    where += (' AND ' if where else ' WHERE ') + "Status != 'Push' AND Prob_IA IS NOT NULL"
+    sql = (f'SELECT MIN(CAST(Prob_IA * ? AS INTEGER), ?) AS bin, COUNT(*) AS n, '
+           f"AVG(Prob_IA) AS avg_prob, AVG(Status = 'Win') AS hit_rate, "
+           f"AVG((Prob_IA - (Status = 'Win')) * (Prob_IA - (Status = 'Win'))) AS brier "
+           f'FROM predictions{where} GROUP BY bin ORDER BY bin')
+    columns, rows = store.query(sql, [bins, bins - 1] + params)
+    df = pd.DataFrame(rows, columns=columns)
+    df.insert(1, 'prob_lo', df['bin'] / bins)
+    df.insert(2, 'prob_hi', (df['bin'] + 1) / bins)
+    df['gap'] = df['hit_rate'] - df['avg_prob']
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Análisis del log de predicciones")
+    parser.add_argument('--db', default=LOG_DB_PATH, help="Base del log")
+    parser.add_argument('--by', default='league',
+                        help=f"Dimensiones separadas por comas ({', '.join(GROUP_KEYS)})")
+    parser.add_argument('--league')
+    parser.add_argument('--market', help="Prefijo de Event_Type (p. ej. 'Corners')")
+    parser.add_argument('--team')
+    parser.add_argument('--since', help="Fecha inicial (YYYY-MM-DD, incluida)")
+    parser.add_argument('--until', help="Fecha final (YYYY-MM-DD, excluida)")
+    parser.add_argument('--calibration', action='store_true', help="Tabla de calibración de Prob_IA")
+    parser.add_argument('--bins', type=int, default=10)
+    parser.add_argument('--settle', action='store_true', help="Liquidar pendientes antes de consultar")
+    args = parser.parse_args(argv)
+
+    from logger import PredictionLogger, get_store
+    if args.settle:
+        PredictionLogger.calculate_results(args.db)
+    store = get_store(args.db)
+    filters = {k: getattr(args, k) for k in ('league', 'market', 'team', 'since', 'until')}
+
+    try:
+        if args.calibration:
+            table = calibration(store, bins=args.bins, **filters)
+        else:
+            table = breakdown(store, by=[k.strip() for k in args.by.split(',') if k.strip()], **filters)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    if table.empty:
+        print("[INFO] No hay predicciones liquidadas con esos filtros")
+        return 0
+    with pd.option_context('display.float_format', '{:.3f}'.format, 'display.width', 160):
+        print(table.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
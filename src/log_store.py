@@ -0,0 +1,226 @@
+"""
+Almacén del log de predicciones (SQLite, solo anexado).
+
+Cada guardado inserta las filas nuevas en una transacción: el coste no
+depende del tamaño del histórico (antes se leía y reescribía el Excel entero
+en cada predicción). El Excel pasa a ser una exportación bajo demanda
+(export_excel) con las mismas hojas de siempre: Predictions y Validations.
+
+La primera vez que se abre el almacén, si existe un prediction_log.xlsx
+antiguo, sus filas se importan una sola vez.
+"""
+
+import os
+import sqlite3
+import threading
+import pandas as pd
+
+LOG_DB_PATH = 'data/prediction_log.db'
+EXCEL_EXPORT_PATH = 'data/prediction_log.xlsx'
+
+# Tabla -> (hoja del Excel, columnas y tipo SQLite, en el orden de la hoja)
+TABLES = {
+    'predictions': ('Predictions', (
+        ('Timestamp', 'TEXT'),
+        ('Date_Prediction', 'TEXT'),
+        ('HomeTeam', 'TEXT'),
+        ('AwayTeam', 'TEXT'),
+        ('Event_Type', 'TEXT'),  # 'Corners', 'Shots', etc.
+        ('Over_Line', 'REAL'),
+        ('Prob_IA', 'REAL'),
+        ('Cuota', 'REAL'),
+        ('Kelly_Amount', 'REAL'),
+        ('Instability_Score', 'REAL'),
+        ('Status', 'TEXT'),  # 'Pending', 'Win', 'Loss'
+        ('Result_Value', 'REAL'),  # Valor real del evento
+        ('Payout', 'REAL'),  # Ganancia/pérdida
+        ('Notes', 'TEXT'),
+        ('Div', 'TEXT'),  # Liga del partido
+    )),
+    'validations': ('Validations', (
+        ('Timestamp', 'TEXT'),
+        ('Date_Match', 'TEXT'),
+        ('HomeTeam', 'TEXT'),
+        ('AwayTeam', 'TEXT'),
+        ('Partido', 'TEXT'),
+        ('Event_Type', 'TEXT'),
+        ('Selección', 'TEXT'),
+        ('Prediction_IA', 'REAL'),
+        ('Actual_Value', 'REAL'),
+        ('Accuracy', 'REAL'),
+        ('Status', 'TEXT'),
+        ('Notes', 'TEXT'),
+    )),
+}
+
+
+# Índices para las consultas de log_analytics.py (fecha, liga, mercado, equipo)
+INDEXES = {
+    'predictions': (
+        ('idx_predictions_date', ('Date_Prediction',)),
+        ('idx_predictions_div', ('Div', 'Date_Prediction')),
+        ('idx_predictions_event', ('Event_Type', 'Over_Line')),
+        ('idx_predictions_home', ('HomeTeam',)),
+        ('idx_predictions_away', ('AwayTeam',)),
+        ('idx_predictions_status', ('Status',)),
+    ),
+    'validations': (
+        ('idx_validations_date', ('Date_Match',)),
+        ('idx_validations_event', ('Event_Type',)),
+    ),
+}
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def table_columns(table):
+    """Columnas de una tabla del log (orden de la hoja Excel)."""
+    return [name for name, _ in TABLES[table][1]]
+
+
+class LogStore:
+    """
+    Log de predicciones y validaciones sobre SQLite.
+
+    Args:
+        path (str): Base de datos (se crea si no existe)
+        legacy_excel (str, optional): Excel antiguo a importar al crear la base
+    """
+
+    def __init__(self, path=LOG_DB_PATH, legacy_excel=EXCEL_EXPORT_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL: los anexados no reescriben la base y los lectores no bloquean
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._lock, self._conn:
+            for table, (_, columns) in TABLES.items():
+                cols = ', '.join(f'{_quote(name)} {kind}' for name, kind in columns)
+                self._conn.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                                   f'(id INTEGER PRIMARY KEY AUTOINCREMENT, {cols})')
+                # Columnas añadidas después de crear la base (p. ej. Div)
+                existing = {row[1] for row in self._conn.execute(f'PRAGMA table_info({table})')}
+                for name, kind in columns:
+                    if name not in existing:
+                        self._conn.execute(f'ALTER TABLE {table} ADD COLUMN {_quote(name)} {kind}')
+                for index, index_cols in INDEXES.get(table, ()):
+                    self._conn.execute(f'CREATE INDEX IF NOT EXISTS {index} ON {table} '
+                                       f'({", ".join(_quote(c) for c in index_cols)})')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        if self._meta('excel_imported') is None:
+            # Solo al crear la base: después el Excel es una exportación de ella
+            if legacy_excel and os.path.exists(legacy_excel):
+                self._import_excel(legacy_excel)
+            with self._lock, self._conn:
+                self._set_meta('excel_imported', os.path.abspath(legacy_excel or ''))
+
+    # ── Metadatos ──────────────────────────────────────────────────────────
+    def _meta(self, key):
+        row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def _import_excel(self, path):
+        """Importa (una vez) las hojas de un prediction_log.xlsx antiguo."""
+        imported = 0
+        for table, (sheet, _) in TABLES.items():
+            try:
+                df = pd.read_excel(path, sheet_name=sheet)
+            except Exception:
+                continue
+            records = df.astype(object).where(df.notna(), None).to_dict('records')
+            imported += self.append(table, records)
+        if imported:
+            print(f"[INFO] {imported} registros importados de {path} a {self.path}")
+
+    # ── Escritura ──────────────────────────────────────────────────────────
+    def append(self, table, records):
+        """
+        Anexa registros en una sola transacción (coste proporcional a los
+        registros nuevos, no al histórico). Las claves que no son columnas
+        de la tabla se ignoran.
+
+        Returns:
+            int: filas insertadas
+        """
+        if not records:
+            return 0
+        columns = table_columns(table)
+        sql = (f'INSERT INTO {table} ({", ".join(_quote(c) for c in columns)}) '
+               f'VALUES ({", ".join("?" * len(columns))})')
+        rows = [tuple(rec.get(c) for c in columns) for rec in records]
+        with self._lock, self._conn:
+            self._conn.executemany(sql, rows)
+        return len(rows)
+
+    def update(self, table, ids, values):
+        """
+        Actualiza columnas de filas existentes por id.
+
+        Args:
+            ids: ids de las filas
+            values (dict): columna -> secuencia de valores alineada con ids
+        """
+        columns = list(values)
+        sql = (f'UPDATE {table} SET {", ".join(f"{_quote(c)} = ?" for c in columns)} '
+               f'WHERE id = ?')
+        rows = [tuple(values[c][i] for c in columns) + (int(row_id),) for i, row_id in enumerate(ids)]
+        with self._lock, self._conn:
+            self._conn.executemany(sql, rows)
+
+    # ── Lectura / exportación ──────────────────────────────────────────────
+    def read(self, table, where=None, params=()):
+        """
+        Filas de una tabla como DataFrame (con su id).
+
+        Args:
+            where (str, optional): Condición SQL (p. ej. "Status = ?")
+            params: Parámetros de la condición
+        """
+        columns = ['id'] + table_columns(table)
+        sql = f'SELECT {", ".join(_quote(c) for c in columns)} FROM {table}'
+        if where:
+            sql += f' WHERE {where}'
+        with self._lock:
+            rows = self._conn.execute(sql + ' ORDER BY id', params).fetchall()
+        return pd.DataFrame(rows, columns=columns)
+
+    def query(self, sql, params=()):
+        """
+        Consulta SQL de solo lectura.
+
+        Returns:
+            tuple: (nombres de columna, lista de filas)
+        """
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            return [d[0] for d in cursor.description], cursor.fetchall()
+
+    def count(self, table):
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+    def export_excel(self, path=EXCEL_EXPORT_PATH):
+        """
+        Exporta el log completo a Excel (hojas Predictions y Validations).
+
+        Returns:
+            str: ruta del Excel escrito
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f'{path}.tmp-{os.getpid()}.xlsx'
+        with pd.ExcelWriter(tmp, engine='openpyxl') as writer:
+            for table, (sheet, _) in TABLES.items():
+                self.read(table).drop(columns='id').to_excel(writer, sheet_name=sheet, index=False)
+        os.replace(tmp, path)
+        return path
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
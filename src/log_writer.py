@@ -0,0 +1,157 @@
+"""
+Escritura en segundo plano del log de predicciones.
+
+Las predicciones encolan sus registros en una cola acotada y vuelven al
+instante; un hilo escritor los agrupa y los anexa al LogStore en lotes.
+
+Política de vaciado (configurable, como MicroBatcher):
+    max_rows     -> se escribe en cuanto el lote acumula esta cantidad de registros
+    max_wait_ms  -> o cuando pasa este tiempo desde el primer registro pendiente
+
+La cola está acotada (max_queue envíos pendientes): si el disco no da
+abasto, submit() espera en vez de acumular memoria sin límite. Al salir del
+proceso (atexit) se escribe todo lo pendiente.
+"""
+
+import atexit
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class LogWriter:
+    """
+    Hilo escritor de un LogStore.
+
+    Args:
+        store: LogStore destino
+        max_rows (int): Tamaño de lote que fuerza la escritura
+        max_wait_ms (float): Espera máxima del primer registro del lote
+        max_queue (int): Envíos encolados como máximo (submit espera si se llena)
+    """
+
+    def __init__(self, store, max_rows=256, max_wait_ms=500.0, max_queue=1024):
+        if max_rows < 1:
+            raise ValueError("max_rows debe ser >= 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms no puede ser negativo")
+        self.store = store
+        self.max_rows = max_rows
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        # Estadísticas
+        self.batches = 0
+        self.rows = 0
+        self.errors = 0
+        self.flushes = {'size': 0, 'time': 0, 'flush': 0}
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, table, records):
+        """Encola registros para la tabla (no bloquea salvo con la cola llena)."""
+        if not records:
+            return
+        if self._closed:
+            # Tras close() (apagado) se escribe directamente
+            self.store.append(table, list(records))
+            return
+        self._queue.put((table, list(records)))
+
+    def flush(self):
+        """Espera a que todo lo encolado hasta ahora esté escrito."""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        """Escribe lo pendiente y detiene el hilo (idempotente)."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        # Envíos que llegaron a encolarse después de la parada
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is not _STOP:
+                leftover.append(item)
+        if leftover:
+            self._write(leftover, 'flush')
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch, rows, waiters, stop = [], 0, [], False
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            reason = 'time'
+            while True:
+                if item is _STOP:
+                    stop, reason = True, 'flush'
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                    reason = 'flush'
+                else:
+                    batch.append(item)
+                    rows += len(item[1])
+                if stop or waiters:
+                    # Vaciar lo que ya esté en cola sin esperar más
+                    try:
+                        item = self._queue.get_nowait()
+                        continue
+                    except queue.Empty:
+                        break
+                if rows >= self.max_rows:
+                    reason = 'size'
+                    break
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write(batch, reason)
+            for done in waiters:
+                done.set()
+            if stop:
+                return
+
+    def _write(self, batch, reason):
+        by_table = {}
+        for table, records in batch:
+            by_table.setdefault(table, []).extend(records)
+        for table, records in by_table.items():
+            try:
+                self.store.append(table, records)
+                self.rows += len(records)
+            except Exception as e:
+                self.errors += 1
+                print(f"[ERROR] No se pudieron escribir {len(records)} registros en {table}: {e}")
+        self.batches += 1
+        self.flushes[reason] += 1
+
+    def snapshot(self):
+        """Estadísticas del escritor."""
+        return {
+            'max_rows': self.max_rows,
+            'max_wait_ms': self.max_wait_ms,
+            'queued': self._queue.qsize(),
+            'batches': self.batches,
+            'rows': self.rows,
+            'errors': self.errors,
+            'flushes': dict(self.flushes),
+        }
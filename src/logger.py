@@ -1,43 +1,63 @@
-import pandas as pd
 import os
 from datetime import datetime
+from log_store import LOG_DB_PATH, EXCEL_EXPORT_PATH, LogStore
+from log_writer import LogWriter
+from settlement import RESULTS_DIR, roi_summary, settle_store
+
+_stores = {}
+_writers = {}
+
+
+def get_store(log_file=LOG_DB_PATH):
+    """
+    LogStore de un archivo de log (uno por ruta y proceso). Acepta también la
+    ruta .xlsx antigua: se usa la base .db de al lado y el Excel como exportación.
+    """
+    db_path, export_path = log_file, EXCEL_EXPORT_PATH
+    if log_file.endswith('.xlsx'):
+        db_path, export_path = os.path.splitext(log_file)[0] + '.db', log_file
+    key = os.path.abspath(db_path)
+    if key not in _stores:
+        _stores[key] = LogStore(db_path, legacy_excel=export_path)
+    return _stores[key]
+
+
+def get_writer(log_file=LOG_DB_PATH):
+    """LogWriter en segundo plano del log (uno por base y proceso)."""
+    store = get_store(log_file)
+    key = os.path.abspath(store.path)
+    if key not in _writers:
+        _writers[key] = LogWriter(store)
+    return _writers[key]
+
 
 class PredictionLogger:
     """
     Logger para registrar predicciones y sus resultados.
-    Guarda en Excel para auditoría y backtesting.
+    Guarda en un log SQLite solo anexado (log_store.py) para auditoría y
+    backtesting; el Excel se genera bajo demanda con export_excel().
+    Las escrituras las hace un hilo en segundo plano (log_writer.py), así que
+    save_predictions no añade E/S de disco a la latencia de la predicción.
     """
     
-    def __init__(self, log_file="data/prediction_log.xlsx"):
-        self.log_file = log_file
+    def __init__(self, log_file=LOG_DB_PATH):
+        self.store = get_store(log_file)
+        self.writer = get_writer(log_file)
+        self.log_file = self.store.path
         self.predictions = []
-        
-        # Crear archivo si no existe
-        if not os.path.exists(log_file):
-            self._create_empty_log()
+        self.validations = []
+    
+    def flush(self):
+        """Espera a que las predicciones encoladas estén escritas"""
+        self.writer.flush()
     
-    def _create_empty_log(self):
-        """Crea un Excel vacío con la estructura correcta"""
-        df = pd.DataFrame(columns=[
-            'Timestamp',
-            'Date_Prediction',
-            'HomeTeam',
-            'AwayTeam',
-            'Event_Type',  # 'Corners', 'Shots', etc.
-            'Over_Line',
-            'Prob_IA',
-            'Cuota',
-            'Kelly_Amount',
-            'Instability_Score',
-            'Status',  # 'Pending', 'Win', 'Loss'
-            'Result_Value',  # Valor real del evento
-            'Payout',  # Ganancia/pérdida
-            'Notes'
-        ])
-        df.to_excel(self.log_file, index=False, sheet_name='Predictions')
+    def export_excel(self, path=EXCEL_EXPORT_PATH):
+        """Exporta el log completo a Excel (hojas Predictions y Validations)"""
+        self.flush()
+        return self.store.export_excel(path)
     
     def log_prediction(self, date_pred, home_team, away_team, event_type, over_line, 
-                      prob_ia, cuota, kelly_amount, instability_score=0, notes=""):
+                      prob_ia, cuota, kelly_amount, instability_score=0, notes="", league=None):
         """
         Registra una predicción
         
@@ -52,6 +72,7 @@ class PredictionLogger:
             kelly_amount (float): Monto recomendado por Kelly
             instability_score (float): Score de inestabilidad
             notes (str): Notas adicionales
+            league (str): Liga del partido (código Div)
         """
         prediction = {
             'Timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -67,89 +88,58 @@ class PredictionLogger:
             'Status': 'Pending',
             'Result_Value': None,
             'Payout': None,
-            'Notes': notes
+            'Notes': notes,
+            'Div': league,
         }
         self.predictions.append(prediction)
     
     def save_predictions(self):
-        """Guarda las predicciones al archivo Excel"""
+        """Encola las predicciones pendientes para el escritor del log"""
         if not self.predictions:
             return
         
-        # Leer existing data si existe
-        try:
-            existing_df = pd.read_excel(self.log_file, sheet_name='Predictions')
-        except:
-            existing_df = pd.DataFrame(columns=[
-                'Timestamp', 'Date_Prediction', 'HomeTeam', 'AwayTeam', 'Event_Type',
-                'Over_Line', 'Prob_IA', 'Cuota', 'Kelly_Amount', 'Instability_Score',
-                'Status', 'Result_Value', 'Payout', 'Notes'
-            ])
-        
-        # Combinar y guardar
-        new_df = pd.DataFrame(self.predictions)
-        combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-        combined_df.to_excel(self.log_file, index=False, sheet_name='Predictions')
+        self.writer.submit('predictions', self.predictions)
         
         # Limpiar predictions después de guardar
         self.predictions = []
     
     @staticmethod
-    def calculate_results(log_file="data/prediction_log.xlsx", results_file="data/match_results.xlsx"):
+    def calculate_results(log_file=LOG_DB_PATH, results_dir=RESULTS_DIR):
         """
-        Automático: Calcula W/L basado en resultados reales
-        Requiere que se haya llenado 'Result_Value' manualmente o vía API
+        Automático: liquida las predicciones pendientes contra los resultados
+        reales de los CSV de liga (settlement.py) y muestra el ROI
         
         Args:
-            log_file: Archivo de predicciones
-            results_file: Archivo con resultados (opcional)
-        """
-        try:
-            df = pd.read_excel(log_file, sheet_name='Predictions')
-        except:
-            print("No hay archivo de predicciones")
-            return
-        
-        # Calcular SI hay datos de resultado
-        df['Payout'] = df.apply(
-            lambda row: (
-                row['Kelly_Amount'] * row['Cuota'] 
-                if (row['Result_Value'] is not None and row['Result_Value'] >= row['Over_Line'])
-                else (
-                    -row['Kelly_Amount'] 
-                    if (row['Result_Value'] is not None and row['Status'] == 'Pending')
-                    else None
-                )
-            ),
-            axis=1
-        )
+            log_file: Log de predicciones
+            results_dir: Carpeta con los CSV de liga
         
-        df['Status'] = df.apply(
-            lambda row: (
-                'Win' if (row['Payout'] is not None and row['Payout'] > 0)
-                else ('Loss' if (row['Payout'] is not None and row['Payout'] < 0) else 'Pending')
-            ),
-            axis=1
-        )
+        Returns:
+            dict: resumen de roi_summary (None si no hay predicciones)
+        """
+        get_writer(log_file).flush()
+        store = get_store(log_file)
+        if store.count('predictions') == 0:
+            print("No hay predicciones registradas")
+            return None
         
-        df.to_excel(log_file, index=False, sheet_name='Predictions')
+        n_settled = settle_store(store, data_dir=results_dir)
         
         # Mostrar estadísticas
-        completed = df[df['Status'] != 'Pending']
-        if len(completed) > 0:
-            total_roi = completed['Payout'].sum()
-            total_staked = completed[completed['Status'] == 'Loss']['Kelly_Amount'].sum()
-            roi_percent = (total_roi / total_staked * 100) if total_staked > 0 else 0
-            
+        summary = roi_summary(store.read('predictions', 'Status != ?', ('Pending',)))
+        if summary['n'] > 0:
             print("\n" + "═"*50)
             print("ESTADÍSTICAS DE BACKTESTING")
             print("═"*50)
-            print(f"Predicciones Completadas: {len(completed)}")
-            print(f"Ganancias: {completed[completed['Status'] == 'Win']['Payout'].sum():.2f}€")
-            print(f"Pérdidas: {completed[completed['Status'] == 'Loss']['Payout'].sum():.2f}€")
-            print(f"ROI Total: {total_roi:.2f}€")
-            print(f"ROI %: {roi_percent:.2f}%")
+            print(f"Liquidadas en esta pasada: {n_settled}")
+            print(f"Predicciones Completadas: {summary['n']} "
+                  f"({summary['wins']}W / {summary['losses']}L / {summary['pushes']}P)")
+            print(f"Acierto: {summary['hit_rate']*100:.1f}%")
+            print(f"Ganancias: {summary['won']:.2f}€")
+            print(f"Pérdidas: {summary['lost']:.2f}€")
+            print(f"ROI Total: {summary['profit']:.2f}€ (apostado {summary['staked']:.2f}€)")
+            print(f"ROI %: {summary['roi']*100:.2f}%")
             print("═"*50)
+        return summary
     
     def log_validation(self, date_match, home_team, away_team, event_type, selection, 
                       prediction_value, actual_value, precision=None, notes=""):
@@ -207,39 +197,23 @@ class PredictionLogger:
             'Notes': notes
         }
         
-        self.predictions.append(validation)
+        self.validations.append(validation)
     
-    def save_validations(self, sheet_name='Validations'):
-        """Guarda validaciones en una sheet separada del Excel"""
-        if not self.predictions:
+    def save_validations(self):
+        """Encola las validaciones pendientes (tabla/hoja Validations)"""
+        if not self.validations:
             return
         
-        log_file = self.log_file
-        
-        # Verificar si el archivo existe y tiene la sheet
-        try:
-            with pd.ExcelWriter(log_file, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-                df_validations = pd.DataFrame(self.predictions)
-                df_validations.to_excel(writer, sheet_name=sheet_name, index=False)
-        except:
-            # Si la sheet no existe o hay error, crearla
-            try:
-                df_validations = pd.DataFrame(self.predictions)
-                df_validations.to_excel(log_file, sheet_name=sheet_name, index=False)
-            except:
-                print(f"[ERROR] No se pudo guardar validaciones en {log_file}")
+        self.writer.submit('validations', self.validations)
         
         # Limpiar después de guardar
-        self.predictions = []
+        self.validations = []
     
     @staticmethod
-    def print_validation_summary(log_file="data/prediction_log.xlsx", sheet_name='Validations'):
+    def print_validation_summary(log_file=LOG_DB_PATH):
         """Muestra resumen de validaciones (precisión promedio, aciertos, etc.)"""
-        try:
-            df = pd.read_excel(log_file, sheet_name=sheet_name)
-        except:
-            print(f"[ERROR] No se encontró sheet '{sheet_name}' en {log_file}")
-            return
+        get_writer(log_file).flush()
+        df = get_store(log_file).read('validations')
         
         if len(df) == 0:
             print("No hay validaciones registradas")
@@ -7,7 +7,7 @@ Version: 2.0 - Interfaz Profesional
 import os
 import sys
 import subprocess
-import pandas as pd
+import time
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
@@ -38,6 +38,30 @@ LIGAS_DICT = {
     'CL': '[EUROPA] Champions League'
 }
 
+# Sesión de predicción (dataset + modelos en memoria), se crea en la primera predicción
+_sesion = None
+
+
+def obtener_sesion():
+    """Devuelve la sesión de predicción, cargándola la primera vez"""
+    global _sesion
+    if _sesion is None:
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+        from predictor import PredictorSession
+        console.print(f"[{INFO_COLOR}]Cargando modelos y datos...[/{INFO_COLOR}]")
+        _sesion = PredictorSession()
+    return _sesion
+
+
+def recargar_sesion():
+    """Recarga la sesión tras preprocesar/entrenar (si ya estaba cargada)"""
+    if _sesion is not None:
+        try:
+            segundos = _sesion.reload()
+            console.print(f"[{SUCCESS_COLOR}][OK] Sesion recargada ({segundos:.1f}s)[/{SUCCESS_COLOR}]")
+        except Exception as e:
+            console.print(f"[{ERROR_COLOR}]No se pudo recargar la sesion: {str(e)}[/{ERROR_COLOR}]")
+
 
 def limpiar_consola():
     """Limpia la consola de forma multiplataforma"""
@@ -58,8 +82,8 @@ def menu_principal():
         ("1", "Preprocesar Datos", "Ejecuta preprocessor.py - Procesa dataset y features"),
         ("2", "Entrenar Modelos", "Ejecuta train.py - Entrena XGBoost"),
         ("3", "Prediccion Asistida", "Flujo: Liga -> Equipos -> Cuotas -> Prediccion"),
-        ("4", "Backtesting", "Abre prediction_log.xlsx para analisis"),
-        ("5", "Auto-Run", "Ejecuta 1 -> 2 -> 3 consecutivamente"),
+        ("4", "Backtesting", "Liquida apuestas y muestra ROI/acierto/calibración"),
+        ("5", "Auto-Run", "Actualiza lo desfasado (1 -> 2) y pasa a 3"),
         ("0", "Salir", "Cierra el programa"),
     ]
     
@@ -75,44 +99,53 @@ def menu_principal():
     console.print()
 
 
-def ejecutar_script(script_path, descripcion):
-    """Ejecuta un script Python y muestra el progreso"""
+def etapa_pipeline(targets=None, force=()):
+    """
+    Ejecuta etapas del pipeline (pipeline.py) en este proceso: solo las
+    desfasadas, salvo las forzadas. Lanza RuntimeError si alguna falla.
+    """
+    from pipeline import run_pipeline
+    resultados = run_pipeline(targets, force)
+    fallidas = [etapa for etapa, estado in resultados.items() if estado in ('fallida', 'omitida')]
+    if fallidas:
+        raise RuntimeError(f"etapas sin completar: {', '.join(fallidas)}")
+
+
+def etapa_preprocesado():
+    """Genera dataset_final.csv (queda en DATA_CACHE y en el linaje)"""
+    etapa_pipeline(['dataset'], force=['dataset'])
+
+
+def etapa_entrenamiento():
+    """Entrena los modelos con el dataset de DATA_CACHE"""
+    etapa_pipeline(['models'], force=['models'])
+
+
+def ejecutar_etapa(etapa, descripcion):
+    """
+    Ejecuta una etapa del pipeline en el mismo proceso: la salida se ve a
+    medida que se produce y el dataset en memoria se comparte entre etapas
+    """
     console.print(f"\n[{INFO_COLOR}]>>> Iniciando: {descripcion}[/{INFO_COLOR}]")
     console.print("[" + "="*60 + "]")
     
+    inicio = time.perf_counter()
     try:
-        if not os.path.exists(script_path):
-            script_path = os.path.join(os.path.dirname(__file__), script_path)
-        
-        resultado = subprocess.run(
-            [sys.executable, script_path],
-            cwd=os.path.dirname(os.path.dirname(__file__)),
-            capture_output=True,
-            text=True,
-            timeout=600
-        )
-        
-        if resultado.stdout:
-            console.print(resultado.stdout)
-        if resultado.stderr and resultado.returncode != 0:
-            console.print(f"[{ERROR_COLOR}]{resultado.stderr}[/{ERROR_COLOR}]")
-        
-        if resultado.returncode == 0:
-            console.print(f"[{SUCCESS_COLOR}][OK] {descripcion} completado[/{SUCCESS_COLOR}]")
-        else:
-            console.print(f"[{ERROR_COLOR}][FALLO] {descripcion} presento error[/{ERROR_COLOR}]")
-    
-    except subprocess.TimeoutExpired:
-        console.print(f"[{ERROR_COLOR}][TIMEOUT] El script tardo demasiado[/{ERROR_COLOR}]")
+        etapa()
+        segundos = time.perf_counter() - inicio
+        console.print(f"[{SUCCESS_COLOR}][OK] {descripcion} completado ({segundos:.1f}s)[/{SUCCESS_COLOR}]")
+        return True
+    except KeyboardInterrupt:
+        raise
     except Exception as e:
-        console.print(f"[{ERROR_COLOR}][ERROR] {str(e)}[/{ERROR_COLOR}]")
+        console.print(f"[{ERROR_COLOR}][FALLO] {descripcion} presento error: {str(e)}[/{ERROR_COLOR}]")
+        return False
 
 
 def seleccionar_liga():
     """Muestra ligas disponibles y retorna la seleccionada"""
     try:
-        df = pd.read_csv('data/dataset_final.csv')
-        ligas = df['Div'].unique()
+        catalogo = obtener_sesion().state.catalog
         
         console.print("\n[bold cyan]SELECCIONA LIGA:[/bold cyan]")
         tabla_ligas = Table(show_header=True, header_style=f"bold {HEADER_COLOR}")
@@ -122,10 +155,9 @@ def seleccionar_liga():
         
         liga_map = {}
         idx = 1
-        for liga in sorted(ligas):
+        for liga, n_partidos in catalogo.leagues.items():
             # Usa el diccionario global; si no existe, muestra el código
             nombre_liga = LIGAS_DICT.get(liga, f'[?] {liga}')
-            n_partidos = len(df[df['Div'] == liga])
             tabla_ligas.add_row(str(idx), nombre_liga, str(n_partidos))
             liga_map[idx] = liga
             idx += 1
@@ -147,13 +179,30 @@ def seleccionar_liga():
         return None
 
 
+def elegir_equipo(mensaje, equipo_map, catalogo, liga):
+    """Lee un equipo por numero o por nombre (busqueda en el catalogo); None si no es valido"""
+    entrada = input(mensaje).strip()
+    if entrada.isdigit():
+        if int(entrada) in equipo_map:
+            return equipo_map[int(entrada)]
+        console.print(f"[{ERROR_COLOR}]Opcion invalida[/{ERROR_COLOR}]")
+        return None
+    coincidencias = catalogo.search(entrada, league=liga)
+    exactas = [e for e in coincidencias if e.casefold() == entrada.casefold()]
+    if len(coincidencias) == 1 or exactas:
+        return (exactas or coincidencias)[0]
+    if coincidencias:
+        console.print(f"[{INFO_COLOR}]Coincidencias: {', '.join(coincidencias[:10])}[/{INFO_COLOR}]")
+    else:
+        console.print(f"[{ERROR_COLOR}]Sin coincidencias para '{entrada}'[/{ERROR_COLOR}]")
+    return None
+
+
 def seleccionar_equipos(liga):
     """Muestra equipos de una liga y retorna local y visitante"""
     try:
-        df = pd.read_csv('data/dataset_final.csv')
-        df_liga = df[df['Div'] == liga]
-        
-        equipos = sorted(pd.concat([df_liga['HomeTeam'], df_liga['AwayTeam']]).unique())
+        catalogo = obtener_sesion().state.catalog
+        equipos = catalogo.league_teams(liga)
         
         console.print(f"\n[bold cyan]EQUIPOS DE LA LIGA (Total: {len(equipos)})[/bold cyan]\n")
         
@@ -163,8 +212,7 @@ def seleccionar_equipos(liga):
         tabla_equipos.add_column("PJ", style="green", width=5)
         
         equipo_map = {}
-        for idx, equipo in enumerate(equipos, 1):
-            n_partidos = len(df_liga[(df_liga['HomeTeam'] == equipo) | (df_liga['AwayTeam'] == equipo)])
+        for idx, (equipo, n_partidos) in enumerate(equipos, 1):
             tabla_equipos.add_row(str(idx), equipo, str(n_partidos))
             equipo_map[idx] = equipo
         
@@ -172,32 +220,20 @@ def seleccionar_equipos(liga):
         
         # Seleccionar Local
         while True:
-            try:
-                local_idx = int(input("\n[LOCAL] Selecciona numero: "))
-                if local_idx in equipo_map:
-                    local = equipo_map[local_idx]
-                    break
-                else:
-                    console.print(f"[{ERROR_COLOR}]Opcion invalida[/{ERROR_COLOR}]")
-            except ValueError:
-                console.print(f"[{ERROR_COLOR}]Numero invalido[/{ERROR_COLOR}]")
+            local = elegir_equipo("\n[LOCAL] Selecciona numero o nombre: ", equipo_map, catalogo, liga)
+            if local is not None:
+                break
         
         console.print(f"[{SUCCESS_COLOR}][OK] Local: {local}[/{SUCCESS_COLOR}]")
         
         # Seleccionar Visitante
         while True:
-            try:
-                visitante_idx = int(input("\n[VISITANTE] Selecciona numero: "))
-                if visitante_idx in equipo_map:
-                    visitante = equipo_map[visitante_idx]
-                    if visitante != local:
-                        break
-                    else:
-                        console.print(f"[{ERROR_COLOR}]Visitante debe diferir del local[/{ERROR_COLOR}]")
-                else:
-                    console.print(f"[{ERROR_COLOR}]Opcion invalida[/{ERROR_COLOR}]")
-            except ValueError:
-                console.print(f"[{ERROR_COLOR}]Numero invalido[/{ERROR_COLOR}]")
+            visitante = elegir_equipo("\n[VISITANTE] Selecciona numero o nombre: ", equipo_map, catalogo, liga)
+            if visitante is None:
+                continue
+            if visitante != local:
+                break
+            console.print(f"[{ERROR_COLOR}]Visitante debe diferir del local[/{ERROR_COLOR}]")
         
         console.print(f"[{SUCCESS_COLOR}][OK] Visitante: {visitante}[/{SUCCESS_COLOR}]")
         
@@ -232,35 +268,89 @@ def opcion_prediccion():
     
     console.print("\n" + "="*60)
     try:
-        sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
-        from predict import predict_final_boss
+        sesion = obtener_sesion()
         
         # Pasar la liga para contexto inteligente (Champions + Liga doméstica)
-        predict_final_boss(local, visitante, h, d, a, match_league=liga)
+        sesion.report(local, visitante, h, d, a, match_league=liga)
         console.print(f"[{SUCCESS_COLOR}][OK] Prediccion completada[/{SUCCESS_COLOR}]")
     except Exception as e:
         console.print(f"[{ERROR_COLOR}]Error: {str(e)}[/{ERROR_COLOR}]")
 
 
+def tabla_resumen(df, titulo):
+    """Muestra una tabla de log_analytics (ROI / acierto por grupo)"""
+    import pandas as pd
+    tabla = Table(title=titulo, show_header=True, header_style=f"bold {HEADER_COLOR}")
+    claves = [c for c in df.columns if c not in ('n', 'wins', 'losses', 'pushes', 'bets', 'staked',
+                                                  'profit', 'avg_prob', 'hit_rate', 'roi')]
+    for col in claves:
+        tabla.add_column(col.capitalize(), style="magenta")
+    for col in ("N", "W-L-P", "Acierto", "Apostado", "Beneficio", "ROI"):
+        tabla.add_column(col, style="green", justify="right")
+    for _, fila in df.iterrows():
+        roi = f"{fila['roi']*100:.1f}%" if pd.notna(fila['roi']) else "-"
+        acierto = f"{fila['hit_rate']*100:.1f}%" if pd.notna(fila['hit_rate']) else "-"
+        tabla.add_row(*[str(fila[c]) for c in claves], str(int(fila['n'])),
+                      f"{int(fila['wins'])}-{int(fila['losses'])}-{int(fila['pushes'])}",
+                      acierto, f"{fila['staked']:.2f}€", f"{fila['profit']:.2f}€", roi)
+    console.print(tabla)
+
+
+def abrir_excel(log_path):
+    """Abre el Excel exportado con la aplicación del sistema"""
+    console.print(f"[{SUCCESS_COLOR}]Abriendo {log_path}...[/{SUCCESS_COLOR}]")
+    try:
+        if os.name == 'nt':
+            os.startfile(log_path)
+        elif os.name == 'posix':
+            subprocess.Popen(['open', log_path])
+        console.print(f"[{SUCCESS_COLOR}][OK] Archivo abierto[/{SUCCESS_COLOR}]")
+    except Exception as e:
+        console.print(f"[{ERROR_COLOR}]Error: {str(e)}[/{ERROR_COLOR}]")
+
+
 def opcion_backtesting():
-    """Abre el archivo de log de predicciones"""
+    """Liquida las predicciones pendientes y muestra ROI/acierto/calibración del log"""
     limpiar_consola()
     console.print(Panel("[*] BACKTESTING", border_style=ACCENT_COLOR, expand=False))
     
-    log_path = 'data/prediction_log.xlsx'
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+    from logger import PredictionLogger, get_store
+    from log_analytics import breakdown, calibration
     
-    if os.path.exists(log_path):
-        console.print(f"[{SUCCESS_COLOR}]Abriendo {log_path}...[/{SUCCESS_COLOR}]")
+    try:
+        PredictionLogger.calculate_results()
+        store = get_store()
+    except Exception as e:
+        console.print(f"[{ERROR_COLOR}]No se pudo liquidar el log: {str(e)}[/{ERROR_COLOR}]")
+        return
+    
+    # Consultas agregadas en SQL (solo llegan a pandas las tablas resumen)
+    por_liga = breakdown(store, by='league')
+    if por_liga.empty:
+        console.print(f"[{INFO_COLOR}]Aún no hay predicciones liquidadas[/{INFO_COLOR}]")
+    else:
+        tabla_resumen(por_liga, "POR LIGA")
+        tabla_resumen(breakdown(store, by=('market', 'line')), "POR MERCADO Y LÍNEA")
+        tabla_resumen(breakdown(store, by='month').tail(12), "ÚLTIMOS 12 MESES")
+        
+        calib = calibration(store, bins=10)
+        tabla = Table(title="CALIBRACIÓN (Prob_IA vs acierto real)", show_header=True,
+                      header_style=f"bold {HEADER_COLOR}")
+        for col in ("Tramo", "N", "Prob. media", "Acierto", "Desvío"):
+            tabla.add_column(col, style="green", justify="right")
+        for _, fila in calib.iterrows():
+            tabla.add_row(f"{fila['prob_lo']:.0%}-{fila['prob_hi']:.0%}", str(int(fila['n'])),
+                          f"{fila['avg_prob']*100:.1f}%", f"{fila['hit_rate']*100:.1f}%",
+                          f"{fila['gap']*100:+.1f}%")
+        console.print(tabla)
+        console.print(f"[{INFO_COLOR}]Más consultas: python src/log_analytics.py --help[/{INFO_COLOR}]")
+    
+    if input("\n¿Exportar el log a Excel y abrirlo? (s/N): ").strip().lower() == 's':
         try:
-            if os.name == 'nt':
-                os.startfile(log_path)
-            elif os.name == 'posix':
-                subprocess.Popen(['open', log_path])
-            console.print(f"[{SUCCESS_COLOR}][OK] Archivo abierto[/{SUCCESS_COLOR}]")
+            abrir_excel(PredictionLogger().export_excel())
         except Exception as e:
-            console.print(f"[{ERROR_COLOR}]Error: {str(e)}[/{ERROR_COLOR}]")
-    else:
-        console.print(f"[{ERROR_COLOR}]Archivo no encontrado: {log_path}[/{ERROR_COLOR}]")
+            console.print(f"[{ERROR_COLOR}]No se pudo exportar el log: {str(e)}[/{ERROR_COLOR}]")
 
 
 def opcion_autorun():
@@ -269,11 +359,10 @@ def opcion_autorun():
     console.print(Panel("[*] AUTO-RUN (Preprocesar -> Entrenar -> Prediccion)", 
                        border_style=ACCENT_COLOR, expand=False))
     
-    ejecutar_script('src/preprocessor.py', 'Preprocesamiento')
-    input("\nPresiona Enter para continuar...")
-    
-    limpiar_consola()
-    ejecutar_script('src/train.py', 'Entrenamiento')
+    # Solo se repiten las etapas cuyas entradas cambiaron (CSV de liga, dataset, código)
+    if not ejecutar_etapa(etapa_pipeline, 'Pipeline (datos -> modelos -> bundle)'):
+        return
+    recargar_sesion()
     input("\nPresiona Enter para continuar...")
     
     opcion_prediccion()
@@ -289,12 +378,14 @@ def main():
         try:
             if opcion == "1":
                 limpiar_consola()
-                ejecutar_script('src/preprocessor.py', 'Preprocesamiento')
+                ejecutar_etapa(etapa_preprocesado, 'Preprocesamiento')
+                recargar_sesion()
                 input("\n[cyan]Enter para volver al menu...[/cyan]")
             
             elif opcion == "2":
                 limpiar_consola()
-                ejecutar_script('src/train.py', 'Entrenamiento')
+                ejecutar_etapa(etapa_entrenamiento, 'Entrenamiento')
+                recargar_sesion()
                 input("\n[cyan]Enter para volver al menu...[/cyan]")
             
             elif opcion == "3":
@@ -333,322 +424,3 @@ if __name__ == "__main__":
         limpiar_consola()
         print("Programa interrumpido por el usuario")
         sys.exit(0)
-
-# Colores y estilos
-HEADER_COLOR = "cyan"
-SUCCESS_COLOR = "green"
-ERROR_COLOR = "red"
-INFO_COLOR = "yellow"
-ACCENT_COLOR = "magenta"
-
-
-def limpiar_consola():
-    """Limpia la consola de forma multiplataforma"""
-    os.system('cls' if os.name == 'nt' else 'clear')
-
-
-def menu_principal():
-    """Muestra el menú principal de forma profesional"""
-    limpiar_consola()
-    
-    titulo = Text("[*] SISTEMA DE PREDICCIÓN DEPORTIVA v2.0", style=f"bold {HEADER_COLOR}")
-    console.print(Panel(titulo, expand=False, border_style=ACCENT_COLOR))
-    
-    fecha = datetime.now().strftime("%d de %B de %Y - %H:%M:%S")
-    console.print(f"[{INFO_COLOR}]Fecha: {fecha}[/{INFO_COLOR}]\n")
-    
-    opciones = [
-        ("1", "Preprocesar Datos", "Ejecuta preprocessor.py - Procesa dataset y features"),
-        ("2", "Entrenar Modelos", "Ejecuta train.py - Entrena XGBoost"),
-        ("3", "Predicción Asistida", "Flujo de selección por liga -> equipo -> predicción"),
-        ("4", "Backtesting", "Abre prediction_log.xlsx para análisis"),
-        ("5", "Auto-Run", "Ejecuta 1 -> 2 -> 3 consecutivamente"),
-        ("0", "Salir", "Cierra el programa"),
-    ]
-    
-    table = Table(title="MENÚ DE OPCIONES", show_header=True, header_style=f"bold {HEADER_COLOR}")
-    table.add_column("Opción", style="cyan", width=8)
-    table.add_column("Acción", style="magenta", width=20)
-    table.add_column("Descripción", style="white", width=55)
-    
-    for opcion, accion, desc in opciones:
-        table.add_row(opcion, accion, desc)
-    
-    console.print(table)
-    console.print()
-
-
-def ejecutar_script(script_path, descripcion):
-    """Ejecuta un script Python y muestra el progreso"""
-    console.print(f"\n[{INFO_COLOR}]> Iniciando: {descripcion}[/{INFO_COLOR}]")
-    console.print("─" * 60)
-    
-    try:
-        # Convertir a ruta relativa si es necesario
-        if not os.path.exists(script_path):
-            script_path = os.path.join(os.path.dirname(__file__), script_path)
-        
-        resultado = subprocess.run(
-            [sys.executable, script_path],
-            cwd=os.path.dirname(os.path.dirname(__file__)),
-            capture_output=True,
-            text=True,
-            timeout=600
-        )
-        
-        if resultado.stdout:
-            console.print(resultado.stdout)
-        if resultado.stderr:
-            console.print(f"[{ERROR_COLOR}]{resultado.stderr}[/{ERROR_COLOR}]")
-        
-        if resultado.returncode == 0:
-            console.print(f"[{SUCCESS_COLOR}][OK] {descripcion} completado exitosamente[/{SUCCESS_COLOR}]")
-        else:
-            console.print(f"[{ERROR_COLOR}][ERROR] Error: {descripcion} fallo[/{ERROR_COLOR}]")
-    
-    except subprocess.TimeoutExpired:
-        console.print(f"[{ERROR_COLOR}][TIMEOUT] El script tardo demasiado[/{ERROR_COLOR}]")
-    except Exception as e:
-        console.print(f"[{ERROR_COLOR}][ERROR] Error: {str(e)}[/{ERROR_COLOR}]")
-
-
-def seleccionar_liga():
-    """Muestra ligas disponibles y retorna la seleccionada"""
-    try:
-        df = pd.read_csv('data/dataset_final.csv', low_memory=False)
-        ligas = df['Div'].unique()
-        ligas_dict = {
-            'SP1': '[ESPAÑA] La Liga',
-            'D1': '[ALEMANIA] Bundesliga',
-            'E0': '[UK] Premier League',
-            'E1': '[UK] Championship',
-            'L1': '[FRANCIA] Ligue 1',
-            'I1': '[ITALIA] Serie A'
-        }
-        
-        console.print("\n[bold cyan]SELECCIONA LIGA:[/bold cyan]")
-        tabla_ligas = Table(show_header=True, header_style=f"bold {HEADER_COLOR}")
-        tabla_ligas.add_column("[#]", style="cyan")
-        tabla_ligas.add_column("Liga", style="magenta")
-        tabla_ligas.add_column("Partidos", style="green")
-        
-        liga_map = {}
-        idx = 1
-        for liga in sorted(ligas):
-            if liga in ligas_dict:
-                n_partidos = len(df[df['Div'] == liga])
-                tabla_ligas.add_row(str(idx), ligas_dict[liga], str(n_partidos))
-                liga_map[idx] = liga
-                idx += 1
-        
-        console.print(tabla_ligas)
-        
-        while True:
-            try:
-                opcion = int(input("\nIngresa el número de la liga: "))
-                if opcion in liga_map:
-                    return liga_map[opcion]
-                else:
-                    console.print(f"[{ERROR_COLOR}]Opción inválida[/{ERROR_COLOR}]")
-            except ValueError:
-                console.print(f"[{ERROR_COLOR}]Ingresa un número válido[/{ERROR_COLOR}]")
-    
-    except Exception as e:
-        console.print(f"[{ERROR_COLOR}]Error cargando ligas: {str(e)}[/{ERROR_COLOR}]")
-        return None
-
-
-def seleccionar_equipos(liga):
-    """Muestra equipos de una liga y retorna local y visitante"""
-    try:
-        df = pd.read_csv('data/dataset_final.csv')
-        df_liga = df[df['Div'] == liga]
-        
-        # Obtener equipos únicos ordenados
-        equipos = sorted(pd.concat([df_liga['HomeTeam'], df_liga['AwayTeam']]).unique())
-        
-        console.print(f"\n[bold cyan]EQUIPOS DE LA LIGA (Total: {len(equipos)})[/bold cyan]\n")
-        
-        tabla_equipos = Table(show_header=True, header_style=f"bold {HEADER_COLOR}", max_width=80)
-        tabla_equipos.add_column("Nº", style="cyan", width=5)
-        tabla_equipos.add_column("Equipo", style="magenta", width=25)
-        tabla_equipos.add_column("Partidos", style="green", width=12)
-        
-        equipo_map = {}
-        for idx, equipo in enumerate(equipos, 1):
-            n_partidos = len(df_liga[(df_liga['HomeTeam'] == equipo) | (df_liga['AwayTeam'] == equipo)])
-            tabla_equipos.add_row(str(idx), equipo, str(n_partidos))
-            equipo_map[idx] = equipo
-        
-        console.print(tabla_equipos)
-        
-        # Seleccionar Local
-        while True:
-            try:
-                local_idx = int(input("\n⚪ Selecciona EQUIPO LOCAL (número): "))
-                if local_idx in equipo_map:
-                    local = equipo_map[local_idx]
-                    break
-                else:
-                    console.print(f"[{ERROR_COLOR}]Opción inválida[/{ERROR_COLOR}]")
-            except ValueError:
-                console.print(f"[{ERROR_COLOR}]Ingresa un número válido[/{ERROR_COLOR}]")
-        
-        console.print(f"[{SUCCESS_COLOR}]✓ Local seleccionado: {local}[/{SUCCESS_COLOR}]")
-        
-        # Seleccionar Visitante
-        while True:
-            try:
-                visitante_idx = int(input("\n🚌 Selecciona EQUIPO VISITANTE (número): "))
-                if visitante_idx in equipo_map:
-                    visitante = equipo_map[visitante_idx]
-                    if visitante != local:
-                        break
-                    else:
-                        console.print(f"[{ERROR_COLOR}]El visitante debe ser diferente al local[/{ERROR_COLOR}]")
-                else:
-                    console.print(f"[{ERROR_COLOR}]Opción inválida[/{ERROR_COLOR}]")
-            except ValueError:
-                console.print(f"[{ERROR_COLOR}]Ingresa un número válido[/{ERROR_COLOR}]")
-        
-        console.print(f"[{SUCCESS_COLOR}]✓ Visitante seleccionado: {visitante}[/{SUCCESS_COLOR}]")
-        
-        return local, visitante
-    
-    except Exception as e:
-        console.print(f"[{ERROR_COLOR}]Error seleccionando equipos: {str(e)}[/{ERROR_COLOR}]")
-        return None, None
-
-
-def opcion_prediccion():
-    """Flujo completo de predicción asistida"""
-    limpiar_consola()
-    console.print(Panel("🎯 PREDICCIÓN ASISTIDA", border_style=ACCENT_COLOR, expand=False))
-    
-    # Seleccionar liga
-    liga = seleccionar_liga()
-    if liga is None:
-        return
-    
-    # Seleccionar equipos
-    local, visitante = seleccionar_equipos(liga)
-    if local is None or visitante is None:
-        return
-    
-    # Pedir cuotas
-    console.print("\n[bold cyan]INGRESA LAS CUOTAS:[/bold cyan]")
-    try:
-        h = float(input(f"Cuota para {local} (1): "))
-        d = float(input("Cuota para Empate (X): "))
-        a = float(input(f"Cuota para {visitante} (2): "))
-    except ValueError:
-        console.print(f"[{ERROR_COLOR}]Cuotas inválidas[/{ERROR_COLOR}]")
-        return
-    
-    # Ejecutar predicción
-    console.print("\n" + "─" * 60)
-    try:
-        # Agregar la carpeta src al path para importar el módulo
-        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
-        from predict import predict_final_boss
-        
-        predict_final_boss(local, visitante, h, d, a)
-        console.print(f"[{SUCCESS_COLOR}]✅ Predicción completada[/{SUCCESS_COLOR}]")
-    except Exception as e:
-        console.print(f"[{ERROR_COLOR}]Error en predicción: {str(e)}[/{ERROR_COLOR}]")
-
-
-def opcion_backtesting():
-    """Abre el archivo de log de predicciones"""
-    limpiar_consola()
-    console.print(Panel("📊 BACKTESTING", border_style=ACCENT_COLOR, expand=False))
-    
-    log_path = 'data/prediction_log.xlsx'
-    
-    if os.path.exists(log_path):
-        console.print(f"[{SUCCESS_COLOR}]Abriendo {log_path}...[/{SUCCESS_COLOR}]")
-        try:
-            if os.name == 'nt':  # Windows
-                os.startfile(log_path)
-            elif os.name == 'posix':  # macOS/Linux
-                subprocess.Popen(['open', log_path])
-            console.print(f"[{SUCCESS_COLOR}]✅ Archivo abierto[/{SUCCESS_COLOR}]")
-        except Exception as e:
-            console.print(f"[{ERROR_COLOR}]Error abriendo archivo: {str(e)}[/{ERROR_COLOR}]")
-    else:
-        console.print(f"[{ERROR_COLOR}]Archivo no encontrado: {log_path}[/{ERROR_COLOR}]")
-
-
-def opcion_autorun():
-    """Ejecuta opciones 1, 2 y 3 consecutivamente"""
-    limpiar_consola()
-    console.print(Panel("⚙️ AUTO-RUN (Preprocesar → Entrenar → Predicción)", 
-                       border_style=ACCENT_COLOR, expand=False))
-    
-    # 1. Preprocesar
-    ejecutar_script('src/preprocessor.py', 'Preprocesamiento')
-    input("\nPresiona Enter para continuar...")
-    
-    # 2. Entrenar
-    limpiar_consola()
-    ejecutar_script('src/train.py', 'Entrenamiento de Modelos')
-    input("\nPresiona Enter para continuar...")
-    
-    # 3. Predicción
-    opcion_prediccion()
-
-
-def main():
-    """Loop principal del programa"""
-    while True:
-        menu_principal()
-        
-        opcion = input("Selecciona una opción (0-5): ").strip()
-        
-        try:
-            if opcion == "1":
-                limpiar_consola()
-                ejecutar_script('src/preprocessor.py', 'Preprocesamiento de Datos')
-                input("\n[cyan]Presiona Enter para volver al menú...[/cyan]")
-            
-            elif opcion == "2":
-                limpiar_consola()
-                ejecutar_script('src/train.py', 'Entrenamiento de Modelos')
-                input("\n[cyan]Presiona Enter para volver al menú...[/cyan]")
-            
-            elif opcion == "3":
-                opcion_prediccion()
-                input("\n[cyan]Presiona Enter para volver al menú...[/cyan]")
-            
-            elif opcion == "4":
-                opcion_backtesting()
-                input("\n[cyan]Presiona Enter para volver al menú...[/cyan]")
-            
-            elif opcion == "5":
-                opcion_autorun()
-                input("\n[cyan]Presiona Enter para volver al menú...[/cyan]")
-            
-            elif opcion == "0":
-                limpiar_consola()
-                console.print(Panel("[green]✅ ¡Hasta luego![/green]", border_style=ACCENT_COLOR, expand=False))
-                break
-            
-            else:
-                console.print(f"[{ERROR_COLOR}]Opción no válida[/{ERROR_COLOR}]")
-                input("\nPresiona Enter para continuar...")
-        
-        except KeyboardInterrupt:
-            console.print(f"\n[{ERROR_COLOR}]Operación cancelada[/{ERROR_COLOR}]")
-            input("Presiona Enter para volver al menú...")
-        except Exception as e:
-            console.print(f"[{ERROR_COLOR}]Error inesperado: {str(e)}[/{ERROR_COLOR}]")
-            input("Presiona Enter para volver al menú...")
-
-
-if __name__ == "__main__":
-    try:
-        main()
-    except KeyboardInterrupt:
-        limpiar_consola()
-        console.print("[yellow]Programa interrumpido por el usuario[/yellow]")
-        sys.exit(0)
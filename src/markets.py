@@ -0,0 +1,121 @@
+"""
+Mercados over/under vectorizados a partir de las estimaciones del modelo.
+
+Cada estadística (corners, tiros, tiros a puerta) se modela como Poisson con
+la media estimada para cada equipo; el total del partido es la suma de las
+dos (Poisson de media mu_local + mu_visitante). market_ladder() evalúa TODAS
+las líneas de todas las estadísticas, para local, visitante y total y para
+un lote completo de partidos en una sola llamada a la CDF de Poisson
+(scipy.special.pdtr, la misma que usa poisson.cdf).
+
+Uso:
+    from markets import market_ladder, ladder_table
+    ladder = market_ladder(records)          # registros de predict_fixtures
+    tabla = ladder_table(records)            # formato largo: una fila por línea
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.special import pdtr
+
+# Líneas evaluadas por estadística (x.5: sin push)
+LADDER_LINES = {
+    'corners': np.arange(0.5, 16.5),
+    'shots': np.arange(0.5, 36.5),
+    'shots_target': np.arange(0.5, 16.5),
+}
+SIDES = ('home', 'away', 'total')
+
+# Estadística -> columnas de media por equipo en los registros de predict_fixtures
+RECORD_COLUMNS = {
+    'corners': ('Corners_Home', 'Corners_Away'),
+    'shots': ('Shots_Home', 'Shots_Away'),
+    'shots_target': ('Shots_Target_Home', 'Shots_Target_Away'),
+}
+
+
+def poisson_over(mu, lines):
+    """
+    P(X > línea) para X ~ Poisson(mu).
+
+    Args:
+        mu: media(s), escalar o array de cualquier forma
+        lines: línea(s); se combinan con mu por broadcasting
+
+    Returns:
+        np.ndarray (o float): probabilidad de superar cada línea
+    """
+    return 1.0 - pdtr(np.floor(lines), mu)
+
+
+def market_ladder(records, lines=None):
+    """
+    Escalera over/under de cada estadística para un lote de partidos.
+
+    Args:
+        records: Registros de predict_fixtures (se ignoran los que tienen 'Error')
+        lines (dict, optional): estadística -> array de líneas (por defecto LADDER_LINES)
+
+    Returns:
+        dict: {'index': posiciones de los registros evaluados,
+               estadística: {'lines': (L,), 'over': (n, 3, L)}} con el eje 1 en
+               el orden de SIDES (local, visitante, total)
+    """
+    lines = LADDER_LINES if lines is None else lines
+    index = [i for i, rec in enumerate(records) if not rec.get('Error')]
+    stats = list(lines)
+
+    # Medias (n, estadísticas, lados) y una rejilla común de líneas
+    mu = np.empty((len(index), len(stats), len(SIDES)))
+    for j, stat in enumerate(stats):
+        home_col, away_col = RECORD_COLUMNS[stat]
+        mu[:, j, 0] = [records[i][home_col] for i in index]
+        mu[:, j, 1] = [records[i][away_col] for i in index]
+    mu[:, :, 2] = mu[:, :, 0] + mu[:, :, 1]
+    grid = np.unique(np.concatenate([np.asarray(lines[s], dtype=float) for s in stats]))
+
+    over = poisson_over(mu[..., None], grid)  # (n, estadísticas, lados, líneas)
+
+    ladder = {'index': index}
+    for j, stat in enumerate(stats):
+        stat_lines = np.asarray(lines[stat], dtype=float)
+        ladder[stat] = {'lines': stat_lines,
+                        'over': over[:, j][..., np.searchsorted(grid, stat_lines)]}
+    return ladder
+
+
+def ladder_table(records, lines=None):
+    """
+    market_ladder en formato largo (una fila por partido, estadística, lado y
+    línea) con probabilidades over/under y cuota justa del over.
+
+    Returns:
+        pd.DataFrame: HomeTeam, AwayTeam, Div, Market, Side, Line, P_Over, P_Under, Fair_Odds_Over
+    """
+    ladder = market_ladder(records, lines)
+    index = ladder['index']
+    frames = []
+    for stat in (s for s in ladder if s != 'index'):
+        stat_lines, over = ladder[stat]['lines'], ladder[stat]['over']
+        n, n_sides, n_lines = over.shape
+        p_over = over.reshape(-1)
+        with np.errstate(divide='ignore'):
+            fair = np.where(p_over > 0, 1 / p_over, np.inf)
+        frames.append(pd.DataFrame({
+            'row': np.repeat(index, n_sides * n_lines),
+            'Market': stat,
+            'Side': np.tile(np.repeat(SIDES, n_lines), n),
+            'Line': np.tile(stat_lines, n * n_sides),
+            'P_Over': p_over,
+            'P_Under': 1 - p_over,
+            'Fair_Odds_Over': fair,
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['HomeTeam', 'AwayTeam', 'Div', 'Market', 'Side', 'Line',
+                                     'P_Over', 'P_Under', 'Fair_Odds_Over'])
+    table = pd.concat(frames, ignore_index=True)
+    teams = pd.DataFrame([{k: records[i].get(k) for k in ('HomeTeam', 'AwayTeam', 'Div')} for i in index],
+                         index=index)
+    table = teams.reindex(table['row']).reset_index(drop=True).join(table.drop(columns='row'))
+    return table.sort_values(['HomeTeam', 'AwayTeam', 'Market', 'Side', 'Line'], kind='mergesort',
+                             ignore_index=True)
@@ -0,0 +1,113 @@
+"""
+Micro-batching de peticiones para el servicio de predicción.
+
+Las peticiones concurrentes de un solo partido que llegan con milisegundos de
+diferencia se agrupan en un lote: una única llamada a predict_many (una pasada
+por result_model, corners_model y los modelos de tiros) y los resultados se
+reparten a cada petición.
+
+Política de vaciado (configurable):
+    max_rows     -> se vacía en cuanto el lote acumula esta cantidad de partidos
+    max_wait_ms  -> o cuando pasa este tiempo desde la primera petición pendiente
+"""
+
+import asyncio
+import time
+
+
+class MicroBatcher:
+    """
+    Agrupa llamadas asíncronas a una función de lote fn(items) -> results
+    (misma longitud y orden que items), ejecutada en un executor.
+
+    Args:
+        fn: Función de lote (p.ej. PredictorSession.predict_many)
+        max_rows (int): Tamaño de lote que fuerza el vaciado
+        max_wait_ms (float): Espera máxima de la primera petición del lote
+        executor: Executor donde ejecutar fn (None = executor por defecto del bucle)
+    """
+
+    def __init__(self, fn, max_rows=32, max_wait_ms=2.0, executor=None):
+        if max_rows < 1:
+            raise ValueError("max_rows debe ser >= 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms no puede ser negativo")
+        self.fn = fn
+        self.max_rows = max_rows
+        self.max_wait_ms = max_wait_ms
+        self.executor = executor
+        self._pending = []
+        self._pending_rows = 0
+        self._timer = None
+        self._tasks = set()  # lotes en curso (referencia fuerte hasta que terminan)
+        # Estadísticas para /metrics
+        self.batches = 0
+        self.rows = 0
+        self.flushes = {'size': 0, 'time': 0}
+        self.batch_ms = 0.0
+
+    async def submit(self, items):
+        """
+        Encola items en el lote actual y espera sus resultados.
+
+        Returns:
+            list: resultados de fn para estos items, en el mismo orden
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((items, future))
+        self._pending_rows += len(items)
+
+        if self._pending_rows >= self.max_rows:
+            self._flush('size')
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush, 'time')
+        return await future
+
+    def _flush(self, reason):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_rows = self._pending, [], 0
+        if batch:
+            self.flushes[reason] += 1
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        items = [item for chunk, _ in batch for item in chunk]
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        try:
+            results = await loop.run_in_executor(self.executor, self.fn, items)
+            if len(results) != len(items):
+                raise RuntimeError(f"La función de lote devolvió {len(results)} resultados "
+                                   f"para {len(items)} partidos")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.batch_ms += (time.perf_counter() - t0) * 1000
+
+        self.batches += 1
+        self.rows += len(items)
+        start = 0
+        for chunk, future in batch:
+            if not future.done():
+                future.set_result(results[start:start + len(chunk)])
+            start += len(chunk)
+
+    def snapshot(self):
+        """Estadísticas del batcher para /metrics."""
+        return {
+            'max_rows': self.max_rows,
+            'max_wait_ms': self.max_wait_ms,
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch_rows': round(self.rows / self.batches, 2) if self.batches else None,
+            'flushes': dict(self.flushes),
+            'batch_ms': round(self.batch_ms, 1),
+        }
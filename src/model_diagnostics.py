@@ -2,10 +2,8 @@
 Diagnóstico de modelos para entender qué features dominan las predicciones
 """
 import pandas as pd
-import joblib
 import numpy as np
-import matplotlib.pyplot as plt
-from collections import Counter
+from model_registry import load_model
 
 def analyze_model_diagnostics():
     """Analiza el modelo 1X2 para ver qué está influyendo en las predicciones"""
@@ -16,7 +14,7 @@ def analyze_model_diagnostics():
     
     # Cargar modelo y datos
     try:
-        m_res = joblib.load('models/result_model.pkl')
+        m_res = load_model('result')
         df = pd.read_csv('data/dataset_final.csv')
         df = df.dropna(subset=['FTR', 'AvgH'])
         
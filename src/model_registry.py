@@ -0,0 +1,315 @@
+"""
+Registro de modelos entrenados.
+
+train.py exporta cada modelo en el formato binario nativo de XGBoost (.ubj),
+que no depende de la versión de Python/sklearn/joblib con que se entrenó, y
+al final publica models/manifest.json con la versión, el esquema de features,
+los hiperparámetros y la huella del dataset de entrenamiento. Un lector que
+ve el manifest sabe que el conjunto está completo; predictor.py lo usa para
+detectar versiones nuevas y recargarlas en caliente.
+
+Los archivos de cada versión llevan la versión en el nombre
+(result_model.<versión>.ubj), así la carga perezosa de una sesión nunca
+mezcla modelos de dos entrenamientos. load_models() devuelve un ModelSet que
+solo carga cada modelo cuando se pide. Mientras le quedan modelos por cargar,
+el ModelSet deja una marca models/.lease-<versión>-<pid>: al publicar una
+versión nueva no se borran los archivos de versiones que un proceso vivo
+aún puede necesitar. Los .pkl antiguos (sin manifest nativo) se siguen
+cargando con joblib.
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+import weakref
+from collections.abc import Mapping
+
+MODEL_DIR = 'models'
+MANIFEST_FILE = 'manifest.json'
+MODEL_FORMAT = 'ubj'
+KEEP_VERSIONS = 2  # versiones nativas anteriores que se conservan (sesiones aún sin cargar todo)
+LEASE_PREFIX = '.lease-'
+
+MODEL_PATHS = {
+    'result': 'models/result_model.pkl',
+    'corners': 'models/corners_model.pkl',
+    'shots_total': 'models/shots_total_model.pkl',
+    'shots_target': 'models/shots_target_model.pkl',
+}
+# Modelos separados (Mejora #6) - opcionales
+SEPARATE_MODEL_PATHS = {
+    'shots_home': 'models/shots_home_model.pkl',
+    'shots_away': 'models/shots_away_model.pkl',
+    'shots_target_home': 'models/shots_target_home_model.pkl',
+    'shots_target_away': 'models/shots_target_away_model.pkl',
+}
+
+
+def _estimator(name):
+    """Clase sklearn de XGBoost por nombre (xgboost se importa al cargar el primer modelo)."""
+    import xgboost as xgb
+    return {'XGBClassifier': xgb.XGBClassifier, 'XGBRegressor': xgb.XGBRegressor}[name]
+
+
+def _atomic_write_json(data, path):
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+_save_counter = itertools.count()
+_lease_lock = threading.Lock()
+_lease_counts = {}
+
+
+def _lease_path(model_dir, version, pid=None):
+    return os.path.join(model_dir, f'{LEASE_PREFIX}{version}-{pid or os.getpid()}')
+
+
+def _acquire_lease(model_dir, version):
+    """Marca la versión como en uso por este proceso (una marca por proceso y versión)."""
+    with _lease_lock:
+        key = (model_dir, version)
+        if not _lease_counts.get(key):
+            try:
+                open(_lease_path(model_dir, version), 'w').close()
+            except OSError:
+                pass
+        _lease_counts[key] = _lease_counts.get(key, 0) + 1
+
+
+def _release_lease(model_dir, version):
+    with _lease_lock:
+        key = (model_dir, version)
+        n = _lease_counts.get(key, 0) - 1
+        if n > 0:
+            _lease_counts[key] = n
+            return
+        _lease_counts.pop(key, None)
+        try:
+            os.remove(_lease_path(model_dir, version))
+        except OSError:
+            pass
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        return True  # os.kill(pid, 0) terminaría el proceso en Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _leased_versions(model_dir):
+    """Versiones con marca de un proceso vivo (las marcas de procesos muertos se borran)."""
+    versions = set()
+    for f in os.listdir(model_dir):
+        if not f.startswith(LEASE_PREFIX):
+            continue
+        version, _, pid = f[len(LEASE_PREFIX):].rpartition('-')
+        if pid.isdigit() and _pid_alive(int(pid)):
+            versions.add(version)
+        else:
+            try:
+                os.remove(os.path.join(model_dir, f))
+            except OSError:
+                pass
+    return versions
+
+
+def _native_file(name, version):
+    stem = os.path.splitext(os.path.basename({**MODEL_PATHS, **SEPARATE_MODEL_PATHS}[name]))[0]
+    return f'{stem}.{version}.{MODEL_FORMAT}'
+
+
+def save_models(models, model_dir=MODEL_DIR, data_fingerprint=None):
+    """
+    Exporta los modelos en formato nativo y publica el manifest (último paso).
+
+    Args:
+        models (dict): nombre -> modelo, con las claves de MODEL_PATHS / SEPARATE_MODEL_PATHS
+        data_fingerprint: Huella del dataset de entrenamiento (dataset_fingerprint)
+
+    Returns:
+        str: versión publicada
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    # pid + contador: dos guardados en el mismo segundo no comparten archivos
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_save_counter)}"
+    files = {}
+    for name, model in models.items():
+        filename = _native_file(name, version)
+        path = os.path.join(model_dir, filename)
+        tmp = os.path.join(model_dir, f'.tmp-{os.getpid()}-{filename}')
+        model.save_model(tmp)
+        os.replace(tmp, path)
+        params = {k: v for k, v in model.get_params().items()
+                  if v is not None and isinstance(v, (int, float, str, bool)) and v == v}
+        files[name] = {
+            'file': filename,
+            'size': os.path.getsize(path),
+            'estimator': type(model).__name__,
+            'features': [str(c) for c in model.feature_names_in_],
+            'params': params,
+        }
+
+    _atomic_write_json({
+        'version': version,
+        'format': MODEL_FORMAT,
+        'data_fingerprint': list(data_fingerprint) if data_fingerprint else None,
+        'files': files,
+    }, os.path.join(model_dir, MANIFEST_FILE))
+    _prune_versions(model_dir, keep={f['file'] for f in files.values()})
+    return version
+
+
+def _prune_versions(model_dir, keep):
+    """
+    Borra archivos nativos de versiones antiguas (conserva KEEP_VERSIONS además
+    de la activa y cualquier versión que un ModelSet vivo aún pueda cargar).
+    """
+    suffix = f'.{MODEL_FORMAT}'
+    versions = sorted({f.split('.')[-2] for f in os.listdir(model_dir)
+                       if f.endswith(suffix) and not f.startswith('.') and f not in keep})
+    leased = _leased_versions(model_dir)
+    for old in versions[:-KEEP_VERSIONS or None]:
+        if old in leased:
+            continue
+        for f in os.listdir(model_dir):
+            if f.endswith(f'.{old}{suffix}'):
+                os.remove(os.path.join(model_dir, f))
+
+
+def read_manifest(model_dir=MODEL_DIR):
+    """Manifest de modelos (None si no existe o es ilegible)."""
+    try:
+        with open(os.path.join(model_dir, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def models_version(model_dir=MODEL_DIR):
+    """
+    Identificador de la versión de modelos en disco: la del manifest, o si no
+    hay manifest (modelos antiguos), una huella de tamaño+mtime de los .pkl.
+    """
+    manifest = read_manifest(model_dir)
+    if manifest is not None:
+        return manifest.get('version')
+    parts = []
+    for path in list(MODEL_PATHS.values()) + list(SEPARATE_MODEL_PATHS.values()):
+        path = os.path.join(model_dir, os.path.basename(path))
+        try:
+            st = os.stat(path)
+            parts.append(f'{st.st_size}:{st.st_mtime_ns}')
+        except OSError:
+            parts.append('-')
+    return 'legacy-' + '-'.join(parts)
+
+
+class ModelSet(Mapping):
+    """
+    Diccionario de modelos de una versión del manifest que carga cada modelo
+    la primera vez que se pide (models['corners']). `name in models` y
+    schema(name) no cargan nada.
+    """
+
+    def __init__(self, manifest, model_dir=MODEL_DIR):
+        self.version = manifest.get('version')
+        self.manifest = manifest
+        self.model_dir = model_dir
+        self._files = manifest['files']
+        self._loaded = {}
+        self._lock = threading.Lock()
+        # Marca de uso hasta que estén todos cargados (o se libere el ModelSet)
+        self._lease = None
+        if self.version and self._files:
+            _acquire_lease(model_dir, self.version)
+            self._lease = weakref.finalize(self, _release_lease, model_dir, self.version)
+
+    def __getitem__(self, name):
+        model = self._loaded.get(name)
+        if model is not None:
+            return model
+        meta = self._files[name]
+        with self._lock:
+            if name not in self._loaded:
+                model = _estimator(meta['estimator'])()
+                model.load_model(os.path.join(self.model_dir, meta['file']))
+                self._loaded[name] = model
+                if self._lease is not None and len(self._loaded) == len(self._files):
+                    self._lease()
+            return self._loaded[name]
+
+    def __iter__(self):
+        return iter(self._files)
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, name):
+        return name in self._files
+
+    def schema(self, name):
+        """Features del modelo según el manifest (sin cargarlo)."""
+        return self._files[name]['features']
+
+    def loaded(self):
+        """Nombres de los modelos ya cargados."""
+        return list(self._loaded)
+
+
+def load_model(name, model_dir=MODEL_DIR):
+    """Carga un único modelo (nativo si hay manifest nativo, .pkl si no)."""
+    return load_models(model_dir)[name]
+
+
+def load_models(model_dir=MODEL_DIR):
+    """
+    Modelos entrenados. Con manifest nativo devuelve un ModelSet perezoso;
+    con modelos antiguos (.pkl) los carga todos con joblib. Los separados
+    HS/AS/HST/AST son opcionales: si falta alguno, no se incluyen.
+
+    Raises:
+        RuntimeError: si el manifest no coincide con los archivos (escritura a medias)
+    """
+    manifest = read_manifest(model_dir)
+    if manifest is not None:
+        for name, meta in manifest.get('files', {}).items():
+            path = os.path.join(model_dir, meta['file'])
+            if not os.path.exists(path) or os.path.getsize(path) != meta['size']:
+                raise RuntimeError(f"Modelo {name} incompleto o distinto del manifest ({path})")
+        if manifest.get('format') == MODEL_FORMAT:
+            return ModelSet(manifest, model_dir)
+
+    import joblib
+
+    def _load(path):
+        return joblib.load(os.path.join(model_dir, os.path.basename(path)))
+
+    models = {name: _load(path) for name, path in MODEL_PATHS.items()}
+    try:
+        models.update({name: _load(path) for name, path in SEPARATE_MODEL_PATHS.items()})
+    except FileNotFoundError:
+        pass
+    return models
+
+
+if __name__ == "__main__":
+    # Convierte los .pkl existentes al formato nativo sin reentrenar
+    t0 = time.perf_counter()
+    legacy = load_models()
+    if isinstance(legacy, ModelSet):
+        print(f"[INFO] Los modelos ya están en formato nativo (versión {legacy.version})")
+    else:
+        version = save_models(dict(legacy))
+        print(f"[OK] {len(legacy)} modelos exportados a .{MODEL_FORMAT} (versión {version}, "
+              f"{time.perf_counter() - t0:.2f}s)")
@@ -0,0 +1,326 @@
+"""
+Orquestador del pipeline: CSV de liga -> dataset -> modelos -> bundle de serving.
+
+Cada etapa declara sus entradas y salidas (archivos) y solo se ejecuta si su
+huella de entradas cambió desde la última ejecución o si sus salidas ya no
+son las que dejó. Las huellas son por contenido (sha1), memorizadas por
+tamaño + mtime: una comprobación sin datos nuevos solo hace os.stat de los
+archivos y termina en milisegundos. Como la huella es de contenido, si el
+preprocesado genera un dataset idéntico el entrenamiento no se repite.
+
+El linaje (qué entradas produjeron qué salidas, cuándo y en cuánto tiempo)
+queda en data/pipeline_lineage.json.
+
+Uso:
+    python src/pipeline.py                   # ejecuta solo lo desfasado
+    python src/pipeline.py --status          # muestra qué se ejecutaría
+    python src/pipeline.py --force models    # fuerza una etapa (y lo que dependa de ella)
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+
+DATA_DIR = 'data'
+DATASET_PATH = 'data/dataset_final.csv'
+MODEL_MANIFEST = 'models/manifest.json'
+BUNDLE_DIR = 'data/serving_bundle'
+LINEAGE_PATH = 'data/pipeline_lineage.json'
+HISTORY_SIZE = 20  # ejecuciones que se conservan por etapa
+
+_SRC = os.path.dirname(os.path.abspath(__file__))
+
+
+def source_files(data_dir=DATA_DIR):
+    """CSV de liga que lee el preprocesado (excluye el dataset y el CSV de CL sin transformar)."""
+    files = glob.glob(os.path.join(data_dir, '**', '*.csv'), recursive=True)
+    return sorted(f for f in files
+                  if 'dataset_final.csv' not in f and 'champions_league_matches' not in f)
+
+
+def _code(*modules):
+    return [os.path.join(_SRC, m) for m in modules]
+
+
+# ── Etapas ─────────────────────────────────────────────────────────────────
+def _run_dataset():
+    from preprocessor import build_dataset
+    return f"{len(build_dataset())} partidos"
+
+
+def _run_models():
+    from train import train_dynamic_brain
+    return f"modelos {train_dynamic_brain()}"
+
+
+def _run_bundle():
+    from serving_bundle import ensure_bundle
+    return f"bundle {ensure_bundle(BUNDLE_DIR, DATASET_PATH)}"
+
+
+def _bundle_outputs():
+    try:
+        with open(os.path.join(BUNDLE_DIR, 'CURRENT'), encoding='utf-8') as f:
+            version = f.read().strip()
+    except OSError:
+        return [os.path.join(BUNDLE_DIR, 'CURRENT')]
+    return [os.path.join(BUNDLE_DIR, 'CURRENT'), os.path.join(BUNDLE_DIR, version, 'manifest.json')]
+
+
+class Stage:
+    """
+    Etapa del pipeline.
+
+    Args:
+        name (str): Identificador
+        inputs: callable -> lista de archivos de entrada (datos y código)
+        outputs: callable -> lista de archivos que produce
+        run: callable que ejecuta la etapa (devuelve un resumen en texto)
+        deps (tuple): Etapas de las que depende
+    """
+
+    def __init__(self, name, inputs, outputs, run, deps=()):
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.run = run
+        self.deps = deps
+
+
+STAGES = (
+    Stage('dataset',
+          inputs=lambda: source_files() + _code('preprocessor.py', 'cross_features.py', 'team_context.py'),
+          outputs=lambda: [DATASET_PATH],
+          run=_run_dataset),
+    Stage('models',
+          inputs=lambda: [DATASET_PATH] + _code('train.py', 'model_registry.py'),
+          outputs=lambda: [MODEL_MANIFEST],
+          run=_run_models,
+          deps=('dataset',)),
+    Stage('bundle',
+          # El código del estado cubre STATE_VERSION sin importar serving_state (pandas)
+          inputs=lambda: [DATASET_PATH] + _code('serving_state.py', 'serving_bundle.py'),
+          outputs=_bundle_outputs,
+          run=_run_bundle,
+          deps=('dataset',)),
+)
+STAGE_NAMES = tuple(stage.name for stage in STAGES)
+
+
+# ── Huellas y linaje ───────────────────────────────────────────────────────
+def load_lineage(path=LINEAGE_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'files': {}, 'stages': {}}
+
+
+def save_lineage(lineage, path=LINEAGE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(lineage, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _key(path):
+    """Clave estable de un archivo en el linaje (el código fuente como src/<módulo>)."""
+    if os.path.isabs(path) and path.startswith(_SRC):
+        return os.path.relpath(path, os.path.dirname(_SRC)).replace(os.sep, '/')
+    return path.replace(os.sep, '/')
+
+
+def file_hash(path, memo):
+    """
+    sha1 del contenido de un archivo, reutilizando el de memo si el tamaño y
+    el mtime no cambiaron. None si el archivo no existe.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = _key(path)
+    known = memo.get(key)
+    if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+        return known[2]
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    memo[key] = [st.st_size, st.st_mtime_ns, digest.hexdigest()]
+    return memo[key][2]
+
+
+def _fingerprint(paths, memo):
+    """Huella conjunta: {archivo: sha1} y un digest de todos."""
+    files = {_key(p): file_hash(p, memo) for p in paths}
+    payload = json.dumps(sorted(files.items()))
+    return files, hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def stage_status(stage, lineage):
+    """
+    Motivo por el que una etapa debe ejecutarse (None si está al día).
+
+    Returns:
+        str | None: 'sin ejecuciones previas', 'entradas cambiadas',
+                    'salidas ausentes' o 'salidas modificadas'
+    """
+    memo = lineage.setdefault('files', {})
+    record = lineage.get('stages', {}).get(stage.name)
+    files, digest = _fingerprint(stage.inputs(), memo)
+    missing = [p for p, h in files.items() if h is None]
+    if missing:
+        return f"faltan entradas: {', '.join(missing[:3])}"
+    if record is None:
+        return 'sin ejecuciones previas'
+    if record.get('inputs') != digest:
+        changed = [p for p, h in files.items() if record.get('input_files', {}).get(p) != h]
+        return f"entradas cambiadas: {', '.join(changed[:3]) or 'formato de la huella'}"
+    out_files, out_digest = _fingerprint(stage.outputs(), memo)
+    if any(h is None for h in out_files.values()):
+        return 'salidas ausentes'
+    if record.get('outputs') != out_digest:
+        return 'salidas modificadas'
+    return None
+
+
+def _downstream(names):
+    """Etapas dadas más todas las que dependen de ellas."""
+    names = set(names)
+    for stage in STAGES:  # STAGES está en orden topológico
+        if names.intersection(stage.deps):
+            names.add(stage.name)
+    return names
+
+
+def plan(targets=None, force=(), lineage=None):
+    """
+    Etapas que se ejecutarían ahora y por qué (sin ejecutar nada).
+
+    Returns:
+        list: (nombre, motivo o None si está al día)
+    """
+    lineage = lineage if lineage is not None else load_lineage()
+    forced = _downstream(force)
+    stale, result = set(), []
+    for stage in STAGES:
+        if targets is not None and stage.name not in targets:
+            continue
+        reason = 'forzada' if stage.name in forced else stage_status(stage, lineage)
+        if reason is None and stale.intersection(stage.deps):
+            # Se decidirá tras ejecutar la etapa previa (si su salida no cambia, se salta)
+            reason = f"tras {', '.join(sorted(stale.intersection(stage.deps)))}"
+        if reason is not None:
+            stale.add(stage.name)
+        result.append((stage.name, reason))
+    return result
+
+
+def run_pipeline(targets=None, force=(), lineage_path=LINEAGE_PATH, log=print):
+    """
+    Ejecuta en orden las etapas desfasadas y registra su linaje.
+
+    Una etapa se evalúa justo antes de ejecutarla, así ve las salidas nuevas
+    de las etapas anteriores. Si una etapa falla, las que dependen de ella no
+    se ejecutan.
+
+    Args:
+        targets: Etapas a considerar (por defecto todas)
+        force: Etapas que se ejecutan aunque estén al día (y sus dependientes)
+        lineage_path (str): Archivo de linaje
+        log: Función para los mensajes de progreso
+
+    Returns:
+        dict: etapa -> 'ejecutada', 'al día', 'fallida' u 'omitida'
+    """
+    unknown = set(targets or ()) | set(force)
+    unknown -= set(STAGE_NAMES)
+    if unknown:
+        raise ValueError(f"Etapas desconocidas: {', '.join(sorted(unknown))} "
+                         f"(disponibles: {', '.join(STAGE_NAMES)})")
+    lineage = load_lineage(lineage_path)
+    forced = _downstream(force)
+    results = {}
+    for stage in STAGES:
+        if targets is not None and stage.name not in targets:
+            continue
+        if any(results.get(dep) in ('fallida', 'omitida') for dep in stage.deps):
+            results[stage.name] = 'omitida'
+            log(f"[WARN] {stage.name}: omitida (falló una etapa previa)")
+            continue
+        reason = 'forzada' if stage.name in forced else stage_status(stage, lineage)
+        if reason is None:
+            results[stage.name] = 'al día'
+            log(f"[OK] {stage.name}: al día")
+            continue
+        if reason.startswith('faltan entradas'):
+            results[stage.name] = 'fallida'
+            log(f"[ERROR] {stage.name}: {reason}")
+            continue
+
+        log(f"[INFO] {stage.name}: se ejecuta ({reason})")
+        t0 = time.perf_counter()
+        memo = lineage.setdefault('files', {})
+        in_files, in_digest = _fingerprint(stage.inputs(), memo)
+        try:
+            summary = stage.run()
+        except Exception as e:
+            results[stage.name] = 'fallida'
+            log(f"[ERROR] {stage.name}: {e}")
+            continue
+        seconds = time.perf_counter() - t0
+        out_files, out_digest = _fingerprint(stage.outputs(), memo)
+        record = {
+            'inputs': in_digest,
+            'outputs': out_digest,
+            'input_files': in_files,
+            'output_files': out_files,
+            'upstream': {dep: lineage['stages'].get(dep, {}).get('outputs') for dep in stage.deps},
+            'ran_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'seconds': round(seconds, 2),
+            'reason': reason,
+            'summary': summary,
+        }
+        history = lineage['stages'].get(stage.name, {}).get('history', [])
+        history = (history + [{k: record[k] for k in ('ran_at', 'inputs', 'outputs', 'seconds', 'summary')}])
+        record['history'] = history[-HISTORY_SIZE:]
+        lineage['stages'][stage.name] = record
+        save_lineage(lineage, lineage_path)
+        results[stage.name] = 'ejecutada'
+        log(f"[OK] {stage.name}: {summary} ({seconds:.1f}s)")
+    # Guardar también las huellas memorizadas aunque no se ejecutara nada
+    save_lineage(lineage, lineage_path)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline dataset -> modelos -> bundle")
+    parser.add_argument('--only', help=f"Etapas separadas por comas ({', '.join(STAGE_NAMES)})")
+    parser.add_argument('--force', default='', help="Etapas a forzar (separadas por comas)")
+    parser.add_argument('--status', action='store_true', help="Solo mostrar qué se ejecutaría")
+    args = parser.parse_args(argv)
+
+    targets = [s.strip() for s in args.only.split(',') if s.strip()] if args.only else None
+    force = [s.strip() for s in args.force.split(',') if s.strip()]
+    t0 = time.perf_counter()
+    try:
+        if args.status:
+            for name, reason in plan(targets, force):
+                print(f"{name:10s} {reason or 'al día'}")
+            return 0
+        results = run_pipeline(targets, force)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    print(f"[INFO] Pipeline terminado en {time.perf_counter() - t0:.2f}s")
+    return 1 if 'fallida' in results.values() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,24 @@
-import pandas as pd
-import joblib
-import os
 import sys
+from datetime import date
 import numpy as np
-from scipy.stats import poisson
-from logger import PredictionLogger
-from team_context import (get_team_data_with_context, get_domestic_league,
-                         fill_missing_stats, get_recent_form, get_h2h, resolve_team_name,
-                         get_cl_stats, get_league_role_stats)
+from log_store import LOG_DB_PATH
+from team_context import (get_team_data_with_context, fill_missing_stats,
+                         get_cl_stats, get_league_role_stats, get_current_standings)
+from serving_state import load_serving_state
+from model_registry import SEPARATE_MODEL_PATHS, load_models
+from feature_plan import fixture_context, row_matrix
+from inference_engine import InferenceEngine
+from cross_features import CROSS_FEATURES, matchup_features, state_columns, team_state
+from markets import poisson_over
+from score_matrix import goal_fields
+from portfolio import allocate, kelly_stakes
+from data_cache import DATA_CACHE
 
 def calcular_kelly(prob_ia, cuota, banca_total=100, instabilidad=0):
     """
     Calcula el monto recomendado usando la fórmula de Kelly Fraccionario.
+    Apuesta aislada: para repartir la banca entre varias apuestas simultáneas
+    se usa portfolio.allocate.
     
     Args:
         prob_ia (float): Probabilidad estimada por IA (valor entre 0 y 1, ej: 0.62)
@@ -22,418 +29,236 @@ def calcular_kelly(prob_ia, cuota, banca_total=100, instabilidad=0):
     Returns:
         float: Monto recomendado para apostar (ajustado por inestabilidad)
     """
-    # prob_ia: valor entre 0 y 1 (ej: 0.62)
-    # cuota: cuota decimal (ej: 1.85)
-    # instabilidad: ratio de desv.estándar/media (equipos impredecibles tienen valores altos)
-    
-    if cuota <= 1:
-        return 0
-    
-    p = prob_ia
-    q = 1 - p
-    b = cuota - 1
-    
-    # Fórmula de Kelly: (bp - q) / b
-    f_star = (b * p - q) / b
-    
-    # Aplicamos Kelly Fraccionario (1/4) para reducir volatilidad
-    f_frac = f_star * 0.25
-    
-    if f_frac < 0:
-        return 0  # No hay valor
-    
-    # AJUSTE POR INESTABILIDAD: equipos más volátiles = menor apuesta
-    # Si instabilidad > 1, el equipo es muy impredecible
-    stability_factor = 1 / (1 + instabilidad * 0.5)  # Factor entre 0.33 y 1
-    
-    monto_recom = banca_total * f_frac * stability_factor
-    return monto_recom
+    # Kelly (bp - q) / b al 1/4, con factor de estabilidad 1 / (1 + inestabilidad*0.5)
+    return float(kelly_stakes(prob_ia, cuota, instabilidad, bankroll=banca_total))
+
+# Rutas de artefactos
+DATASET_PATH = 'data/dataset_final.csv'
+LOG_PATH = LOG_DB_PATH
 
-def predict_final_boss(local=None, visitante=None, h=None, d=None, a=None, match_league=None, h2h_weight=1.0):
+# Líneas evaluadas por rol: (corners, tiros, a puerta)
+HOME_LINES = (4.5, 11.5, 4.5)
+AWAY_LINES = (3.5, 9.5, 3.5)
+
+
+def load_dataset(path=DATASET_PATH):
     """
-    Sistema de predicción contextual.
-    
-    Args:
-        local (str, optional): Nombre del equipo local
-        visitante (str, optional): Nombre del equipo visitante
-        h (float, optional): Cuota para el local
-        d (float, optional): Cuota para el empate
-        a (float, optional): Cuota para el visitante
-        match_league (str, optional): Liga del partido (ej: 'CL', 'E0') para contexto
-        h2h_weight (float, optional): Factor para atenuar H2H (0.0=ignorar, 1.0=normal, 0.5=reducir 50%)
+    dataset_final.csv con la fecha como datetime, desde la caché del proceso
+    (data_cache.DATA_CACHE): solo se lee de disco si cambió. No modificar el
+    DataFrame devuelto (es compartido).
     """
-    # 1. Carga de recursos
-    try:
-        df = pd.read_csv('data/dataset_final.csv')
-        # Asegurarse de que la fecha sea datetime para ordenar bien
-        df['Date'] = pd.to_datetime(df['Date']) 
-        
-        m_res = joblib.load('models/result_model.pkl')
-        m_corn = joblib.load('models/corners_model.pkl')
-        m_shots = joblib.load('models/shots_total_model.pkl')
-        m_target = joblib.load('models/shots_target_model.pkl')
-        
-        # Modelos separados (Mejora #6)
-        try:
-            m_hs = joblib.load('models/shots_home_model.pkl')
-            m_as = joblib.load('models/shots_away_model.pkl')
-            m_hst = joblib.load('models/shots_target_home_model.pkl')
-            m_ast = joblib.load('models/shots_target_away_model.pkl')
-            has_separate_models = True
-        except FileNotFoundError:
-            has_separate_models = False
-    except Exception as e:
-        print(f"Error cargando recursos: {e}")
-        return
-    
-    # Inicializar logger
-    logger = PredictionLogger('data/prediction_log.xlsx')
+    return DATA_CACHE.get(path)
 
-    print("\n" + "═"*55)
-    print("      SISTEMA DE PREDICCIÓN CONTEXTUAL V2.0")
-    print("═"*55)
-    
-    # --- Si no recibe argumentos, los pide ---
-    if local is None or visitante is None:
-        # BUSCADOR REPARADO
-        busqueda = input("\nBuscar equipo (o Enter para saltar): ").strip()
-        if busqueda:
-            todos = pd.concat([df['HomeTeam'], df['AwayTeam']]).unique()
-            coincidencias = [e for e in todos if busqueda.lower() in str(e).lower()]
-            print(f"Coincidencias: {', '.join(coincidencias)}")
 
-        local = input("\nNombre Local: ") if local is None else local
-        visitante = input("Nombre Visitante: ") if visitante is None else visitante
-    
-    if h is None or d is None or a is None:
-        h = float(input("Cuota 1: ") if h is None else h)
-        d = float(input("Cuota X: ") if d is None else d)
-        a = float(input("Cuota 2: ") if a is None else a)
+def has_separate_models(models):
+    return all(name in models for name in SEPARATE_MODEL_PATHS)
+
+
+def safe_get(row, col, default=0):
+    """Obtiene valor de una fila (TeamRow o Serie), devolviendo default si es NaN"""
+    val = row.get(col, default)
+    return default if val is None or val != val else val
+
+
+def calibrate_probs(probs, temperature):
+    """
+    Calibración: suavizar probabilidades extremas con temperature scaling
+    p_cal = p^(1/T) / sum(p^(1/T)) — T>1 reduce overconfidence
+    """
+    p_cal = np.power(np.clip(probs, 1e-10, 1), 1.0 / temperature)
+    return p_cal / p_cal.sum()
+
+
+def smart_blend(total_val, sep_val, is_cl=False):
+    """Mezcla inteligente: usa separado solo si es razonable"""
+    if total_val <= 0:
+        return sep_val
+    if sep_val <= 0:
+        return total_val
+    ratio = sep_val / total_val
+    # Si el separado diverge más de 50% del total, ignorarlo
+    if ratio < 0.50 or ratio > 1.50:
+        return total_val
+    # CL con ajuste real: 55% total (ya tiene CL-ADJ) + 45% separado
+    # Doméstica: 40% total + 60% separado (separados son más precisos por rol)
+    w_sep = 0.45 if is_cl else 0.60
+    return (1 - w_sep) * total_val + w_sep * sep_val
+
+
+def get_p(mu, line):
+    return poisson_over(mu, line) * 100
+
 
+def detect_match_league(df, state, local, visitante):
+    """
+    Fallback cuando no se indica la liga: detectar liga más común para los equipos.
+    Devuelve 'CL' solo si los equipos son de LIGAS DOMÉSTICAS DISTINTAS.
+    Usa las tablas del estado (liga más común como local, partidos CL por equipo).
+    """
+    match_league = state.home_leagues.get(local)
+    # Auto-detectar CL solo si los equipos son de LIGAS DOMÉSTICAS DISTINTAS
+    # (ej: Bayern vs Barcelona → CL; Liverpool vs Man City → E0, no CL)
+    if state.cl_matches.get(local, 0) >= 2 and state.cl_matches.get(visitante, 0) >= 2:
+        # Verificar si los equipos tienen la MISMA liga doméstica
+        h_dom = state.domestic_league(local, df)
+        a_dom = state.domestic_league(visitante, df)
+        if h_dom and a_dom and h_dom != a_dom:
+            # Diferentes ligas domésticas → probablemente CL
+            match_league = 'CL'
+    return match_league
+
+
+def prepare_fixture(df, state, models, local, visitante, h, d, a, match_league=None,
+                    h2h_weight=1.0, verbose=False):
+    """
+    Localiza los datos de ambos equipos y calcula el contexto del partido
+    (mercado, H2H, posiciones) que alimenta al modelo 1X2 y a los de tiros.
+    
+    Args:
+        df: Dataset completo (Date en datetime)
+        state: ServingState cargado con load_serving_state
+        models: Diccionario de modelos (load_models)
+        local, visitante (str): Equipos
+        h, d, a (float): Cuotas 1X2
+        match_league (str, optional): Liga del partido; si es None se auto-detecta
+        h2h_weight (float): Factor para atenuar H2H
+        verbose (bool): Imprime el contexto doméstico usado en partidos CL
+    
+    Returns:
+        dict: Contexto del partido (filas, forma, H2H, contexto de mercado, posiciones, ...)
+    
+    Raises:
+        LookupError: si no hay datos para alguno de los equipos
+    """
     # 2. LOCALIZACIÓN POR ROL CON CONTEXTO INTELIGENTE (CAMBIO CLAVE)
     # Buscamos datos considerando:
     # - Si es Champions League, mezcla datos de CL + Liga doméstica
     # - Si es otra liga, usa su contexto doméstico como ayuda
-    try:
-        if match_league is None:
-            # Fallback: detectar liga más común para los equipos
-            h_matches = df[df['HomeTeam'] == local]
-            a_matches = df[df['AwayTeam'] == visitante]
-            # Auto-detectar CL solo si los equipos son de LIGAS DOMÉSTICAS DISTINTAS
-            # (ej: Bayern vs Barcelona → CL; Liverpool vs Man City → E0, no CL)
-            h_cl_games = df[(df['is_CL'] == 1) & ((df['HomeTeam'] == local) | (df['AwayTeam'] == local))]
-            a_cl_games = df[(df['is_CL'] == 1) & ((df['HomeTeam'] == visitante) | (df['AwayTeam'] == visitante))]
-            if len(h_cl_games) >= 2 and len(a_cl_games) >= 2:
-                # Verificar si los equipos tienen la MISMA liga doméstica
-                h_dom = get_domestic_league(local, df)
-                a_dom = get_domestic_league(visitante, df)
-                if h_dom and a_dom and h_dom != a_dom:
-                    # Diferentes ligas domésticas → probablemente CL
-                    match_league = 'CL'
-                elif not h_matches.empty:
-                    match_league = h_matches['Div'].mode()[0]
-            elif not h_matches.empty:
-                match_league = h_matches['Div'].mode()[0]
-        
-        h_row = get_team_data_with_context(df, local, as_home=True, match_league=match_league)
-        a_row = get_team_data_with_context(df, visitante, as_home=False, match_league=match_league)
-        
-        # Rellenar valores faltantes con datos REALES (no inventados)
-        if h_row is not None:
-            h_row = fill_missing_stats(h_row, df, local, as_home=True)
-        if a_row is not None:
-            a_row = fill_missing_stats(a_row, df, visitante, as_home=False)
-        
-        # INFO: Mostrar si usamos contexto doméstico
-        if match_league == 'CL':
-            h_domestic = get_domestic_league(local, df)
-            a_domestic = get_domestic_league(visitante, df)
-            if h_domestic or a_domestic:
-                print(f"\n[INFO] Usando contexto de ligas domésticas:")
-                if h_domestic:
-                    h_dom_name = resolve_team_name(local, df)
-                    extra = f" (como '{h_dom_name}')" if h_dom_name != local else ""
-                    print(f"   {local}: Champions League + {h_domestic}{extra}")
-                if a_domestic:
-                    a_dom_name = resolve_team_name(visitante, df)
-                    extra = f" (como '{a_dom_name}')" if a_dom_name != visitante else ""
-                    print(f"   {visitante}: Champions League + {a_domestic}{extra}")
-        
-        # FORMA RECIENTE + H2H
-        h_form = get_recent_form(df, local, n=5)
-        a_form = get_recent_form(df, visitante, n=5)
-        h2h = get_h2h(df, local, visitante, n=10)
-        
-        if h_row is None or a_row is None:
-            print("Error: No se encontraron datos para esos equipos.")
-            return
-    except Exception as e:
-        print(f"Error en búsqueda de datos: {str(e)}")
-        return
+    if match_league is None:
+        match_league = detect_match_league(df, state, local, visitante)
+    
+    h_row = get_team_data_with_context(df, local, as_home=True, match_league=match_league,
+                                       contexts=state.contexts)
+    a_row = get_team_data_with_context(df, visitante, as_home=False, match_league=match_league,
+                                       contexts=state.contexts)
+    
+    # Rellenar valores faltantes con datos REALES (no inventados)
+    if h_row is not None:
+        h_row = fill_missing_stats(h_row, df, local, as_home=True, means=state.fill_means)
+    if a_row is not None:
+        a_row = fill_missing_stats(a_row, df, visitante, as_home=False, means=state.fill_means)
+    
+    # INFO: Mostrar si usamos contexto doméstico
+    if verbose and match_league == 'CL':
+        h_domestic = state.domestic_league(local, df)
+        a_domestic = state.domestic_league(visitante, df)
+        if h_domestic or a_domestic:
+            print(f"\n[INFO] Usando contexto de ligas domésticas:")
+            if h_domestic:
+                h_dom_name = state.resolve_name(local, df)
+                extra = f" (como '{h_dom_name}')" if h_dom_name != local else ""
+                print(f"   {local}: Champions League + {h_domestic}{extra}")
+            if a_domestic:
+                a_dom_name = state.resolve_name(visitante, df)
+                extra = f" (como '{a_dom_name}')" if a_dom_name != visitante else ""
+                print(f"   {visitante}: Champions League + {a_domestic}{extra}")
+    
+    # FORMA RECIENTE + H2H
+    h_form = state.recent_form(local, df, n=5)
+    a_form = state.recent_form(visitante, df, n=5)
+    h2h = state.h2h(local, visitante, df, n=10)
+    
+    if h_row is None or a_row is None:
+        raise LookupError("No se encontraron datos para esos equipos.")
+
+    # 3. CONTEXTO DEL PARTIDO (mercado, cuotas, descanso, H2H)
+    # Las columnas de cada modelo se ensamblan después con su FeaturePlan
+    context = fixture_context(h, d, a, match_league, h2h, h2h_weight)
+
+    # Posiciones ACTUALES de ambos equipos en la liga (precalculadas en el estado).
+    # Las features cruzadas del emparejamiento se calculan por lote en run_models.
+    if match_league in state.standings:
+        standings = state.standings[match_league]
+    else:
+        standings = get_current_standings(df, match_league) if match_league else {}
+    h_standing = standings.get(local, {'position': 10, 'points': 30, 'gd': 0})
+    a_standing = standings.get(visitante, {'position': 10, 'points': 30, 'gd': 0})
+
+    return {
+        'local': local, 'visitante': visitante,
+        'h': h, 'd': d, 'a': a,
+        'match_league': match_league, 'h2h_weight': h2h_weight,
+        'h_row': h_row, 'a_row': a_row,
+        'h_form': h_form, 'a_form': a_form, 'h2h': h2h,
+        'market_probs': context[:3].copy(),
+        'context': context,
+        'h_standing': h_standing, 'a_standing': a_standing,
+    }
+
 
-    model_features = m_res.feature_names_in_
-    input_dict = {}
+def fixture_cross_features(fixtures):
+    """
+    Features cruzadas (cross_features.py) recalculadas para el rival ACTUAL
+    de todos los partidos del lote en una sola pasada vectorizada.
+
+    Las features cruzadas en h_row/a_row son del ÚLTIMO partido de cada
+    equipo contra un rival DISTINTO; aquí se recalculan con las mismas
+    fórmulas que usa preprocessor.py para el dataset de entrenamiento.
 
-    # Helper: obtener valor de una Serie, devolviendo default si es NaN
-    def safe_get(row, col, default=0):
-        val = row.get(col, default)
-        return val if pd.notna(val) else default
+    Returns:
+        np.ndarray: matriz (n, len(CROSS_FEATURES))
+    """
+    sides = {}
+    for role, key in (('Home', 'h_row'), ('Away', 'a_row')):
+        cols = state_columns(role)
+        values = row_matrix([fx[key] for fx in fixtures], cols)
+        sides[role] = team_state(dict(zip(cols, values.T)), role)
+    standings = {}
+    for key in ('h_standing', 'a_standing'):
+        standings[key] = {field: np.array([fx[key][field] for fx in fixtures], dtype=np.float64)
+                          for field in ('position', 'points', 'gd')}
+    features = matchup_features(sides['Home'], sides['Away'],
+                                standings['h_standing'], standings['a_standing'])
+    return np.column_stack([features[name] for name in CROSS_FEATURES])
 
-    # 3. CONSTRUCCIÓN DEL VECTOR (Compatible con el nuevo Preprocessor)
-    sum_inv = (1/h) + (1/d) + (1/a) # Para Market Prob
+
+def run_models(models, fixtures, engine=None):
+    """
+    Ejecuta UNA pasada por modelo sobre todos los partidos.
     
-    for col in model_features:
-        # A. Probabilidades de Mercado
-        if 'Market_Prob' in col:
-            if '_H' in col: input_dict[col] = (1/h) / sum_inv
-            elif '_D' in col: input_dict[col] = (1/d) / sum_inv
-            elif '_A' in col: input_dict[col] = (1/a) / sum_inv
-        
-        # B. Cuotas puras
-        elif 'AvgH' in col: input_dict[col] = h
-        elif 'AvgD' in col: input_dict[col] = d
-        elif 'AvgA' in col: input_dict[col] = a
-        elif 'Odds_Std' in col: input_dict[col] = np.std([h, d, a])
-
-        # C. Liga como feature
-        elif col == 'is_CL': input_dict[col] = 1 if match_league == 'CL' else 0
-        elif col.startswith('is_'): input_dict[col] = 1 if match_league == col[3:] else 0
-        
-        # D. Días de descanso — 4 para CL (entre semana), 7 para doméstica
-        elif col == 'home_rest_days': input_dict[col] = 4.0 if match_league == 'CL' else 7.0
-        elif col == 'away_rest_days': input_dict[col] = 4.0 if match_league == 'CL' else 7.0
-
-        # E. H2H features — CONSOLIDADO: solo H2H_Dominance
-        # Rango: -1 (visitante domina) a +1 (local domina)
-        elif col == 'H2H_Dominance':
-            h2h_n = h2h.get('h2h_matches', 0)
-            if h2h_n > 0:
-                dominance = (h2h.get('h2h_wins_a', 0) - h2h.get('h2h_wins_b', 0)) / h2h_n
-                input_dict[col] = dominance * h2h_weight
-            else:
-                input_dict[col] = 0
-        elif col.startswith('H2H_'):
-            # Legacy: si el modelo aún tiene features H2H viejas (compatibilidad)
-            h2h_n = h2h.get('h2h_matches', 0)
-            if col == 'H2H_Total': input_dict[col] = h2h_n * h2h_weight
-            elif col == 'H2H_Draws': input_dict[col] = h2h.get('h2h_draws', 0) * h2h_weight
-            elif col == 'H2H_Home_Wins': input_dict[col] = h2h.get('h2h_wins_a', 0) * h2h_weight
-            elif col == 'H2H_Away_Wins': input_dict[col] = h2h.get('h2h_wins_b', 0) * h2h_weight
-            elif col == 'H2H_Home_Win_Rate': input_dict[col] = (h2h.get('h2h_wins_a', 0) / max(h2h_n, 1)) * h2h_weight
-            elif col == 'H2H_Away_Win_Rate': input_dict[col] = (h2h.get('h2h_wins_b', 0) / max(h2h_n, 1)) * h2h_weight
-            else: input_dict[col] = 0
-
-        # F. Datos HOME (Home_ prefix + _Home suffix)
-        elif col.startswith('Home') or '_Home' in col:
-            input_dict[col] = safe_get(h_row, col, 0)
-        
-        # G. Datos AWAY (Away_ prefix + _Away suffix)
-        elif col.startswith('Away') or '_Away' in col:
-            input_dict[col] = safe_get(a_row, col, 0)
-        
-        # H. Features con indicador home/away en minúsculas (opponent_*_home, etc.)
-        elif 'home' in col.lower():
-            input_dict[col] = safe_get(h_row, col, 0)
-        elif 'away' in col.lower():
-            input_dict[col] = safe_get(a_row, col, 0)
-            
-        # I. Diferencias y totales (diff_ / exp_)
-        elif 'diff_' in col or 'exp_' in col:
-            input_dict[col] = safe_get(h_row, col, 0)
-        
-        # J. Fallback: intentar desde h_row (temporal_weight, Points_Diff, etc.)
-        else:
-            input_dict[col] = safe_get(h_row, col, 0.0)
-
-    # ═══════════════════════════════════════════════════════════════════
-    # RECÁLCULO DE FEATURES CRUZADAS (dependen de AMBOS equipos)
-    # Las features cruzadas en h_row/a_row son del ÚLTIMO partido de cada
-    # equipo contra un rival DISTINTO. Aquí las recalculamos para el 
-    # matchup ACTUAL (local vs visitante).
-    # ═══════════════════════════════════════════════════════════════════
-    
-    # Extraer rolling stats de cada equipo (datos per-team, estos SÍ son correctos)
-    rs_h = safe_get(h_row, 'rolling_S_5_Home', 10)    # Tiros local
-    rs_a = safe_get(a_row, 'rolling_S_5_Away', 10)    # Tiros visitante
-    rc_h = safe_get(h_row, 'rolling_C_5_Home', 5)     # Corners local
-    rc_a = safe_get(a_row, 'rolling_C_5_Away', 5)     # Corners visitante
-    rst_h = safe_get(h_row, 'rolling_ST_5_Home', 4)   # Tiros a puerta local
-    rst_a = safe_get(a_row, 'rolling_ST_5_Away', 4)   # Tiros a puerta visitante
-    ros_h = safe_get(h_row, 'rolling_OppS_5_Home', 10)   # Tiros que RECIBE el local
-    ros_a = safe_get(a_row, 'rolling_OppS_5_Away', 10)   # Tiros que RECIBE el visitante
-    roc_h = safe_get(h_row, 'rolling_OppC_5_Home', 5)    # Corners que RECIBE local
-    roc_a = safe_get(a_row, 'rolling_OppC_5_Away', 5)    # Corners que RECIBE visitante
-    rost_h = safe_get(h_row, 'rolling_OppST_5_Home', 4)  # Tiros a puerta que RECIBE local
-    rost_a = safe_get(a_row, 'rolling_OppST_5_Away', 4)  # Tiros a puerta que RECIBE visitante
-    rs_role_h = safe_get(h_row, 'rolling_S_5_Role_Home', rs_h)
-    rs_role_a = safe_get(a_row, 'rolling_S_5_Role_Away', rs_a)
-    
-    # --- PASO 6: Defense Fatigue (cruzar ofensiva vs defensa del RIVAL ACTUAL) ---
-    # Shot Advantage: mis tiros vs lo que concede EL RIVAL ACTUAL
-    cross_fixes = {}
-    cross_fixes['Home_vs_Away_Shot_Advantage'] = (rs_h - ros_a) / 2
-    cross_fixes['Away_vs_Home_Shot_Advantage'] = (rs_a - ros_h) / 2
-    # Match Shot Expectancy: promedio de mi ataque + defensa del rival actual
-    cross_fixes['Match_Shot_Expectancy_Home'] = (rs_h + ros_a) / 2
-    cross_fixes['Match_Shot_Expectancy_Away'] = (rs_a + ros_h) / 2
-    cross_fixes['Match_Corner_Expectancy_Home'] = (rc_h + roc_a) / 2
-    cross_fixes['Match_Corner_Expectancy_Away'] = (rc_a + roc_h) / 2
-    # Defense Efficiency
-    cross_fixes['Home_Defense_Efficiency'] = (rost_h + 0.1) / (ros_h + 0.1)
-    cross_fixes['Away_Defense_Efficiency'] = (rost_a + 0.1) / (ros_a + 0.1)
-    
-    # --- PASO 7: Position Gap (usar posiciones ACTUALES de la tabla) ---
-    # Buscar posiciones actuales de ambos equipos en la liga
-    def get_current_standings(df, league):
-        """Calcula standings actuales desde los datos del dataset"""
-        league_df = df[df['Div'] == league].copy()
-        if league_df.empty:
-            return {}
-        # Usar solo la temporada más reciente (últimos 12 meses)
-        max_date = league_df['Date'].max()
-        season_start = max_date - pd.Timedelta(days=365)
-        league_df = league_df[league_df['Date'] >= season_start]
-        
-        teams = {}
-        for _, row in league_df.iterrows():
-            ht, at = row['HomeTeam'], row['AwayTeam']
-            hg, ag = row.get('FTHG', 0), row.get('FTAG', 0)
-            ftr = row.get('FTR', 'D')
-            for t in [ht, at]:
-                if t not in teams:
-                    teams[t] = {'points': 0, 'gd': 0}
-            if ftr == 'H':
-                teams[ht]['points'] += 3
-            elif ftr == 'A':
-                teams[at]['points'] += 3
-            else:
-                teams[ht]['points'] += 1
-                teams[at]['points'] += 1
-            teams[ht]['gd'] += (hg - ag) if pd.notna(hg) else 0
-            teams[at]['gd'] += (ag - hg) if pd.notna(ag) else 0
-        
-        sorted_teams = sorted(teams.items(), key=lambda x: (-x[1]['points'], -x[1]['gd']))
-        standings = {}
-        for pos, (team, data) in enumerate(sorted_teams, 1):
-            standings[team] = {'position': pos, 'points': data['points'], 'gd': data['gd']}
-        return standings
+    Args:
+        models: Diccionario de modelos (load_models)
+        fixtures: Lista de contextos devueltos por prepare_fixture
+        engine (InferenceEngine, optional): Motor ya construido para models
     
-    standings = get_current_standings(df, match_league) if match_league else {}
-    h_standing = standings.get(local, {'position': 10, 'points': 30, 'gd': 0})
-    a_standing = standings.get(visitante, {'position': 10, 'points': 30, 'gd': 0})
+    Returns:
+        dict: arrays alineados con fixtures ('prob_1x2_raw' (n, 3), 'mu_c', 'mu_s',
+              'mu_t' y, si existen los modelos separados, 'mu_hs', 'mu_as', 'mu_hst', 'mu_ast')
+    """
+    if engine is None:
+        engine = InferenceEngine(models)
+    return engine.run(fixtures, fixture_cross_features(fixtures))
+
+
+def finalize_fixture(df, state, fx, raw, i, verbose=False):
+    """
+    Post-procesa las salidas de los modelos para el partido i del lote:
+    calibración 1X2, reparto dinámico, ajustes CL/Liga y ensemble de tiros.
     
-    cross_fixes['Position_Diff'] = h_standing['position'] - a_standing['position']
-    cross_fixes['Points_Diff'] = h_standing['points'] - a_standing['points']
-    cross_fixes['GD_Diff'] = h_standing['gd'] - a_standing['gd']
-    
-    # Quality relativa: usa posiciones actuales, no del último oponente
-    cross_fixes['Home_vs_Away_Quality'] = (h_standing['position'] / (a_standing['position'] + 0.1)) - 1
-    cross_fixes['Away_vs_Home_Quality'] = (a_standing['position'] / (h_standing['position'] + 0.1)) - 1
-    
-    # opponent_position/points/gd: en el contexto actual = datos del rival ACTUAL
-    cross_fixes['opponent_position_home'] = a_standing['position']  # Rival del local = visitante
-    cross_fixes['opponent_position_away'] = h_standing['position']  # Rival del visitante = local
-    cross_fixes['opponent_points_home'] = a_standing['points']
-    cross_fixes['opponent_points_away'] = h_standing['points']
-    cross_fixes['opponent_gd_home'] = a_standing['gd']
-    cross_fixes['opponent_gd_away'] = h_standing['gd']
-    
-    # --- Aggression cruzada: Mi agresión × vulnerabilidad del RIVAL ACTUAL ---
-    h_aggression = safe_get(h_row, 'Home_Aggression_Score', 0.5)
-    a_aggression = safe_get(a_row, 'Away_Aggression_Score', 0.5)
-    h_vuln = safe_get(h_row, 'Home_Defensive_Vulnerability', 0)
-    a_vuln = safe_get(a_row, 'Away_Defensive_Vulnerability', 0)
-    h_perm = safe_get(h_row, 'Home_Defensive_Permissiveness', 0)
-    a_perm = safe_get(a_row, 'Away_Defensive_Permissiveness', 0)
-    
-    cross_fixes['Home_Attacking_vs_Away_Defense'] = h_aggression * (1 + np.clip(a_vuln, -1, 1))
-    cross_fixes['Away_Attacking_vs_Home_Defense'] = a_aggression * (1 + np.clip(h_vuln, -1, 1))
-    
-    # Expected Shots: mi tiro × permisividad del RIVAL ACTUAL
-    cross_fixes['Expected_Shots_Home'] = rs_role_h * (1 + a_perm * 0.5)
-    cross_fixes['Expected_Shots_Away'] = rs_role_a * (1 + h_perm * 0.5)
-    
-    h_accuracy = safe_get(h_row, 'Home_Shot_Accuracy', 0.35)
-    a_accuracy = safe_get(a_row, 'Away_Shot_Accuracy', 0.35)
-    cross_fixes['Expected_ST_Home'] = cross_fixes['Expected_Shots_Home'] * h_accuracy
-    cross_fixes['Expected_ST_Away'] = cross_fixes['Expected_Shots_Away'] * a_accuracy
-    
-    # Expected V2: con vulnerabilidad defensiva del rival actual
-    cross_fixes['Expected_Shots_Home_V2'] = rs_h * (1 + np.clip(a_vuln, -0.5, 0.5) * 0.3)
-    cross_fixes['Expected_Shots_Away_V2'] = rs_a * (1 + np.clip(h_vuln, -0.5, 0.5) * 0.3)
-    
-    # Possession EWM: ratio de tiros ambos equipos ACTUALES
-    total_s = rs_h + rs_a + 0.1
-    cross_fixes['Home_Possession_EWM'] = (rs_h / total_s) * 100
-    cross_fixes['Away_Possession_EWM'] = (rs_a / total_s) * 100
-    
-    # Expected con posesión
-    cross_fixes['Expected_Shots_Home_With_Possession'] = (
-        cross_fixes['Expected_Shots_Home_V2'] * (1 + (cross_fixes['Home_Possession_EWM'] - 50) / 100)
-    )
-    cross_fixes['Expected_Shots_Away_With_Possession'] = (
-        cross_fixes['Expected_Shots_Away_V2'] * (1 + (cross_fixes['Away_Possession_EWM'] - 50) / 100)
-    )
-    cross_fixes['Expected_ST_Home_Possession'] = cross_fixes['Expected_ST_Home'] * (1 + (cross_fixes['Home_Possession_EWM'] - 50) / 100)
-    cross_fixes['Expected_ST_Away_Possession'] = cross_fixes['Expected_ST_Away'] * (1 + (cross_fixes['Away_Possession_EWM'] - 50) / 100)
-    
-    # Diff y exp: recalcular con datos cruzados correctos
-    cross_fixes['diff_Shots'] = rs_h - rs_a
-    cross_fixes['exp_Total_Shots'] = rs_h + rs_a
-    cross_fixes['exp_Total_Corners'] = rc_h + rc_a
-    cross_fixes['Shot_Share_Home'] = rs_h / (rs_h + rs_a + 0.1)
-    cross_fixes['Corner_Share_Home'] = rc_h / (rc_h + rc_a + 0.1)
-
-    # ── RECÁLCULO FEATURES SoT CRUZADAS (para el rival ACTUAL, no el del último partido) ──
-    # Direct_SoT: mis shots × mi propia tasa de conversión a puerta (per-team stat OK)
-    ewm_sot_rate_h = safe_get(h_row, 'EWM_SoT_Rate_Home', 0.3)
-    ewm_sot_rate_a = safe_get(a_row, 'EWM_SoT_Rate_Away', 0.3)
-    # EWM_OppSoT_Rate: cuánto concede el RIVAL en conversión de tiros a puerta
-    ewm_opp_sot_rate_h = safe_get(h_row, 'EWM_OppSoT_Rate_Home', 0.3)  # concesión del LOCAL (útil para visitante)
-    ewm_opp_sot_rate_a = safe_get(a_row, 'EWM_OppSoT_Rate_Away', 0.3)  # concesión del VISITANTE (útil para local)
-    rst_role_h = safe_get(h_row, 'rolling_ST_5_Role_Home', rst_h)
-    rst_role_a = safe_get(a_row, 'rolling_ST_5_Role_Away', rst_a)
-    # Direct: mis shots × mi tasa de conversión
-    cross_fixes['Direct_SoT_Home'] = rs_role_h * ewm_sot_rate_h
-    cross_fixes['Direct_SoT_Away'] = rs_role_a * ewm_sot_rate_a
-    # Cross: mis shots × tasa de concesión del RIVAL ACTUAL (recalculado correctamente)
-    cross_fixes['Cross_SoT_Home'] = rs_role_h * ewm_opp_sot_rate_a
-    cross_fixes['Cross_SoT_Away'] = rs_role_a * ewm_opp_sot_rate_h
-    # SoT_Expectancy: blend 60/40
-    cross_fixes['SoT_Expectancy_Home'] = 0.6 * cross_fixes['Direct_SoT_Home'] + 0.4 * cross_fixes['Cross_SoT_Home']
-    cross_fixes['SoT_Expectancy_Away'] = 0.6 * cross_fixes['Direct_SoT_Away'] + 0.4 * cross_fixes['Cross_SoT_Away']
-    # Conceded_SoT: tiros a puerta que RECIBE cada equipo en su rol (per-team, OK desde fila)
-    conc_h = safe_get(h_row, 'Conceded_SoT_Home', rost_h)
-    conc_a = safe_get(a_row, 'Conceded_SoT_Away', rost_a)
-    cross_fixes['Conceded_SoT_Home'] = conc_h
-    cross_fixes['Conceded_SoT_Away'] = conc_a
-    # SoT_Dominance: mi expectativa de ataque / lo que concede el RIVAL ACTUAL
-    cross_fixes['SoT_Dominance_Home'] = cross_fixes['SoT_Expectancy_Home'] / (conc_a + 0.5)
-    cross_fixes['SoT_Dominance_Away'] = cross_fixes['SoT_Expectancy_Away'] / (conc_h + 0.5)
-    # Fast_SoT / Fast_Shots: son per-team rolling (alfa=0.4), correctos desde cada fila
-    cross_fixes['Fast_SoT_Home']   = safe_get(h_row, 'Fast_SoT_Home',   rst_role_h)
-    cross_fixes['Fast_SoT_Away']   = safe_get(a_row, 'Fast_SoT_Away',   rst_role_a)
-    cross_fixes['Fast_Shots_Home'] = safe_get(h_row, 'Fast_Shots_Home', rs_role_h)
-    cross_fixes['Fast_Shots_Away'] = safe_get(a_row, 'Fast_Shots_Away', rs_role_a)
-
-    # Aplicar a input_dict (modelo 1X2) y además construir shots_ext ya con los valores frescos
-    for col, val in cross_fixes.items():
-        if col in input_dict:
-            input_dict[col] = val
-
-    X_in = pd.DataFrame([input_dict])[model_features]
-    X_in = X_in.fillna(0)  # Seguro final: ningún NaN llega a los modelos
+    Returns:
+        dict: probabilidades finales, estimaciones por equipo y Kelly de corners
+    """
+    local, visitante = fx['local'], fx['visitante']
+    h, a = fx['h'], fx['a']
+    match_league = fx['match_league']
+    h_row, a_row = fx['h_row'], fx['a_row']
+    h_form, a_form = fx['h_form'], fx['a_form']
+    market_probs = fx['market_probs']
+    separate = 'mu_hs' in raw
 
     # 4. PREDICCIONES
-    prob_1x2_raw = m_res.predict_proba(X_in)[0]
-    
-    # Calibración: suavizar probabilidades extremas con temperature scaling
-    # p_cal = p^(1/T) / sum(p^(1/T)) — T>1 reduce overconfidence
-    def calibrate_probs(probs, temperature):
-        p_cal = np.power(np.clip(probs, 1e-10, 1), 1.0 / temperature)
-        return p_cal / p_cal.sum()
+    prob_1x2_raw = raw['prob_1x2_raw'][i]
     
-    market_probs = np.array([(1/h)/sum_inv, (1/d)/sum_inv, (1/a)/sum_inv])
     if match_league == 'CL':
         # CL: modelo entrenado con 97% doméstico → calibrar fuerte + dar peso al mercado
         prob_cal = calibrate_probs(prob_1x2_raw, temperature=3.0)
@@ -470,37 +295,15 @@ def predict_final_boss(local=None, visitante=None, h=None, d=None, a=None, match
     # Renormalizar
     prob_1x2 = np.clip(prob_1x2, 0.02, 0.95)
     prob_1x2 = prob_1x2 / prob_1x2.sum()
-    
-    # Construir X_shots_in con las features propias de los modelos de tiros
-    shots_model_features = m_corn.feature_names_in_
-    shots_ext = dict(input_dict)  # base con features del modelo 1X2
-    for col in shots_model_features:
-        if col not in shots_ext:
-            if '_Home' in col:
-                shots_ext[col] = safe_get(h_row, col, 0.0)
-            elif '_Away' in col:
-                shots_ext[col] = safe_get(a_row, col, 0.0)
-            else:
-                shots_ext[col] = safe_get(h_row, col, 0.0)
-    # Sobreescribir con cross_fixes (valores recalculados para el rival ACTUAL)
-    # Esto elimina los valores rancios de h_row/a_row que usaban al oponente anterior
-    for col, val in cross_fixes.items():
-        shots_ext[col] = val
-    X_shots_in = pd.DataFrame([shots_ext])[shots_model_features].fillna(0)
-
-    mu_c = m_corn.predict(X_shots_in)[0]
-    mu_s = m_shots.predict(X_shots_in)[0]
-    mu_t = m_target.predict(X_shots_in)[0]
-    
-    # Modelos separados para HS/AS/HST/AST
-    if has_separate_models:
-        sep_features = m_hs.feature_names_in_
-        X_sep = pd.DataFrame([shots_ext])[sep_features].fillna(0)
-        
-        mu_hs_direct = m_hs.predict(X_sep)[0]
-        mu_as_direct = m_as.predict(X_sep)[0]
-        mu_hst_direct = m_hst.predict(X_sep)[0]
-        mu_ast_direct = m_ast.predict(X_sep)[0]
+
+    mu_c = raw['mu_c'][i]
+    mu_s = raw['mu_s'][i]
+    mu_t = raw['mu_t'][i]
+    if separate:
+        mu_hs_direct = raw['mu_hs'][i]
+        mu_as_direct = raw['mu_as'][i]
+        mu_hst_direct = raw['mu_hst'][i]
+        mu_ast_direct = raw['mu_ast'][i]
     
     # 5. REPARTO DINÁMICO
     # Calcular shares de los rolling stats reales de AMBOS equipos (no de una sola fila)
@@ -519,8 +322,10 @@ def predict_final_boss(local=None, visitante=None, h=None, d=None, a=None, match
     # 5B. AJUSTE CL: Corregir predicciones con promedios reales de CL
     cl_adj_applied = False
     if match_league == 'CL':
-        h_cl = get_cl_stats(df, local, as_home=True, exclude_opponent=visitante)
-        a_cl = get_cl_stats(df, visitante, as_home=False, exclude_opponent=local)
+        h_cl = get_cl_stats(df, local, as_home=True, exclude_opponent=visitante,
+                            aggregates=state.role_aggregates)
+        a_cl = get_cl_stats(df, visitante, as_home=False, exclude_opponent=local,
+                            aggregates=state.role_aggregates)
         
         if h_cl and a_cl:
             min_n = min(h_cl['cl_n'], a_cl['cl_n'])
@@ -545,32 +350,35 @@ def predict_final_boss(local=None, visitante=None, h=None, d=None, a=None, match
             share_c = model_weight * share_c + cl_weight * cl_share_c
             
             # También ajustar modelos separados con CL real
-            if has_separate_models:
+            if separate:
                 mu_hs_direct = model_weight * mu_hs_direct + cl_weight * h_cl['cl_shots']
                 mu_as_direct = model_weight * mu_as_direct + cl_weight * a_cl['cl_shots']
                 mu_hst_direct = model_weight * mu_hst_direct + cl_weight * h_cl['cl_shots_target']
                 mu_ast_direct = model_weight * mu_ast_direct + cl_weight * a_cl['cl_shots_target']
             
             cl_adj_applied = True
-            print(f"\n[CL-ADJ] Ajuste Champions ({cl_weight:.0%} CL real, {model_weight:.0%} modelo):")
-            print(f"   Tiros totales: {mu_s_old:.1f} → {mu_s:.1f} (CL real: {cl_total_shots:.1f})")
-            print(f"   A puerta total: {mu_t_old:.1f} → {mu_t:.1f} (CL real: {cl_total_target:.1f})")
-            print(f"   Corners total: {mu_c_old:.1f} → {mu_c:.1f} (CL real: {cl_total_corners:.1f})")
-            if has_separate_models:
-                print(f"   HS directo: {mu_hs_direct:.1f} | AS directo: {mu_as_direct:.1f}")
-                print(f"   HST directo: {mu_hst_direct:.1f} | AST directo: {mu_ast_direct:.1f}")
-            print(f"   Datos CL: {local} {h_cl['cl_n']}p(H), {visitante} {a_cl['cl_n']}p(A)")
+            if verbose:
+                print(f"\n[CL-ADJ] Ajuste Champions ({cl_weight:.0%} CL real, {model_weight:.0%} modelo):")
+                print(f"   Tiros totales: {mu_s_old:.1f} → {mu_s:.1f} (CL real: {cl_total_shots:.1f})")
+                print(f"   A puerta total: {mu_t_old:.1f} → {mu_t:.1f} (CL real: {cl_total_target:.1f})")
+                print(f"   Corners total: {mu_c_old:.1f} → {mu_c:.1f} (CL real: {cl_total_corners:.1f})")
+                if separate:
+                    print(f"   HS directo: {mu_hs_direct:.1f} | AS directo: {mu_as_direct:.1f}")
+                    print(f"   HST directo: {mu_hst_direct:.1f} | AST directo: {mu_ast_direct:.1f}")
+                print(f"   Datos CL: {local} {h_cl['cl_n']}p(H), {visitante} {a_cl['cl_n']}p(A)")
 
     # 5D. AJUSTE LIGA DOMÉSTICA: usa stats reales del equipo SOLO en esa liga/rol
     # Para equipos que juegan también CL, su rolling puede estar sesgado por CL
     if match_league and match_league != 'CL' and not cl_adj_applied:
         # Resolver alias de nombres para la búsqueda en liga doméstica
-        local_res = resolve_team_name(local, df)
-        visitante_res = resolve_team_name(visitante, df)
+        local_res = state.resolve_name(local, df)
+        visitante_res = state.resolve_name(visitante, df)
         h_lg = get_league_role_stats(df, local_res, match_league, as_home=True,
-                                     n_games=8, exclude_opponent=visitante_res)
+                                     n_games=8, exclude_opponent=visitante_res,
+                                     aggregates=state.role_aggregates)
         a_lg = get_league_role_stats(df, visitante_res, match_league, as_home=False,
-                                     n_games=8, exclude_opponent=local_res)
+                                     n_games=8, exclude_opponent=local_res,
+                                     aggregates=state.role_aggregates)
         if h_lg and a_lg:
             min_n = min(h_lg['n'], a_lg['n'])
             # Peso bajo: el modelo ya conoce estos datos domain-specific
@@ -586,17 +394,224 @@ def predict_final_boss(local=None, visitante=None, h=None, d=None, a=None, match
                 mu_s = m_weight * mu_s + lg_weight * real_total_s
                 mu_t = m_weight * mu_t + lg_weight * real_total_t
                 mu_c = m_weight * mu_c + lg_weight * real_total_c
-                if has_separate_models:
+                if separate:
                     mu_hs_direct = m_weight * mu_hs_direct + lg_weight * h_lg['shots']
                     mu_as_direct = m_weight * mu_as_direct + lg_weight * a_lg['shots']
                     mu_hst_direct = m_weight * mu_hst_direct + lg_weight * h_lg['shots_target']
                     mu_ast_direct = m_weight * mu_ast_direct + lg_weight * a_lg['shots_target']
-                print(f"\n[LIGA-ADJ] Ajuste {match_league} ({lg_weight:.0%} liga real, {m_weight:.0%} modelo):")
-                print(f"   Tiros: {mu_s_pre:.1f} \u2192 {mu_s:.1f} (Liga real: {real_total_s:.1f})")
-                print(f"   A puerta: {mu_t_pre:.1f} \u2192 {mu_t:.1f} (Liga real: {real_total_t:.1f})")
-                print(f"   Datos: {local} {h_lg['n']}p(H), {visitante} {a_lg['n']}p(A)")
+                if verbose:
+                    print(f"\n[LIGA-ADJ] Ajuste {match_league} ({lg_weight:.0%} liga real, {m_weight:.0%} modelo):")
+                    print(f"   Tiros: {mu_s_pre:.1f} → {mu_s:.1f} (Liga real: {real_total_s:.1f})")
+                    print(f"   A puerta: {mu_t_pre:.1f} → {mu_t:.1f} (Liga real: {real_total_t:.1f})")
+                    print(f"   Datos: {local} {h_lg['n']}p(H), {visitante} {a_lg['n']}p(A)")
 
-    def get_p(mu, line): return (1 - poisson.cdf(line, mu)) * 100
+    # Cálculos individuales
+    # ENSEMBLE INTELIGENTE: total+share como base, separados como refinamiento
+    # Si los separados están dentro de rango razonable, contribuyen al promedio
+    # Si divergen mucho (>40%), se ignoran y se usa solo total+share
+    hs_from_total = mu_s * share_s
+    as_from_total = mu_s * (1 - share_s)
+    hst_from_total = mu_t * share_s
+    ast_from_total = mu_t * (1 - share_s)
+    
+    if separate:
+        is_cl = match_league == 'CL'
+        hs_final = smart_blend(hs_from_total, mu_hs_direct, is_cl)
+        as_final = smart_blend(as_from_total, mu_as_direct, is_cl)
+        hst_final = smart_blend(hst_from_total, mu_hst_direct, is_cl)
+        ast_final = smart_blend(ast_from_total, mu_ast_direct, is_cl)
+    else:
+        hs_final = hs_from_total
+        as_final = as_from_total
+        hst_final = hst_from_total
+        ast_final = ast_from_total
+
+    teams = []
+    for i_team, (equipo, cm, sm, tm, lines, cuota_mercado, row_data) in enumerate([
+        (local, mu_c * share_c, hs_final, hst_final, HOME_LINES, h, h_row),
+        (visitante, mu_c * (1-share_c), as_final, ast_final, AWAY_LINES, a, a_row),
+    ]):
+        l_c, l_s, l_t = lines
+        # Cálculo de Kelly para Corners (con factor de inestabilidad)
+        prob_ia_decimal = get_p(cm, l_c) / 100
+        instabilidad = float(safe_get(row_data, 'avg_instability_Home' if i_team == 0 else 'avg_instability_Away', 0))
+        teams.append({
+            'team': equipo,
+            'corners': cm, 'shots': sm, 'shots_target': tm,
+            'lines': lines,
+            'p_corners': get_p(cm, l_c), 'p_shots': get_p(sm, l_s), 'p_shots_target': get_p(tm, l_t),
+            'cuota': cuota_mercado,
+            'instability': instabilidad,
+            'kelly': calcular_kelly(prob_ia_decimal, cuota_mercado, instabilidad=instabilidad),
+        })
+
+    return {
+        'prob_1x2': prob_1x2,
+        'prob_1x2_raw': prob_1x2_raw,
+        'market_probs': market_probs,
+        'mu_c': mu_c, 'mu_s': mu_s, 'mu_t': mu_t,
+        'teams': teams,
+    }
+
+
+def fixture_record(fx, res):
+    """Aplana un partido predicho en un registro plano (una fila por partido)."""
+    home, away = res['teams']
+    record = {
+        'HomeTeam': fx['local'], 'AwayTeam': fx['visitante'], 'Div': fx['match_league'],
+        'AvgH': fx['h'], 'AvgD': fx['d'], 'AvgA': fx['a'],
+        'Prob_H': res['prob_1x2'][0], 'Prob_D': res['prob_1x2'][1], 'Prob_A': res['prob_1x2'][2],
+        'Model_Prob_H': res['prob_1x2_raw'][0], 'Model_Prob_D': res['prob_1x2_raw'][1],
+        'Model_Prob_A': res['prob_1x2_raw'][2],
+        'Total_Corners': res['mu_c'], 'Total_Shots': res['mu_s'], 'Total_Shots_Target': res['mu_t'],
+    }
+    for side, t in (('Home', home), ('Away', away)):
+        l_c, l_s, l_t = t['lines']
+        record[f'Corners_{side}'] = t['corners']
+        record[f'Shots_{side}'] = t['shots']
+        record[f'Shots_Target_{side}'] = t['shots_target']
+        record[f'P_Corners_{side}_Over_{l_c}'] = t['p_corners'] / 100
+        record[f'P_Shots_{side}_Over_{l_s}'] = t['p_shots'] / 100
+        record[f'P_Shots_Target_{side}_Over_{l_t}'] = t['p_shots_target'] / 100
+        record[f'Kelly_Corners_{side}'] = t['kelly']
+    return {k: (float(v) if isinstance(v, np.floating) else v) for k, v in record.items()}
+
+
+def portfolio_stakes(results, bankroll=100):
+    """
+    Stakes de corners de todo el lote repartidos como cartera (portfolio.allocate):
+    las dos apuestas de cada partido se correlacionan y la exposición por
+    partido y total queda acotada. Kelly_Corners_* sigue siendo el Kelly aislado.
+
+    Returns:
+        list: un dict por partido con Stake_Corners_Home y Stake_Corners_Away
+    """
+    teams = [t for res in results for t in res['teams']]
+    stakes = allocate([t['p_corners'] / 100 for t in teams], [t['cuota'] for t in teams],
+                      np.repeat(np.arange(len(results)), 2),
+                      [t['instability'] for t in teams], bankroll=bankroll).reshape(-1, 2)
+    return [{'Stake_Corners_Home': float(home), 'Stake_Corners_Away': float(away)}
+            for home, away in stakes]
+
+
+def predict_fixtures(fixtures, df=None, state=None, models=None, engine=None):
+    """
+    Predicción por lotes: construye todos los vectores de features y ejecuta una
+    sola pasada por modelo sobre el lote completo. No imprime reporte ni escribe
+    en el log de Excel.
+    
+    Args:
+        fixtures: Lista de dicts con HomeTeam, AwayTeam, AvgH, AvgD, AvgA y Div (opcional)
+        df, state, models: recursos ya cargados (se cargan si son None)
+        engine (InferenceEngine, optional): Motor de inferencia de models
+    
+    Returns:
+        list: un registro por partido (fixture_record + goal_fields + portfolio_stakes); los partidos sin datos
+              llevan solo sus campos de entrada y 'Error'
+    """
+    if df is None:
+        df = load_dataset()
+    if state is None:
+        state = load_serving_state(df)
+    if models is None:
+        models = load_models()
+
+    prepared, records = [], []
+    for fixture in fixtures:
+        league = fixture.get('Div')
+        league = league.upper() if isinstance(league, str) and league.strip() else None
+        try:
+            fx = prepare_fixture(df, state, models, fixture['HomeTeam'], fixture['AwayTeam'],
+                                 float(fixture['AvgH']), float(fixture['AvgD']), float(fixture['AvgA']),
+                                 match_league=league)
+            prepared.append(fx)
+            records.append(None)
+        except Exception as e:
+            records.append({'HomeTeam': fixture.get('HomeTeam'), 'AwayTeam': fixture.get('AwayTeam'),
+                            'Div': league, 'Error': str(e)})
+
+    if prepared:
+        raw = run_models(models, prepared, engine)
+        results = [finalize_fixture(df, state, fx, raw, i) for i, fx in enumerate(prepared)]
+        # Mercados de goles de todo el lote desde un único tensor de marcadores
+        goals = goal_fields([res['prob_1x2'] for res in results],
+                            [fx['match_league'] for fx in prepared], state.goal_params)
+        stakes = portfolio_stakes(results)
+        results = iter({**fixture_record(fx, res), **extra, **stake}
+                       for fx, res, extra, stake in zip(prepared, results, goals, stakes))
+        records = [rec if rec is not None else next(results) for rec in records]
+    return records
+
+
+def predict_final_boss(local=None, visitante=None, h=None, d=None, a=None, match_league=None, h2h_weight=1.0,
+                       session=None):
+    """
+    Sistema de predicción contextual.
+    
+    Args:
+        local (str, optional): Nombre del equipo local
+        visitante (str, optional): Nombre del equipo visitante
+        h (float, optional): Cuota para el local
+        d (float, optional): Cuota para el empate
+        a (float, optional): Cuota para el visitante
+        match_league (str, optional): Liga del partido (ej: 'CL', 'E0') para contexto
+        h2h_weight (float, optional): Factor para atenuar H2H (0.0=ignorar, 1.0=normal, 0.5=reducir 50%)
+        session (PredictorSession, optional): Sesión con dataset/modelos ya cargados;
+            si es None se cargan desde disco en esta llamada
+    """
+    # 1. Carga de recursos
+    engine = None
+    if session is not None:
+        snap = session.snapshot()
+        df, state, models, engine = snap.df, snap.state, snap.models, snap.engine
+    else:
+        try:
+            df = load_dataset()
+            # Agregados precalculados (equipo, liga, rol) para los ajustes CL/Liga
+            state = load_serving_state(df)
+            models = load_models()
+        except Exception as e:
+            print(f"Error cargando recursos: {e}")
+            return
+    
+    # Inicializar logger
+    from logger import PredictionLogger
+    logger = PredictionLogger(LOG_PATH)
+
+    print("\n" + "═"*55)
+    print("      SISTEMA DE PREDICCIÓN CONTEXTUAL V2.0")
+    print("═"*55)
+    
+    # --- Si no recibe argumentos, los pide ---
+    if local is None or visitante is None:
+        # BUSCADOR REPARADO
+        busqueda = input("\nBuscar equipo (o Enter para saltar): ").strip()
+        if busqueda:
+            coincidencias = state.catalog.search(busqueda)
+            print(f"Coincidencias: {', '.join(coincidencias)}")
+
+        local = input("\nNombre Local: ") if local is None else local
+        visitante = input("Nombre Visitante: ") if visitante is None else visitante
+    
+    if h is None or d is None or a is None:
+        h = float(input("Cuota 1: ") if h is None else h)
+        d = float(input("Cuota X: ") if d is None else d)
+        a = float(input("Cuota 2: ") if a is None else a)
+
+    try:
+        fx = prepare_fixture(df, state, models, local, visitante, h, d, a,
+                             match_league=match_league, h2h_weight=h2h_weight, verbose=True)
+    except LookupError as e:
+        print(f"Error: {e}")
+        return
+    except Exception as e:
+        print(f"Error en búsqueda de datos: {str(e)}")
+        return
+
+    raw = run_models(models, [fx], engine)
+    res = finalize_fixture(df, state, fx, raw, 0, verbose=True)
+    prob_1x2, prob_1x2_raw, market_probs = res['prob_1x2'], res['prob_1x2_raw'], res['market_probs']
+    h2h, h_form, a_form = fx['h2h'], fx['h_form'], fx['a_form']
 
     # 6. REPORTE VISUAL V2
     print("\n" + "╔" + "═"*55 + "╗")
@@ -637,85 +652,42 @@ def predict_final_boss(local=None, visitante=None, h=None, d=None, a=None, match
     else:
         print(f"║ H2H: Sin enfrentamientos previos ".ljust(56) + "║")
     print("╠" + "═"*55 + "╣")
-    
-    # Cálculos individuales
-    # ENSEMBLE INTELIGENTE: total+share como base, separados como refinamiento
-    # Si los separados están dentro de rango razonable, contribuyen al promedio
-    # Si divergen mucho (>40%), se ignoran y se usa solo total+share
-    hs_from_total = mu_s * share_s
-    as_from_total = mu_s * (1 - share_s)
-    hst_from_total = mu_t * share_s
-    ast_from_total = mu_t * (1 - share_s)
-    
-    if has_separate_models:
-        def smart_blend(total_val, sep_val, is_cl=False):
-            """Mezcla inteligente: usa separado solo si es razonable"""
-            if total_val <= 0:
-                return sep_val
-            if sep_val <= 0:
-                return total_val
-            ratio = sep_val / total_val
-            # Si el separado diverge más de 50% del total, ignorarlo
-            if ratio < 0.50 or ratio > 1.50:
-                return total_val
-            # CL con ajuste real: 55% total (ya tiene CL-ADJ) + 45% separado
-            # Doméstica: 40% total + 60% separado (separados son más precisos por rol)
-            w_sep = 0.45 if is_cl else 0.60
-            return (1 - w_sep) * total_val + w_sep * sep_val
-        
-        is_cl = match_league == 'CL'
-        hs_final = smart_blend(hs_from_total, mu_hs_direct, is_cl)
-        as_final = smart_blend(as_from_total, mu_as_direct, is_cl)
-        hst_final = smart_blend(hst_from_total, mu_hst_direct, is_cl)
-        ast_final = smart_blend(ast_from_total, mu_ast_direct, is_cl)
-    else:
-        hs_final = hs_from_total
-        as_final = as_from_total
-        hst_final = hst_from_total
-        ast_final = ast_from_total
-    
-    data = [
-        (f"[HOME] {local}", mu_c * share_c, hs_final, hst_final, 4.5, 11.5, 4.5, h, h_row),
-        (f"[AWAY] {visitante}", mu_c * (1-share_c), as_final, ast_final, 3.5, 9.5, 3.5, a, a_row)
-    ]
 
-    for i, (name, cm, sm, tm, l_c, l_s, l_t, cuota_mercado, row_data) in enumerate(data):
+    for i, t in enumerate(res['teams']):
+        name = f"[HOME] {local}" if i == 0 else f"[AWAY] {visitante}"
+        l_c, l_s, l_t = t['lines']
         print(f"║ [STATS] {name.upper()}")
-        print(f"║    CORNERS (Est: {cm:.1f}) -> +{l_c}: {get_p(cm, l_c):.1f}%")
-        print(f"║    TIROS   (Est: {sm:.1f}) -> +{l_s}: {get_p(sm, l_s):.1f}%")
-        print(f"║    A PUERTA(Est: {tm:.1f}) -> +{l_t}: {get_p(tm, l_t):.1f}%")
-        
-        # Cálculo de Kelly para Corners (con factor de inestabilidad)
-        prob_ia_decimal = get_p(cm, l_c) / 100
-        instabilidad = row_data.get('avg_instability_Home' if i == 0 else 'avg_instability_Away', 0)
-        instabilidad = float(instabilidad) if pd.notna(instabilidad) else 0
+        print(f"║    CORNERS (Est: {t['corners']:.1f}) -> +{l_c}: {t['p_corners']:.1f}%")
+        print(f"║    TIROS   (Est: {t['shots']:.1f}) -> +{l_s}: {t['p_shots']:.1f}%")
+        print(f"║    A PUERTA(Est: {t['shots_target']:.1f}) -> +{l_t}: {t['p_shots_target']:.1f}%")
         
-        recomendacion = calcular_kelly(prob_ia_decimal, cuota_mercado, instabilidad=instabilidad)
+        recomendacion = t['kelly']
+        instabilidad = t['instability']
         
         # Registrar en logger
-        equipo = local if i == 0 else visitante
         logger.log_prediction(
-            date_pred=str(pd.Timestamp.now().date()),
+            date_pred=str(date.today()),
             home_team=local,
             away_team=visitante,
             event_type=f'Corners +{l_c}',
             over_line=l_c,
-            prob_ia=prob_ia_decimal,
-            cuota=cuota_mercado,
+            prob_ia=t['p_corners'] / 100,
+            cuota=t['cuota'],
             kelly_amount=recomendacion,
             instability_score=instabilidad,
-            notes=f'Equipo: {equipo}'
+            notes=f"Equipo: {t['team']}",
+            league=fx['match_league']
         )
         
         if recomendacion > 0:
-            print(f"\u2551 [VALUE] Apostar {recomendacion:.2f}€ (inestabilidad: {instabilidad:.2f})")
+            print(f"║ [VALUE] Apostar {recomendacion:.2f}€ (inestabilidad: {instabilidad:.2f})")
         
         if i == 0: print("╟" + "─"*55 + "╢")
     print("╚" + "═"*55 + "╝")
     
-    # Guardar predicciones en Excel
+    # Anexar predicciones al log
     logger.save_predictions()
-    print(f"\n[OK] Predicción guardada en data/prediction_log.xlsx")
+    print(f"\n[OK] Predicción guardada en {LOG_PATH}")
 
 if __name__ == "__main__":
     # Permite recibir argumentos: python predict.py "Barcelona" "Valencia" "1.85" "3.75" "4.20"
@@ -730,4 +702,4 @@ if __name__ == "__main__":
         league = sys.argv[6].upper() if len(sys.argv) > 6 else None
         predict_final_boss(local, visitante, h, d, a, match_league=league)
     else:
-        predict_final_boss()
\ No newline at end of file
+        predict_final_boss()
@@ -0,0 +1,216 @@
+"""
+Sesión de predicción persistente.
+
+Carga dataset, estado de serving (agregados, contextos, alias) y modelos UNA
+vez y los mantiene en memoria. Las predicciones en caliente no tocan disco;
+reload() vuelve a leer los artefactos cuando hay modelos o datos nuevos, y
+start_watcher() lo hace solo cuando detecta una versión nueva completa.
+
+Uso:
+    from predictor import PredictorSession
+    session = PredictorSession()
+    session.predict({'HomeTeam': 'Arsenal', 'AwayTeam': 'Chelsea',
+                     'AvgH': 1.9, 'AvgD': 3.5, 'AvgA': 4.2, 'Div': 'E0'})
+"""
+
+import threading
+import time
+from predict import DATASET_PATH, load_dataset, predict_fixtures, predict_final_boss
+from inference_engine import InferenceEngine
+from model_registry import load_models, models_version
+from serving_state import SERVING_STATE_PATH, dataset_fingerprint, load_serving_state
+from serving_bundle import attach_bundle, current_version
+
+WATCH_INTERVAL = 5.0  # segundos entre comprobaciones de artefactos nuevos
+
+
+class ServingSnapshot:
+    """
+    Conjunto inmutable de recursos de una versión de artefactos.
+    Una predicción toma la instantánea al empezar y la usa hasta el final,
+    aunque mientras tanto se publique otra.
+    """
+
+    def __init__(self, df, state, models, version, bundle_version=None):
+        self.df = df
+        self.state = state
+        self.models = models
+        self.engine = InferenceEngine(models)
+        self.version = version
+        self.bundle_version = bundle_version
+        self.loaded_at = time.time()
+
+
+class PredictorSession:
+    """
+    Mantiene residentes los recursos de predicción.
+
+    Atributos (de la instantánea activa):
+        df: Dataset completo (Date en datetime)
+        state: ServingState correspondiente al dataset
+        models: Diccionario de modelos (load_models)
+        engine: InferenceEngine sobre esos modelos (Booster nativos)
+        loaded_at: time.time() de la última carga
+        version: (versión de modelos, versión de datos) cargada
+        bundle_version: versión del bundle adjunto (None si se cargó desde el CSV)
+
+    Con bundle='data/serving_bundle' el dataset y el estado se adjuntan con mmap
+    desde el bundle compartido (serving_bundle.py) en lugar de leer el CSV.
+    """
+
+    def __init__(self, dataset_path=DATASET_PATH, state_path=SERVING_STATE_PATH, bundle=None):
+        self.dataset_path = dataset_path
+        self.state_path = state_path
+        self.bundle = bundle
+        self._snapshot = None
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+        self.reloads = 0
+        self.last_reload_error = None
+        self.reload()
+
+    # ── Instantánea activa ─────────────────────────────────────────────
+    @property
+    def df(self):
+        return self._snapshot.df
+
+    @property
+    def state(self):
+        return self._snapshot.state
+
+    @property
+    def models(self):
+        return self._snapshot.models
+
+    @property
+    def engine(self):
+        return self._snapshot.engine
+
+    @property
+    def loaded_at(self):
+        return self._snapshot.loaded_at
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    @property
+    def bundle_version(self):
+        return self._snapshot.bundle_version
+
+    def snapshot(self):
+        """Instantánea activa (ServingSnapshot): recursos de una misma versión."""
+        return self._snapshot
+
+    def resources(self):
+        """(df, state, models) de una misma versión, para usarlos juntos."""
+        snap = self._snapshot
+        return snap.df, snap.state, snap.models
+
+    # ── Carga ──────────────────────────────────────────────────────────
+    def artifact_version(self):
+        """Versión de los artefactos en disco: (modelos, datos)."""
+        if self.bundle:
+            data_version = current_version(self.bundle)
+        else:
+            data_version = dataset_fingerprint(self.dataset_path)
+        return (models_version(), data_version)
+
+    def reload(self):
+        """
+        Vuelve a cargar dataset, estado de serving y modelos desde disco.
+        Los recursos nuevos se cargan completos antes de sustituir a los
+        actuales (un único cambio de referencia): si algo falla, la sesión
+        sigue con los anteriores y las predicciones en curso no se enteran.
+        En una recarga los Booster también se cargan antes del cambio; solo
+        el arranque en frío los deja perezosos (se cargan al usarse).
+
+        Returns:
+            float: segundos que tardó la carga
+        """
+        with self._reload_lock:
+            t0 = time.perf_counter()
+            version = self.artifact_version()
+            bundle_version = None
+            if self.bundle:
+                df, state, manifest = attach_bundle(self.bundle)
+                bundle_version = manifest['version']
+            else:
+                df = load_dataset(self.dataset_path)
+                state = load_serving_state(df, dataset_path=self.dataset_path, path=self.state_path)
+            models = load_models()
+            snapshot = ServingSnapshot(df, state, models, version, bundle_version)
+            if self._snapshot is not None:
+                # Recarga en caliente: los Booster se cargan antes del cambio, no en la primera petición
+                snapshot.engine.warm()
+            self._snapshot = snapshot
+            self.reloads += 1
+            return time.perf_counter() - t0
+
+    # ── Recarga en caliente ────────────────────────────────────────────
+    def start_watcher(self, interval=WATCH_INTERVAL):
+        """
+        Arranca un hilo que comprueba cada `interval` segundos si hay una
+        versión nueva de modelos o datos y la carga en segundo plano.
+        Una versión se recarga cuando sigue igual en dos comprobaciones
+        seguidas (el CSV no tiene marcador de escritura completa).
+        """
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch_loop, args=(interval,),
+                                         name='artifact-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch_loop(self, interval):
+        pending = None
+        while not self._stop.wait(interval):
+            try:
+                current = self.artifact_version()
+            except Exception:
+                continue
+            if current == self.version:
+                pending = None
+                continue
+            if current != pending:
+                pending = current
+                continue
+            try:
+                seconds = self.reload()
+                self.last_reload_error = None
+                print(f"[OK] Artefactos recargados en {seconds:.2f}s (modelos {current[0]})")
+            except Exception as e:
+                self.last_reload_error = str(e)
+                print(f"[WARN] Recarga fallida, se mantiene la versión anterior: {e}")
+            pending = None
+
+    # ── Predicción ─────────────────────────────────────────────────────
+    def predict(self, fixture):
+        """
+        Predice un partido con los recursos en memoria (sin E/S de disco).
+
+        Args:
+            fixture (dict): HomeTeam, AwayTeam, AvgH, AvgD, AvgA y Div (opcional)
+
+        Returns:
+            dict: registro plano de predict_fixtures (con 'Error' si no hay datos)
+        """
+        return self.predict_many([fixture])[0]
+
+    def predict_many(self, fixtures):
+        """Predice una lista de partidos en un solo lote."""
+        snap = self.snapshot()
+        return predict_fixtures(fixtures, df=snap.df, state=snap.state, models=snap.models,
+                                engine=snap.engine)
+
+    def report(self, local, visitante, h, d, a, match_league=None, h2h_weight=1.0):
+        """Reporte interactivo completo (igual que predict_final_boss) con los recursos en memoria."""
+        return predict_final_boss(local, visitante, h, d, a, match_league=match_league,
+                                  h2h_weight=h2h_weight, session=self)
@@ -1,9 +1,12 @@
 import pandas as pd
-import glob
-import os
 import warnings
 import numpy as np
 from pandas.errors import PerformanceWarning
+from pipeline import source_files
+from cross_features import (shot_advantage, match_expectancy, defense_efficiency, quality_ratio,
+                            attacking_vs_defense, expected_shots, expected_shots_v2, expected_st,
+                            possession_ewm, with_possession, expected_st_possession, share,
+                            direct_sot, cross_sot, sot_expectancy, sot_dominance)
 
 warnings.simplefilter(action='ignore', category=PerformanceWarning)
 
@@ -108,12 +111,14 @@ def calculate_dynamic_standings(df):
             # 1. Puntos (descendente)
             # 2. Diferencia de goles (descendente)
             # 3. Goles a favor (descendente)
+            # 4. Nombre: desempate explícito, así la tabla no depende del orden
+            #    en que se leyeron los CSV ni de las filas de la misma fecha
             standings = sorted(
                 [
                     (team, stats['points'], stats['gf'] - stats['ga'], stats['gf'])
                     for team, stats in team_stats.items()
                 ],
-                key=lambda x: (-x[1], -x[2], -x[3])  # Puntos, GD, GF
+                key=lambda x: (-x[1], -x[2], -x[3], x[0])  # Puntos, GD, GF, nombre
             )
             
             # Guardar standings para esta fecha y liga
@@ -365,8 +370,8 @@ def get_rolling_stats(df, n_games=5):
     df['Home_Advantage_Target_Away'] = df['AwayTeam'].map(home_advantage_target_map).fillna(0)
     
     # Corner Share: Qué porcentaje de corners suele aportar cada equipo
-    df['Corner_Share_Home'] = df[f'rolling_C_{n_games}_Home'] / (df[f'rolling_C_{n_games}_Home'] + df[f'rolling_C_{n_games}_Away']).replace(0, 1)
-    df['Shot_Share_Home'] = df[f'rolling_S_{n_games}_Home'] / (df[f'rolling_S_{n_games}_Home'] + df[f'rolling_S_{n_games}_Away']).replace(0, 1)
+    df['Corner_Share_Home'] = share(df[f'rolling_C_{n_games}_Home'], df[f'rolling_C_{n_games}_Away'])
+    df['Shot_Share_Home'] = share(df[f'rolling_S_{n_games}_Home'], df[f'rolling_S_{n_games}_Away'])
     
     # Fill NaN slopes con 0 (sin tendencia)
     for c in df.columns:
@@ -469,20 +474,20 @@ def get_rolling_stats(df, n_games=5):
     # Cruzar la ofensiva del equipo con la defensa permisiva del rival
     # Idea: "Mis tiros vs tiros que recibe el rival"
     
-    df['Home_vs_Away_Shot_Advantage'] = (df[f'rolling_S_{n_games}_Home'] - df[f'rolling_OppS_{n_games}_Away']) / 2
-    df['Away_vs_Home_Shot_Advantage'] = (df[f'rolling_S_{n_games}_Away'] - df[f'rolling_OppS_{n_games}_Home']) / 2
+    df['Home_vs_Away_Shot_Advantage'] = shot_advantage(df[f'rolling_S_{n_games}_Home'], df[f'rolling_OppS_{n_games}_Away'])
+    df['Away_vs_Home_Shot_Advantage'] = shot_advantage(df[f'rolling_S_{n_games}_Away'], df[f'rolling_OppS_{n_games}_Home'])
     
     # Match Shot Expectancy (Promedio de ofensiva local y defensa del visitante)
-    df['Match_Shot_Expectancy_Home'] = (df[f'rolling_S_{n_games}_Home'] + df[f'rolling_OppS_{n_games}_Away']) / 2
-    df['Match_Shot_Expectancy_Away'] = (df[f'rolling_S_{n_games}_Away'] + df[f'rolling_OppS_{n_games}_Home']) / 2
+    df['Match_Shot_Expectancy_Home'] = match_expectancy(df[f'rolling_S_{n_games}_Home'], df[f'rolling_OppS_{n_games}_Away'])
+    df['Match_Shot_Expectancy_Away'] = match_expectancy(df[f'rolling_S_{n_games}_Away'], df[f'rolling_OppS_{n_games}_Home'])
     
     # Match Corner Expectancy (Similar para corners)
-    df['Match_Corner_Expectancy_Home'] = (df[f'rolling_C_{n_games}_Home'] + df[f'rolling_OppC_{n_games}_Away']) / 2
-    df['Match_Corner_Expectancy_Away'] = (df[f'rolling_C_{n_games}_Away'] + df[f'rolling_OppC_{n_games}_Home']) / 2
+    df['Match_Corner_Expectancy_Home'] = match_expectancy(df[f'rolling_C_{n_games}_Home'], df[f'rolling_OppC_{n_games}_Away'])
+    df['Match_Corner_Expectancy_Away'] = match_expectancy(df[f'rolling_C_{n_games}_Away'], df[f'rolling_OppC_{n_games}_Home'])
     
     # Defense Efficiency Ratio (Cuántos tiros recibe pero evita que sean peligrosos)
-    df['Home_Defense_Efficiency'] = (df[f'rolling_OppST_{n_games}_Home'] + 0.1) / (df[f'rolling_OppS_{n_games}_Home'] + 0.1)
-    df['Away_Defense_Efficiency'] = (df[f'rolling_OppST_{n_games}_Away'] + 0.1) / (df[f'rolling_OppS_{n_games}_Away'] + 0.1)
+    df['Home_Defense_Efficiency'] = defense_efficiency(df[f'rolling_OppST_{n_games}_Home'], df[f'rolling_OppS_{n_games}_Home'])
+    df['Away_Defense_Efficiency'] = defense_efficiency(df[f'rolling_OppST_{n_games}_Away'], df[f'rolling_OppS_{n_games}_Away'])
     
     # ============ PASO 7: ELO/POSITION GAP (Diferencia de Nivel) ============
     # Captura la "distancia" real entre equipos más allá de números planos
@@ -492,8 +497,8 @@ def get_rolling_stats(df, n_games=5):
     df['GD_Diff'] = df['opponent_gd_away'] - df['opponent_gd_home']
     
     # Calidad relativa del rival
-    df['Home_vs_Away_Quality'] = (df['opponent_position_away'] / (df['opponent_position_home'] + 0.1)) - 1
-    df['Away_vs_Home_Quality'] = (df['opponent_position_home'] / (df['opponent_position_away'] + 0.1)) - 1
+    df['Home_vs_Away_Quality'] = quality_ratio(df['opponent_position_away'], df['opponent_position_home'])
+    df['Away_vs_Home_Quality'] = quality_ratio(df['opponent_position_home'], df['opponent_position_away'])
     
     # ============ PASO 8: HEAD-TO-HEAD RECIENTE (Bestias Negras) ============
     # Identifica matchups donde un equipo sistemáticamente le gana a otro
@@ -568,22 +573,12 @@ def get_rolling_stats(df, n_games=5):
     # 7. EXPECTED SHOTS CON AGGRESSION (Predicción mejorada)
     # Expected_Shots = Mi agresión × Defensa permisiva del rival
     # MEJORA #5: Usar rolling por ROL (Home/Away específico) para mayor precisión
-    df['Expected_Shots_Home'] = (
-        df[f'rolling_S_{n_games}_Role_Home'] *
-        (1 + df['Away_Defensive_Permissiveness'] * 0.5)
-    )
-    df['Expected_Shots_Away'] = (
-        df[f'rolling_S_{n_games}_Role_Away'] *
-        (1 + df['Home_Defensive_Permissiveness'] * 0.5)
-    )
+    df['Expected_Shots_Home'] = expected_shots(df[f'rolling_S_{n_games}_Role_Home'], df['Away_Defensive_Permissiveness'])
+    df['Expected_Shots_Away'] = expected_shots(df[f'rolling_S_{n_games}_Role_Away'], df['Home_Defensive_Permissiveness'])
     # 7. EXPECTED SHOTS ON TARGET (Con precisión)
     # MEJORA #5: Usar rolling por ROL para ST también
-    df['Expected_ST_Home'] = (
-        df['Expected_Shots_Home'] * df['Home_Shot_Accuracy']
-    )
-    df['Expected_ST_Away'] = (
-        df['Expected_Shots_Away'] * df['Away_Shot_Accuracy']
-    )
+    df['Expected_ST_Home'] = expected_st(df['Expected_Shots_Home'], df['Home_Shot_Accuracy'])
+    df['Expected_ST_Away'] = expected_st(df['Expected_Shots_Away'], df['Away_Shot_Accuracy'])
     
     # ============ MEJORA #2: OPPOSITION DEFENSIVE STYLE (Defensa del Rival) ============
     # Idea: No solo qué tiro, sino CÓMO juega defensivamente el rival
@@ -611,22 +606,12 @@ def get_rolling_stats(df, n_games=5):
     
     # 3. Crossover Effect (Mi agresión × vulnerabilidad defensiva del rival)
     # "Cuán peligrosa es mi ofensiva contra la defensa del rival"
-    df['Home_Attacking_vs_Away_Defense'] = (
-        df['Home_Aggression_Score'] * (1 + df['Away_Defensive_Vulnerability'].clip(-1, 1))
-    )
-    df['Away_Attacking_vs_Home_Defense'] = (
-        df['Away_Aggression_Score'] * (1 + df['Home_Defensive_Vulnerability'].clip(-1, 1))
-    )
+    df['Home_Attacking_vs_Away_Defense'] = attacking_vs_defense(df['Home_Aggression_Score'], df['Away_Defensive_Vulnerability'])
+    df['Away_Attacking_vs_Home_Defense'] = attacking_vs_defense(df['Away_Aggression_Score'], df['Home_Defensive_Vulnerability'])
     
     # 4. Expected Shots MEJORADO (Versión 2 - con estilo defensivo)
-    df['Expected_Shots_Home_V2'] = (
-        df[f'rolling_S_{n_games}_Home'] *
-        (1 + df['Away_Defensive_Vulnerability'].clip(-0.5, 0.5) * 0.3)
-    )
-    df['Expected_Shots_Away_V2'] = (
-        df[f'rolling_S_{n_games}_Away'] *
-        (1 + df['Home_Defensive_Vulnerability'].clip(-0.5, 0.5) * 0.3)
-    )
+    df['Expected_Shots_Home_V2'] = expected_shots_v2(df[f'rolling_S_{n_games}_Home'], df['Away_Defensive_Vulnerability'])
+    df['Expected_Shots_Away_V2'] = expected_shots_v2(df[f'rolling_S_{n_games}_Away'], df['Home_Defensive_Vulnerability'])
     
     # ============ MEJORA #3: POSSESSION PROXY (Estimación de Posesión) ============
     # Sin datos de posesión, usar tiros + corners como proxy
@@ -640,82 +625,58 @@ def get_rolling_stats(df, n_games=5):
     )
     
     # 2. Possession from EWM (usando media móvil)
-    df['Home_Possession_EWM'] = (
-        df[f'rolling_S_{n_games}_Home'] / (df[f'rolling_S_{n_games}_Home'] + df[f'rolling_S_{n_games}_Away'] + 0.1) * 100
-    )
-    df['Away_Possession_EWM'] = (
-        df[f'rolling_S_{n_games}_Away'] / (df[f'rolling_S_{n_games}_Home'] + df[f'rolling_S_{n_games}_Away'] + 0.1) * 100
-    )
+    df['Home_Possession_EWM'] = possession_ewm(df[f'rolling_S_{n_games}_Home'], df[f'rolling_S_{n_games}_Away'])
+    df['Away_Possession_EWM'] = possession_ewm(df[f'rolling_S_{n_games}_Away'], df[f'rolling_S_{n_games}_Home'])
     
     # 3. Expected Shots CON Possession
     # Equipos con 60%+ posesión deberían tirar más
-    df['Expected_Shots_Home_With_Possession'] = (
-        df['Expected_Shots_Home_V2'] *
-        (1 + (df['Home_Possession_EWM'] - 50) / 100)
-    )
-    df['Expected_Shots_Away_With_Possession'] = (
-        df['Expected_Shots_Away_V2'] *
-        (1 + (df['Away_Possession_EWM'] - 50) / 100)
-    )
+    df['Expected_Shots_Home_With_Possession'] = with_possession(df['Expected_Shots_Home_V2'], df['Home_Possession_EWM'])
+    df['Expected_Shots_Away_With_Possession'] = with_possession(df['Expected_Shots_Away_V2'], df['Away_Possession_EWM'])
     
     # 4. Expected Shot Accuracy CON Possession
     # A más posesión, mejor coordinación = mejor precisión esperada
-    df['Expected_ST_Home_Possession'] = (
-        df['Expected_Shots_Home_With_Possession'] * 
-        df['Home_Shot_Accuracy'] *
-        (1 + (df['Home_Possession_EWM'] - 50) / 200)  # Bonus pequeño por posesión
-    )
-    df['Expected_ST_Away_Possession'] = (
-        df['Expected_Shots_Away_With_Possession'] * 
-        df['Away_Shot_Accuracy'] *
-        (1 + (df['Away_Possession_EWM'] - 50) / 200)
-    )
+    df['Expected_ST_Home_Possession'] = expected_st_possession(
+        df['Expected_Shots_Home_With_Possession'], df['Home_Shot_Accuracy'], df['Home_Possession_EWM'])
+    df['Expected_ST_Away_Possession'] = expected_st_possession(
+        df['Expected_Shots_Away_With_Possession'], df['Away_Shot_Accuracy'], df['Away_Possession_EWM'])
     
     # ============ MEJORA #2c: POSESIÓN REAL OVERWRITE ============
     # Si tenemos posesión real (CL), usarla en vez del proxy para Expected Shots
     poss_home_real = df['rolling_Poss_Home'].notna()
     if poss_home_real.any():
-        df.loc[poss_home_real, 'Expected_Shots_Home_With_Possession'] = (
-            df.loc[poss_home_real, 'Expected_Shots_Home_V2'] *
-            (1 + (df.loc[poss_home_real, 'rolling_Poss_Home'] - 50) / 100)
-        )
+        df.loc[poss_home_real, 'Expected_Shots_Home_With_Possession'] = with_possession(
+            df.loc[poss_home_real, 'Expected_Shots_Home_V2'], df.loc[poss_home_real, 'rolling_Poss_Home'])
     poss_away_real = df['rolling_Poss_Away'].notna()
     if poss_away_real.any():
-        df.loc[poss_away_real, 'Expected_Shots_Away_With_Possession'] = (
-            df.loc[poss_away_real, 'Expected_Shots_Away_V2'] *
-            (1 + (df.loc[poss_away_real, 'rolling_Poss_Away'] - 50) / 100)
-        )
+        df.loc[poss_away_real, 'Expected_Shots_Away_With_Possession'] = with_possession(
+            df.loc[poss_away_real, 'Expected_Shots_Away_V2'], df.loc[poss_away_real, 'rolling_Poss_Away'])
 
     # ============ MEJORA SHOTS #4: ESTIMACIONES DIRECTAS SoT ============
     # Predicción directa de remates a puerta usando precisión por rol
     # Direct_SoT = tiros_esperados_por_rol × tasa_precision_historica
-    df['Direct_SoT_Home'] = (
-        df[f'rolling_S_{n_games}_Role_Home'] * df['EWM_SoT_Rate_Home']
-    ).fillna(df[f'rolling_ST_{n_games}_Role_Home'])
-    df['Direct_SoT_Away'] = (
-        df[f'rolling_S_{n_games}_Role_Away'] * df['EWM_SoT_Rate_Away']
-    ).fillna(df[f'rolling_ST_{n_games}_Role_Away'])
+    df['Direct_SoT_Home'] = direct_sot(df[f'rolling_S_{n_games}_Role_Home'], df['EWM_SoT_Rate_Home'],
+                                       df[f'rolling_ST_{n_games}_Role_Home'])
+    df['Direct_SoT_Away'] = direct_sot(df[f'rolling_S_{n_games}_Role_Away'], df['EWM_SoT_Rate_Away'],
+                                       df[f'rolling_ST_{n_games}_Role_Away'])
 
     # SoT esperados contra el RIVAL ACTUAL (cruce ofensiva × permisividad defensiva rival)
     # ¿Cuántos SoT deja pasar el rival? × ¿Cuántos tiros produzco yo?
-    df['Cross_SoT_Home'] = (
-        df[f'rolling_S_{n_games}_Role_Home'] * df['EWM_OppSoT_Rate_Away']
-    ).fillna(df['Direct_SoT_Home'])
-    df['Cross_SoT_Away'] = (
-        df[f'rolling_S_{n_games}_Role_Away'] * df['EWM_OppSoT_Rate_Home']
-    ).fillna(df['Direct_SoT_Away'])
+    df['Cross_SoT_Home'] = cross_sot(df[f'rolling_S_{n_games}_Role_Home'], df['EWM_OppSoT_Rate_Away'],
+                                     df['Direct_SoT_Home'])
+    df['Cross_SoT_Away'] = cross_sot(df[f'rolling_S_{n_games}_Role_Away'], df['EWM_OppSoT_Rate_Home'],
+                                     df['Direct_SoT_Away'])
 
     # Estimación SoT final: promedio de ambas perspectivas (propio + rival)
-    df['SoT_Expectancy_Home'] = (df['Direct_SoT_Home'] * 0.6 + df['Cross_SoT_Home'] * 0.4)
-    df['SoT_Expectancy_Away'] = (df['Direct_SoT_Away'] * 0.6 + df['Cross_SoT_Away'] * 0.4)
+    df['SoT_Expectancy_Home'] = sot_expectancy(df['Direct_SoT_Home'], df['Cross_SoT_Home'])
+    df['SoT_Expectancy_Away'] = sot_expectancy(df['Direct_SoT_Away'], df['Cross_SoT_Away'])
 
     # SoT concedidos esperados: qué tantos SoT recibirá cada equipo
     df['Conceded_SoT_Home'] = df['EWM_OppST_Role_Home']
     df['Conceded_SoT_Away'] = df['EWM_OppST_Role_Away']
 
     # Ratio SoT propios vs concedidos (>1 = equipo domina; <1 = equipo es dominado)
-    df['SoT_Dominance_Home'] = df['SoT_Expectancy_Home'] / (df['Conceded_SoT_Home'] + 0.1)
-    df['SoT_Dominance_Away'] = df['SoT_Expectancy_Away'] / (df['Conceded_SoT_Away'] + 0.1)
+    df['SoT_Dominance_Home'] = sot_dominance(df['SoT_Expectancy_Home'], df['Conceded_SoT_Home'])
+    df['SoT_Dominance_Away'] = sot_dominance(df['SoT_Expectancy_Away'], df['Conceded_SoT_Away'])
 
     # Fast EWM cruzado (respuesta rápida para cambios de forma reciente)
     df['Fast_SoT_Home'] = df['EWM_ST_Fast_Home']
@@ -725,7 +686,14 @@ def get_rolling_stats(df, n_games=5):
 
     return df
 
-if __name__ == "__main__":
+def build_dataset(output_path='data/dataset_final.csv'):
+    """
+    Genera dataset_final.csv (y su estado de serving) desde los CSV de liga.
+    Se puede llamar en proceso (main.py) o como script.
+
+    Returns:
+        pd.DataFrame: el dataset generado (también registrado en DATA_CACHE)
+    """
     # Transformar Champions League si es necesario
     print("[PREP] Verificando formato de Champions League...")
     try:
@@ -735,14 +703,12 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"[WARN] Champions League: {str(e)}")
     
-    path = os.path.join('data', '**', '*.csv')
     # CARGAR TODO para MEMORIA HISTÓRICA + EWM para SENSIBILIDAD ACTUAL
     # No filtramos por 25-26 porque queremos que el modelo vea:
     # - 3800+ partidos para entender patrones generales del fútbol
     # - EWM automáticamente ponderará MÁS los recientes, menos los antiguos
-    files = [f for f in glob.glob(path, recursive=True) 
-             if 'dataset_final.csv' not in f 
-             and 'champions_league_matches' not in f]  # Ignorar archivo original sin transformar
+    # (se ignoran dataset_final.csv y el CSV original de CL sin transformar)
+    files = source_files()
     
     print(f"[DATA] Cargando dataset completo (MEMORIA + EWM):")
     print(f"   Total de archivos: {len(files)}")
@@ -819,8 +785,23 @@ if __name__ == "__main__":
     # Limpieza de seguridad para el entrenamiento
     # Solo requerir columnas absolutamente críticas (resultados y cuotas)
     final_data = final_data.dropna(subset=['AvgH', 'AvgD', 'AvgA', 'FTHG', 'FTAG', 'FTR'])
-    final_data.to_csv('data/dataset_final.csv', index=False)
+    final_data.to_csv(output_path, index=False)
+    
+    # Estado de serving (agregados por equipo/liga/rol) ligado a este dataset
+    from serving_state import build_serving_state, save_serving_state
+    save_serving_state(build_serving_state(final_data, dataset_path=output_path))
+    print(f"[OK] Estado de serving guardado en data/serving_state.pkl")
     print(f"[OK] Dataset Multi-Año (EWM + Peso Temporal) generado:")
     print(f"   Total partidos: {len(final_data)}")
     print(f"   Rango: {final_data['Date'].min().date()} a {final_data['Date'].max().date()}")
-    print(f"   Equipos: {final_data['HomeTeam'].nunique()} unicos")
\ No newline at end of file
+    print(f"   Equipos: {final_data['HomeTeam'].nunique()} unicos")
+
+    # El dataset queda en memoria para las etapas siguientes del mismo proceso
+    from data_cache import DATA_CACHE
+    final_data = final_data.reset_index(drop=True)
+    DATA_CACHE.put(final_data, output_path)
+    return final_data
+
+
+if __name__ == "__main__":
+    build_dataset()
@@ -0,0 +1,256 @@
+"""
+Motor de matriz de marcadores (goles local x goles visitante).
+
+Para cada partido se construye la distribución conjunta truncada de goles
+(0..MAX_GOALS por equipo) con el modelo de Dixon-Coles: Poisson independiente
+para cada equipo más la corrección tau de los marcadores bajos (0-0, 1-0, 0-1,
+1-1), que el Poisson independiente infraestima/sobreestima. Todo el lote es un
+único tensor (n, MAX_GOALS+1, MAX_GOALS+1) y los mercados se derivan de él
+con productos matriciales, sin bucles por partido:
+
+    1X2, over/under de goles, ambos marcan (BTTS), marcador exacto, hándicap asiático
+
+Las medias de goles de cada partido se obtienen de sus probabilidades 1X2
+finales: el total esperado es la media de goles de la liga (FTHG + FTAG del
+dataset) y la diferencia local-visitante se ajusta para que P(local) - P(visitante)
+del tensor coincida con la del modelo. rho se estima por máxima verosimilitud
+sobre los partidos del dataset (fit_goal_params, guardado en el estado de serving).
+"""
+
+import numpy as np
+from scipy.special import gammaln
+
+MAX_GOALS = 10
+DEFAULT_RHO = -0.10
+RHO_GRID = np.linspace(-0.25, 0.15, 81)
+GOAL_LINES = np.arange(0.5, 6.5)          # over/under de goles totales
+AH_LINES = np.arange(-3.0, 3.25, 0.5)     # hándicap del local (líneas enteras y .5)
+_MIN_LAMBDA = 0.05
+_SOLVER_STEPS = 40
+
+_aggregators = {}
+
+
+def _cell_maps(max_goals):
+    """
+    Matrices constantes (celdas, valores) que suman el tensor por total de
+    goles (0..2G) y por diferencia local-visitante (-G..G). Cacheadas por G.
+    """
+    maps = _aggregators.get(max_goals)
+    if maps is None:
+        g = np.arange(max_goals + 1)
+        total = (g[:, None] + g[None, :]).ravel()
+        diff = (g[:, None] - g[None, :]).ravel() + max_goals
+        size = 2 * max_goals + 1
+        maps = _aggregators[max_goals] = (
+            np.eye(size)[total],   # (celdas, 2G+1)
+            np.eye(size)[diff],    # (celdas, 2G+1)
+        )
+    return maps
+
+
+def dixon_coles_tau(lam_h, lam_a, rho):
+    """
+    Factores tau de Dixon-Coles para los marcadores 0-0, 0-1, 1-0 y 1-1.
+
+    Returns:
+        np.ndarray: (..., 2, 2) con tau[..., x, y] para x, y en {0, 1}
+    """
+    lam_h, lam_a, rho = np.broadcast_arrays(np.asarray(lam_h, dtype=float),
+                                            np.asarray(lam_a, dtype=float),
+                                            np.asarray(rho, dtype=float))
+    tau = np.empty(lam_h.shape + (2, 2))
+    tau[..., 0, 0] = 1 - lam_h * lam_a * rho
+    tau[..., 0, 1] = 1 + lam_h * rho
+    tau[..., 1, 0] = 1 + lam_a * rho
+    tau[..., 1, 1] = 1 - rho
+    return np.maximum(tau, 0)
+
+
+def score_matrix(lam_h, lam_a, rho=DEFAULT_RHO, max_goals=MAX_GOALS):
+    """
+    Distribución conjunta de goles de un lote de partidos.
+
+    Args:
+        lam_h, lam_a: Goles esperados del local / visitante, arrays (n,)
+        rho (float): Parámetro de dependencia de Dixon-Coles (0 = Poisson independiente)
+        max_goals (int): Goles máximos por equipo en la rejilla
+
+    Returns:
+        np.ndarray: (n, G+1, G+1) con P(local = i, visitante = j); cada matriz suma 1
+    """
+    lam_h = np.atleast_1d(np.asarray(lam_h, dtype=float))
+    lam_a = np.atleast_1d(np.asarray(lam_a, dtype=float))
+    g = np.arange(max_goals + 1)
+    log_fact = gammaln(g + 1)
+    pmf_h = np.exp(g * np.log(lam_h[:, None]) - lam_h[:, None] - log_fact)
+    pmf_a = np.exp(g * np.log(lam_a[:, None]) - lam_a[:, None] - log_fact)
+    matrix = pmf_h[:, :, None] * pmf_a[:, None, :]
+    matrix[:, :2, :2] *= dixon_coles_tau(lam_h, lam_a, rho)
+    # Renormaliza la masa que queda fuera de la rejilla truncada
+    return matrix / matrix.sum(axis=(1, 2), keepdims=True)
+
+
+def outcome_probs(matrix):
+    """Probabilidades 1X2 (n, 3) de un tensor de marcadores."""
+    n, size = matrix.shape[0], matrix.shape[1]
+    diff_pmf = matrix.reshape(n, -1) @ _cell_maps(size - 1)[1]
+    g = size - 1
+    return np.column_stack([diff_pmf[:, g + 1:].sum(axis=1), diff_pmf[:, g],
+                            diff_pmf[:, :g].sum(axis=1)])
+
+
+def expectancies_from_probs(p_home, p_away, total_goals, rho=DEFAULT_RHO, max_goals=MAX_GOALS):
+    """
+    Goles esperados (local, visitante) que reproducen P(local) - P(visitante)
+    con un total esperado dado. Bisección vectorizada sobre la diferencia de
+    goles (P(local) - P(visitante) crece con ella).
+
+    Args:
+        p_home, p_away: Probabilidades de victoria local / visitante, arrays (n,)
+        total_goals: Goles totales esperados por partido, array (n,) o escalar
+
+    Returns:
+        tuple: (lam_h, lam_a) arrays (n,)
+    """
+    target = np.asarray(p_home, dtype=float) - np.asarray(p_away, dtype=float)
+    total = np.broadcast_to(np.asarray(total_goals, dtype=float), target.shape)
+    bound = total - 2 * _MIN_LAMBDA
+    lo, hi = -bound, bound.copy()
+    for _ in range(_SOLVER_STEPS):
+        mid = (lo + hi) / 2
+        probs = outcome_probs(score_matrix((total + mid) / 2, (total - mid) / 2, rho, max_goals))
+        above = probs[:, 0] - probs[:, 2] > target
+        hi = np.where(above, mid, hi)
+        lo = np.where(above, lo, mid)
+    sup = (lo + hi) / 2
+    return (total + sup) / 2, (total - sup) / 2
+
+
+def fit_goal_params(df):
+    """
+    Parámetros del motor a partir de los resultados del dataset.
+
+    Args:
+        df: Dataset con Div, FTHG, FTAG y Market_Prob_H/A
+
+    Returns:
+        dict: {'total_goals': {liga: media de goles por partido},
+               'default_total': media global, 'rho': rho estimado}
+    """
+    goals = df[['Div', 'FTHG', 'FTAG']].dropna()
+    totals = goals['FTHG'] + goals['FTAG']
+    params = {
+        'total_goals': {str(div): float(v) for div, v in totals.groupby(goals['Div']).mean().items()},
+        'default_total': float(totals.mean()) if len(totals) else 2.6,
+        'rho': DEFAULT_RHO,
+    }
+
+    # rho por máxima verosimilitud: medias de cada partido desde el mercado
+    # (con Poisson independiente) y log-verosimilitud de tau sobre la rejilla RHO_GRID.
+    # El resto de la verosimilitud de Dixon-Coles no depende de rho.
+    hist = df.dropna(subset=['FTHG', 'FTAG', 'Market_Prob_H', 'Market_Prob_A'])
+    low = hist[(hist['FTHG'] <= 1) & (hist['FTAG'] <= 1)]
+    if len(low) >= 30:
+        total = low['Div'].map(params['total_goals']).fillna(params['default_total']).to_numpy(float)
+        lam_h, lam_a = expectancies_from_probs(low['Market_Prob_H'].to_numpy(float),
+                                               low['Market_Prob_A'].to_numpy(float), total, rho=0.0)
+        x, y = low['FTHG'].to_numpy(int), low['FTAG'].to_numpy(int)
+        tau = dixon_coles_tau(lam_h[None, :], lam_a[None, :], RHO_GRID[:, None])
+        cell = tau[:, np.arange(len(low)), x, y]
+        with np.errstate(divide='ignore'):
+            loglik = np.log(cell).sum(axis=1)
+        params['rho'] = float(RHO_GRID[np.argmax(loglik)])
+    return params
+
+
+def fixture_score_matrix(prob_1x2, leagues, params=None, max_goals=MAX_GOALS):
+    """
+    Tensor de marcadores de un lote a partir de sus probabilidades 1X2 finales.
+
+    Args:
+        prob_1x2: Probabilidades (n, 3) local/empate/visitante
+        leagues: Liga de cada partido (para el total de goles esperado)
+        params (dict, optional): fit_goal_params (por defecto rho y total genéricos)
+
+    Returns:
+        tuple: (matrix (n, G+1, G+1), lam_h (n,), lam_a (n,))
+    """
+    params = params or {'total_goals': {}, 'default_total': 2.6, 'rho': DEFAULT_RHO}
+    prob_1x2 = np.asarray(prob_1x2, dtype=float).reshape(-1, 3)
+    total = np.array([params['total_goals'].get(lg, params['default_total']) for lg in leagues],
+                     dtype=float)
+    lam_h, lam_a = expectancies_from_probs(prob_1x2[:, 0], prob_1x2[:, 2], total,
+                                           params['rho'], max_goals)
+    return score_matrix(lam_h, lam_a, params['rho'], max_goals), lam_h, lam_a
+
+
+def goal_markets(matrix, goal_lines=GOAL_LINES, ah_lines=AH_LINES, top_scores=3):
+    """
+    Mercados de goles derivados de un tensor de marcadores.
+
+    Args:
+        matrix: (n, G+1, G+1) de score_matrix
+        goal_lines: Líneas de over/under de goles totales
+        ah_lines: Hándicaps del local (-1.5 = el local parte con -1.5 goles);
+            el hándicap asiático del visitante es el simétrico
+        top_scores (int): Marcadores exactos más probables a devolver
+
+    Returns:
+        dict: 'outcome' (n, 3); 'over' (n, L) para goal_lines; 'btts' (n,);
+              'ah_win' / 'ah_push' / 'ah_lose' (n, H) del local para ah_lines;
+              'top_scores' (n, k, 2) goles y 'top_probs' (n, k)
+    """
+    n, size = matrix.shape[0], matrix.shape[1]
+    g = size - 1
+    to_total, to_diff = _cell_maps(g)
+    flat = matrix.reshape(n, -1)
+    total_pmf = flat @ to_total                    # P(total = t), t = 0..2G
+    diff_pmf = flat @ to_diff                      # P(local - visitante = d), d = -G..G
+
+    totals = np.arange(2 * g + 1)
+    goal_lines = np.asarray(goal_lines, dtype=float)
+    margin = np.arange(-g, g + 1)[:, None] + np.asarray(ah_lines, dtype=float)[None, :]
+
+    order = np.argsort(-flat, axis=1, kind='stable')[:, :top_scores]
+    return {
+        'outcome': np.column_stack([diff_pmf[:, g + 1:].sum(axis=1), diff_pmf[:, g],
+                                    diff_pmf[:, :g].sum(axis=1)]),
+        'goal_lines': goal_lines,
+        'over': total_pmf @ (totals[:, None] > goal_lines[None, :]),
+        'btts': matrix[:, 1:, 1:].sum(axis=(1, 2)),
+        'ah_lines': np.asarray(ah_lines, dtype=float),
+        'ah_win': diff_pmf @ (margin > 0),
+        'ah_push': diff_pmf @ (margin == 0),
+        'ah_lose': diff_pmf @ (margin < 0),
+        'top_scores': np.stack(np.divmod(order, size), axis=-1),
+        'top_probs': np.take_along_axis(flat, order, axis=1),
+    }
+
+
+def goal_fields(prob_1x2, leagues, params=None):
+    """
+    Campos de goles para los registros de predict_fixtures (un dict por partido).
+
+    Args:
+        prob_1x2: Probabilidades 1X2 finales (n, 3)
+        leagues: Liga de cada partido
+        params (dict, optional): fit_goal_params
+    """
+    matrix, lam_h, lam_a = fixture_score_matrix(prob_1x2, leagues, params)
+    markets = goal_markets(matrix, goal_lines=(1.5, 2.5, 3.5), ah_lines=(-1.5,), top_scores=1)
+    fields = []
+    for i in range(len(matrix)):
+        (hg, ag), = markets['top_scores'][i]
+        fields.append({
+            'Exp_Goals_Home': float(lam_h[i]), 'Exp_Goals_Away': float(lam_a[i]),
+            'P_Goals_Over_1.5': float(markets['over'][i, 0]),
+            'P_Goals_Over_2.5': float(markets['over'][i, 1]),
+            'P_Goals_Over_3.5': float(markets['over'][i, 2]),
+            'P_BTTS': float(markets['btts'][i]),
+            'P_AH_Home_-1.5': float(markets['ah_win'][i, 0]),
+            'P_AH_Away_+1.5': float(markets['ah_lose'][i, 0]),
+            'Top_Score': f'{hg}-{ag}',
+            'P_Top_Score': float(markets['top_probs'][i, 0]),
+        })
+    return fields
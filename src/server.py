@@ -0,0 +1,379 @@
+"""
+Servicio HTTP/JSON local de predicción (asyncio, solo librería estándar).
+
+Mantiene una PredictorSession residente (dataset, estado de serving y modelos
+cargados una vez) y atiende peticiones sin volver a arrancar Python.
+
+Endpoints:
+    GET  /health          Estado del servicio y de los artefactos cargados
+    GET  /metrics         Contadores y latencias (p50/p95/p99)
+    POST /reload          Fuerza la recarga de modelos y datos (sin cortar el servicio)
+    POST /predict         Un partido: {"HomeTeam", "AwayTeam", "AvgH", "AvgD", "AvgA", "Div"}
+    POST /predict/batch   Lista de partidos: [...] o {"fixtures": [...]}
+
+Uso:
+    python src/server.py --host 127.0.0.1 --port 8765
+    python src/server.py --workers 4      # varios procesos sobre el bundle compartido (mmap)
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from batch_predict import COLUMN_ALIASES, REQUIRED_COLUMNS
+from micro_batcher import MicroBatcher
+from predictor import WATCH_INTERVAL, PredictorSession
+from serving_bundle import BUNDLE_DIR, bundle_is_current, ensure_bundle
+from serving_state import dataset_fingerprint
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 1 << 20    # 1 MB por petición
+MAX_BATCH_SIZE = 1000       # partidos por /predict/batch
+LATENCY_WINDOW = 2048       # muestras para los percentiles de /metrics
+BATCH_MAX_ROWS = 32         # micro-batching: partidos por lote
+BATCH_MAX_WAIT_MS = 2.0     # micro-batching: espera máxima del primer partido
+
+
+class RequestError(Exception):
+    """Error de la petición del cliente (se responde con su status HTTP)."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def normalize_fixture(raw):
+    """
+    Valida un partido recibido por JSON y lo lleva al formato de predict_fixtures.
+    Acepta las mismas columnas (y alias) que batch_predict.py.
+
+    Raises:
+        RequestError: si faltan campos o las cuotas no son numéricas
+    """
+    if not isinstance(raw, dict):
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Cada partido debe ser un objeto JSON")
+    fixture = {COLUMN_ALIASES.get(k, k): v for k, v in raw.items()}
+    missing = [c for c in REQUIRED_COLUMNS if fixture.get(c) in (None, '')]
+    if missing:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Faltan campos: {', '.join(missing)}")
+    try:
+        odds = [float(fixture[c]) for c in ('AvgH', 'AvgD', 'AvgA')]
+    except (TypeError, ValueError):
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Las cuotas AvgH/AvgD/AvgA deben ser numéricas")
+    if min(odds) <= 1.0:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Las cuotas deben ser mayores que 1.0")
+    return {
+        'HomeTeam': str(fixture['HomeTeam']), 'AwayTeam': str(fixture['AwayTeam']),
+        'AvgH': odds[0], 'AvgD': odds[1], 'AvgA': odds[2],
+        'Div': fixture.get('Div'),
+    }
+
+
+def _json_safe(value):
+    """NaN/inf no son JSON válido: se envían como null."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_json_safe(v) for v in value]
+    return value
+
+
+class ServiceMetrics:
+    """Contadores por endpoint y ventana de latencias para /metrics."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.requests = {}
+        self.errors = {}
+        self.fixtures_predicted = 0
+        self.latencies_ms = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, route, status, elapsed_ms, n_fixtures=0):
+        self.requests[route] = self.requests.get(route, 0) + 1
+        if status >= 400:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        self.fixtures_predicted += n_fixtures
+        if route.startswith('POST /predict'):
+            self.latencies_ms.append(elapsed_ms)
+
+    def snapshot(self):
+        lat = sorted(self.latencies_ms)
+
+        def pct(p):
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))], 3) if lat else None
+
+        return {
+            'uptime_s': round(time.time() - self.started_at, 1),
+            'requests': dict(self.requests),
+            'errors': dict(self.errors),
+            'fixtures_predicted': self.fixtures_predicted,
+            'latency_ms': {'p50': pct(0.50), 'p95': pct(0.95), 'p99': pct(0.99),
+                           'samples': len(lat)},
+        }
+
+
+class PredictionService:
+    """
+    Servidor HTTP/1.1 mínimo sobre asyncio con conexiones keep-alive.
+    Las predicciones (CPU) se ejecutan en un hilo aparte para no bloquear el
+    bucle de eventos; un único hilo serializa el acceso a la sesión.
+    Las peticiones concurrentes se agrupan con un MicroBatcher (batch_max_rows=1
+    lo desactiva: cada petición es su propio lote).
+    """
+
+    def __init__(self, session, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 batch_max_rows=BATCH_MAX_ROWS, batch_max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.session = session
+        self.host = host
+        self.port = port
+        self.metrics = ServiceMetrics()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='predict')
+        self.batcher = MicroBatcher(self._predict_many, max_rows=batch_max_rows,
+                                    max_wait_ms=batch_max_wait_ms, executor=self.executor)
+        self.routes = {
+            ('GET', '/health'): self.handle_health,
+            ('GET', '/metrics'): self.handle_metrics,
+            ('POST', '/predict'): self.handle_predict,
+            ('POST', '/predict/batch'): self.handle_predict_batch,
+            ('POST', '/reload'): self.handle_reload,
+        }
+
+    # ── Endpoints ──────────────────────────────────────────────────────
+    async def handle_health(self, body):
+        session = self.session
+        return HTTPStatus.OK, {
+            'status': 'ok',
+            'pid': os.getpid(),
+            'bundle_version': session.bundle_version,
+            'models_version': session.version[0],
+            'loaded_at': session.loaded_at,
+            'reloads': session.reloads,
+            'last_reload_error': session.last_reload_error,
+            'dataset_rows': len(session.df),
+            'models': sorted(session.models),
+        }, 0
+
+    async def handle_metrics(self, body):
+        metrics = self.metrics.snapshot()
+        metrics['batcher'] = self.batcher.snapshot()
+        return HTTPStatus.OK, metrics, 0
+
+    async def handle_predict(self, body):
+        fixture = normalize_fixture(self._parse_json(body))
+        records = await self._predict([fixture])
+        record = records[0]
+        status = HTTPStatus.NOT_FOUND if record.get('Error') else HTTPStatus.OK
+        return status, record, 1
+
+    async def handle_predict_batch(self, body):
+        payload = self._parse_json(body)
+        if isinstance(payload, dict):
+            payload = payload.get('fixtures')
+        if not isinstance(payload, list):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Se espera una lista de partidos o {\"fixtures\": [...]}")
+        if len(payload) > MAX_BATCH_SIZE:
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                               f"Máximo {MAX_BATCH_SIZE} partidos por petición")
+        fixtures = [normalize_fixture(raw) for raw in payload]
+        records = await self._predict(fixtures) if fixtures else []
+        return HTTPStatus.OK, {'predictions': records}, len(records)
+
+    async def handle_reload(self, body):
+        # Se carga en un hilo aparte: las predicciones siguen con la versión actual
+        loop = asyncio.get_running_loop()
+        seconds = await loop.run_in_executor(None, self.session.reload)
+        return HTTPStatus.OK, {'status': 'reloaded', 'seconds': round(seconds, 3),
+                               'models_version': self.session.version[0]}, 0
+
+    async def _predict(self, fixtures):
+        return await self.batcher.submit(fixtures)
+
+    def _predict_many(self, fixtures):
+        return self.session.predict_many(fixtures)
+
+    @staticmethod
+    def _parse_json(body):
+        try:
+            return json.loads(body or b'null')
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "JSON inválido")
+
+    # ── HTTP ───────────────────────────────────────────────────────────
+    async def dispatch(self, method, path, body):
+        handler = self.routes.get((method, path))
+        if handler is None:
+            if any(p == path for _, p in self.routes):
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'Método no permitido'}, 0
+            return HTTPStatus.NOT_FOUND, {'error': f'Ruta desconocida: {path}'}, 0
+        try:
+            return await handler(body)
+        except RequestError as e:
+            return e.status, {'error': str(e)}, 0
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}, 0
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                t0 = time.perf_counter()
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                path = target.split('?', 1)[0]
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                # Sin un Content-Length válido no se puede leer el cuerpo: se cierra
+                if length < 0:
+                    status, payload, n = HTTPStatus.BAD_REQUEST, {'error': 'Content-Length inválido'}, 0
+                    keep_alive = False
+                elif length > MAX_BODY_BYTES:
+                    status, payload, n = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': 'Cuerpo demasiado grande'}, 0
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload, n = await self.dispatch(method, path, body)
+                    connection = headers.get('connection', '').lower()
+                    keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+                data = json.dumps(_json_safe(payload), ensure_ascii=False).encode('utf-8')
+                head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                        f"Content-Type: application/json; charset=utf-8\r\n"
+                        f"Content-Length: {len(data)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+                writer.write(head.encode('latin-1') + data)
+                await writer.drain()
+                self.metrics.record(f'{method} {path}', status.value,
+                                    (time.perf_counter() - t0) * 1000, n)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self, reuse_port=False):
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port,
+                                            reuse_port=reuse_port or None)
+        print(f"[OK] Servicio de predicción en http://{self.host}:{self.port} (pid {os.getpid()})")
+        async with server:
+            await server.serve_forever()
+
+
+def run_worker(args, bundle=None, reuse_port=False):
+    """Arranca un proceso de servicio (adjuntando el bundle si se indica)."""
+    t0 = time.perf_counter()
+    session = PredictorSession(bundle=bundle)
+    print(f"[INFO] Modelos y datos cargados en {time.perf_counter() - t0:.2f}s (pid {os.getpid()})")
+    if args.watch > 0:
+        session.start_watcher(args.watch)
+
+    service = PredictionService(session, host=args.host, port=args.port,
+                                batch_max_rows=args.batch_max_rows,
+                                batch_max_wait_ms=args.batch_max_wait_ms)
+    try:
+        asyncio.run(service.serve_forever(reuse_port=reuse_port))
+    except KeyboardInterrupt:
+        pass
+
+
+def maintain_bundle(bundle, interval, stop):
+    """
+    Republica el bundle cuando cambia el dataset (huella estable en dos
+    comprobaciones seguidas). Los workers detectan el nuevo CURRENT y se
+    recargan solos.
+    """
+    pending = None
+    while not stop.wait(interval):
+        fingerprint = dataset_fingerprint()
+        if bundle_is_current(bundle):
+            pending = None
+            continue
+        if fingerprint != pending:
+            pending = fingerprint
+            continue
+        try:
+            version = ensure_bundle(bundle)
+            print(f"[OK] Bundle de serving {version} publicado")
+        except Exception as e:
+            print(f"[WARN] No se pudo publicar el bundle: {e}")
+        pending = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de predicción")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--batch-max-rows', type=int, default=BATCH_MAX_ROWS,
+                        help="Partidos por lote del micro-batching (1 = desactivado)")
+    parser.add_argument('--batch-max-wait-ms', type=float, default=BATCH_MAX_WAIT_MS,
+                        help="Espera máxima antes de vaciar un lote incompleto")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Procesos de servicio; con más de 1 comparten el bundle mmap y el puerto")
+    parser.add_argument('--watch', type=float, default=WATCH_INTERVAL,
+                        help="Segundos entre comprobaciones de modelos/datos nuevos (0 = sin recarga automática)")
+    parser.add_argument('--bundle', default=None,
+                        help=f"Adjuntar el bundle de serving (p.ej. {BUNDLE_DIR}) en lugar de leer el CSV")
+    args = parser.parse_args(argv)
+
+    bundle = args.bundle
+    if args.workers > 1 and bundle is None:
+        bundle = BUNDLE_DIR
+    stop = threading.Event()
+    if bundle:
+        # El bundle se construye/valida una sola vez aquí; los workers solo lo adjuntan
+        version = ensure_bundle(bundle)
+        print(f"[INFO] Bundle de serving {version} en {bundle}")
+        if args.watch > 0:
+            threading.Thread(target=maintain_bundle, args=(bundle, args.watch, stop),
+                             name='bundle-publisher', daemon=True).start()
+
+    if args.workers <= 1 or os.name == 'nt':
+        if args.workers > 1:
+            # Windows no permite SO_REUSEPORT: un único proceso
+            print("[WARN] --workers requiere SO_REUSEPORT (Linux/macOS); se arranca un solo proceso")
+        run_worker(args, bundle=bundle)
+        stop.set()
+        print("\n[INFO] Servicio detenido")
+        return
+
+    ctx = multiprocessing.get_context('spawn')
+    workers = [ctx.Process(target=run_worker, args=(args, bundle, True), daemon=True)
+               for _ in range(args.workers)]
+    for w in workers:
+        w.start()
+    try:
+        for w in workers:
+            w.join()
+    except KeyboardInterrupt:
+        for w in workers:
+            w.terminate()
+    stop.set()
+    print("\n[INFO] Servicio detenido")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Bundle de serving compartido para despliegues con varios procesos.
+
+Guarda el dataset y el estado de serving en un directorio versionado con
+archivos .npy que los workers abren con mmap en solo lectura: todos los
+procesos comparten las mismas páginas del sistema operativo, así que cada
+worker extra apenas añade memoria y arranca sin parsear el CSV.
+
+Estructura:
+    data/serving_bundle/
+        CURRENT                 nombre de la versión activa (se cambia de forma atómica)
+        <version>/manifest.json columnas, dtypes, huella del dataset
+        <version>/float64.npy   bloque (filas, columnas) de columnas float64
+        <version>/int64.npy     bloque (filas, columnas) de columnas int64
+        <version>/date_<col>.npy fechas (datetime64 como int64)
+        <version>/str_<col>.npy códigos de columnas de texto (categorías en el manifest)
+        <version>/state_arrays.npy bytes de todos los arrays del estado (alineados a 64)
+        <version>/state.pkl     estructura del estado (dicts pequeños y referencias
+                                a state_arrays.npy; los arrays no van en el pickle)
+
+Las columnas de texto se adjuntan como Categorical sobre los códigos
+mapeados y los arrays del estado (agregados por rol, matriz de contextos,
+medias, historial) como vistas de state_arrays.npy: ningún worker copia
+tablas ni índices. pd.concat no copia los bloques mapeados: con pandas >= 3
+por copy-on-write y con versiones anteriores por copy=False.
+
+Uso:
+    python src/serving_bundle.py          # construye/actualiza el bundle desde dataset_final.csv
+"""
+
+import json
+import os
+import pickle
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from data_cache import DATA_CACHE
+from serving_state import (DATASET_PATH, STATE_VERSION, dataset_fingerprint,
+                           load_serving_state)
+
+BUNDLE_DIR = 'data/serving_bundle'
+BUNDLE_FORMAT = 2
+KEEP_VERSIONS = 2  # versiones anteriores que se conservan (workers aún adjuntos)
+STATE_ALIGN = 64   # alineación de cada array dentro de state_arrays.npy
+# pandas < 3 copia los bloques al concatenar salvo con copy=False; desde 3.0
+# (copy-on-write) nunca copia y el argumento está obsoleto
+_CONCAT_NO_COPY = {} if int(pd.__version__.split('.')[0]) >= 3 else {'copy': False}
+
+
+class _StatePickler(pickle.Pickler):
+    """
+    Pickler que saca los arrays del estado fuera del pickle: cada array
+    numérico (o de texto) se anota con su offset en un bloque de bytes y en
+    el pickle sólo queda la referencia (persistent_id).
+    """
+
+    def __init__(self, file):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.arrays = []   # (offset, array contiguo)
+        self.nbytes = 0
+        self._ids = {}     # id(array) -> referencia (un array compartido se guarda una vez)
+
+    def persistent_id(self, obj):
+        if not isinstance(obj, np.ndarray):
+            return None
+        ref = self._ids.get(id(obj))
+        if ref is not None:
+            return ref
+        data = obj
+        if data.dtype.hasobject:
+            # Arrays object de sólo texto (resultados, equipos, columnas) pasan a
+            # unicode de ancho fijo; con cualquier otro contenido van al pickle
+            if not all(isinstance(v, str) for v in data.flat):
+                return None
+            data = np.array(data.tolist(), dtype=str).reshape(obj.shape)
+        data = np.ascontiguousarray(data)
+        offset = -(-self.nbytes // STATE_ALIGN) * STATE_ALIGN
+        self.arrays.append((offset, data))
+        self.nbytes = offset + data.nbytes
+        ref = self._ids[id(obj)] = ('array', offset, data.dtype.str, data.shape)
+        return ref
+
+
+class _StateUnpickler(pickle.Unpickler):
+    """Resuelve las referencias de _StatePickler como vistas de solo lectura del bloque mapeado."""
+
+    def __init__(self, file, blob):
+        super().__init__(file)
+        self.blob = blob
+
+    def persistent_load(self, pid):
+        _, offset, dtype, shape = pid
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.blob, offset=offset)
+
+
+def _dump_state(state, directory):
+    """Escribe state.pkl (estructura) y state_arrays.npy (bytes de los arrays)."""
+    with open(os.path.join(directory, 'state.pkl'), 'wb') as f:
+        pickler = _StatePickler(f)
+        pickler.dump(state)
+    blob = np.lib.format.open_memmap(os.path.join(directory, 'state_arrays.npy'), mode='w+',
+                                     dtype=np.uint8, shape=(pickler.nbytes,))
+    for offset, data in pickler.arrays:
+        blob[offset:offset + data.nbytes] = data.reshape(-1).view(np.uint8)
+    blob.flush()
+    del blob
+
+
+def _load_state(directory):
+    """Carga el estado con sus arrays mapeados (mmap, solo lectura) desde state_arrays.npy."""
+    blob = np.load(os.path.join(directory, 'state_arrays.npy'), mmap_mode='r')
+    with open(os.path.join(directory, 'state.pkl'), 'rb') as f:
+        return _StateUnpickler(f, blob).load()
+
+
+def _codes_dtype(n_categories):
+    """Entero más pequeño para n categorías (el que usa pandas en Categorical, así no copia)."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def current_version(root=BUNDLE_DIR):
+    """Versión activa del bundle (None si no existe)."""
+    try:
+        with open(os.path.join(root, 'CURRENT'), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def read_manifest(root=BUNDLE_DIR, version=None):
+    version = version or current_version(root)
+    if version is None:
+        return None
+    try:
+        with open(os.path.join(root, version, 'manifest.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_bundle(df, state, root=BUNDLE_DIR, fingerprint=None):
+    """
+    Escribe una versión nueva del bundle y la publica en CURRENT.
+    La versión se escribe completa en un directorio temporal y se renombra;
+    CURRENT se sustituye al final con os.replace, así un lector nunca ve
+    una versión a medio escribir.
+
+    Args:
+        df: Dataset (Date en datetime), el mismo del que se construyó state
+        state: ServingState
+        root: Directorio raíz del bundle
+        fingerprint: Huella del CSV de origen (dataset_fingerprint)
+
+    Returns:
+        str: nombre de la versión publicada
+    """
+    os.makedirs(root, exist_ok=True)
+    version = time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}'
+    tmp_dir = os.path.join(root, f'.tmp-{version}')
+    os.makedirs(tmp_dir)
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'version': version,
+        'state_version': STATE_VERSION,
+        'fingerprint': list(fingerprint) if fingerprint else None,
+        'n_rows': len(df),
+        'columns': list(df.columns),
+        'blocks': [],
+        'dates': None,
+        'strings': {},
+    }
+
+    for kind in ('float64', 'int64'):
+        cols = [c for c in df.columns if df[c].dtype == np.dtype(kind)]
+        if cols:
+            np.save(os.path.join(tmp_dir, f'{kind}.npy'), np.ascontiguousarray(df[cols].to_numpy(dtype=kind)))
+            manifest['blocks'].append({'file': f'{kind}.npy', 'dtype': kind, 'columns': cols})
+
+    date_cols = [c for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])]
+    for col in date_cols:
+        values = df[col].to_numpy()
+        np.save(os.path.join(tmp_dir, f'date_{col}.npy'), values.view('int64'))
+        manifest['dates'] = manifest['dates'] or {}
+        manifest['dates'][col] = {'file': f'date_{col}.npy', 'dtype': str(values.dtype)}
+
+    handled = set(date_cols) | {c for b in manifest['blocks'] for c in b['columns']}
+    for col in df.columns:
+        if col in handled:
+            continue
+        codes, categories = pd.factorize(df[col], use_na_sentinel=True)
+        np.save(os.path.join(tmp_dir, f'str_{col}.npy'), codes.astype(_codes_dtype(len(categories))))
+        manifest['strings'][col] = {'file': f'str_{col}.npy', 'dtype': str(df[col].dtype),
+                                    'categories': [str(v) for v in categories]}
+
+    _dump_state(state, tmp_dir)
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    os.rename(tmp_dir, os.path.join(root, version))
+    pointer_tmp = os.path.join(root, f'.CURRENT-{version}')
+    with open(pointer_tmp, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(root, 'CURRENT'))
+    _prune_versions(root, keep={version})
+    return version
+
+
+def _prune_versions(root, keep):
+    """Borra versiones antiguas (conserva KEEP_VERSIONS además de la activa)."""
+    versions = sorted(d for d in os.listdir(root)
+                      if os.path.isdir(os.path.join(root, d)) and not d.startswith('.'))
+    old = [v for v in versions if v not in keep][:-KEEP_VERSIONS or None]
+    for v in old:
+        # En Windows un archivo mapeado no se puede borrar: se reintenta en la próxima versión
+        shutil.rmtree(os.path.join(root, v), ignore_errors=True)
+
+
+def attach_bundle(root=BUNDLE_DIR, version=None):
+    """
+    Adjunta un bundle en solo lectura (mmap). Los bloques numéricos del
+    DataFrame y los códigos de las columnas de texto (Categorical) apuntan
+    directamente a los archivos mapeados, igual que los arrays del estado;
+    las columnas quedan agrupadas por tipo (texto/fecha, int64, float64).
+
+    Returns:
+        tuple: (df, state, manifest)
+
+    Raises:
+        FileNotFoundError: si no hay bundle publicado
+    """
+    version = version or current_version(root)
+    manifest = read_manifest(root, version)
+    if manifest is None:
+        raise FileNotFoundError(f"No hay bundle de serving en {root}")
+    base = os.path.join(root, version)
+
+    text_cols = {}
+    for col, meta in manifest['strings'].items():
+        codes = np.load(os.path.join(base, meta['file']), mmap_mode='r')
+        categories = pd.Index(meta['categories'], dtype=meta['dtype'])
+        text_cols[col] = pd.Series(pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(categories),
+                                                             validate=False), copy=False)
+    for col, meta in (manifest['dates'] or {}).items():
+        values = np.load(os.path.join(base, meta['file']), mmap_mode='r')
+        text_cols[col] = pd.Series(values.view(meta['dtype']), copy=False)
+
+    ordered = [c for c in manifest['columns'] if c in text_cols]
+    parts = [pd.DataFrame({c: text_cols[c] for c in ordered}, copy=False)]
+    for block in manifest['blocks']:
+        values = np.load(os.path.join(base, block['file']), mmap_mode='r')
+        parts.append(pd.DataFrame(values, columns=block['columns'], copy=False))
+    df = pd.concat(parts, axis=1, **_CONCAT_NO_COPY)
+
+    state = _load_state(base)
+    return df, state, manifest
+
+
+def bundle_is_current(root=BUNDLE_DIR, dataset_path=DATASET_PATH):
+    """True si el bundle publicado corresponde al dataset y versión de estado actuales."""
+    manifest = read_manifest(root)
+    if manifest is None or manifest.get('format') != BUNDLE_FORMAT:
+        return False
+    fingerprint = dataset_fingerprint(dataset_path)
+    return (manifest.get('state_version') == STATE_VERSION and fingerprint is not None
+            and manifest.get('fingerprint') == list(fingerprint))
+
+
+def ensure_bundle(root=BUNDLE_DIR, dataset_path=DATASET_PATH):
+    """
+    Devuelve la versión activa del bundle, reconstruyéndolo desde el CSV
+    (y el estado de serving) si falta o está desfasado.
+    """
+    if bundle_is_current(root, dataset_path):
+        return current_version(root)
+    df = DATA_CACHE.get(dataset_path)
+    state = load_serving_state(df, dataset_path=dataset_path)
+    return write_bundle(df, state, root, fingerprint=dataset_fingerprint(dataset_path))
+
+
+if __name__ == "__main__":
+    t0 = time.perf_counter()
+    version = ensure_bundle()
+    print(f"[OK] Bundle de serving {version} en {BUNDLE_DIR} ({time.perf_counter() - t0:.2f}s)")
@@ -0,0 +1,496 @@
+"""
+Estado de serving precalculado a partir de dataset_final.csv.
+Se construye una vez al generar el dataset (preprocessor.py) y predict.py lo
+carga junto con los modelos, para no escanear el DataFrame completo en cada
+predicción.
+"""
+
+import os
+import threading
+import joblib
+import numpy as np
+from score_matrix import fit_goal_params
+from team_catalog import TeamCatalog
+from team_context import (FILL_COLS, NAME_ALIASES, RowLayout, TeamRow, numeric_column_mask,
+                          resolve_team_name, get_domestic_league, get_current_standings,
+                          domestic_team_names, domestic_league_modes, resolve_in_teams,
+                          domestic_league_in)
+
+DATASET_PATH = 'data/dataset_final.csv'
+SERVING_STATE_PATH = 'data/serving_state.pkl'
+
+# Se incrementa al añadir estructuras nuevas: fuerza reconstruir estados viejos
+STATE_VERSION = 10
+
+# Columnas reales por rol: (propias del equipo en ese rol)
+ROLE_STAT_COLS = {
+    True: {'shots': 'HS', 'shots_target': 'HST', 'corners': 'HC'},
+    False: {'shots': 'AS', 'shots_target': 'AST', 'corners': 'AC'},
+}
+
+
+def dataset_fingerprint(path=DATASET_PATH):
+    """
+    Huella barata del dataset (tamaño + mtime) para saber si el estado
+    guardado corresponde al CSV actual. None si el archivo no existe.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+def _nan_mean(sums, counts):
+    """Media por columna ignorando NaN (igual que pandas .mean())."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+class RoleAggregates:
+    """
+    Cubo de agregados por (equipo, liga, rol).
+
+    Para cada celda guarda:
+      - sumas y conteos (sin NaN) de tiros, tiros a puerta y corners
+      - sumas parciales por rival, para excluir un oponente restando su aporte
+      - un buffer con los últimos partidos (ventana de n_games + margen), para
+        las medias "últimos N" con exclusión de rival sin reordenar el dataset
+    """
+
+    STATS = ('shots', 'shots_target', 'corners')
+
+    def __init__(self, df, n_games=8):
+        self.n_games = n_games
+        self.cells = {}
+        self._build(df)
+
+    def _build(self, df):
+        for as_home in (True, False):
+            role_col, opp_col = ('HomeTeam', 'AwayTeam') if as_home else ('AwayTeam', 'HomeTeam')
+            cols = [ROLE_STAT_COLS[as_home][s] for s in self.STATS]
+            data = df[['Div', 'Date', role_col, opp_col] + cols].sort_values('Date', kind='mergesort')
+
+            for (div, team), group in data.groupby(['Div', role_col], sort=False):
+                vals = group[cols].to_numpy(dtype=float)
+                opps = group[opp_col].to_numpy()
+                valid = ~np.isnan(vals)
+                filled = np.where(valid, vals, 0.0)
+
+                # Sumas parciales por rival
+                opp_names, inv = np.unique(opps.astype(str), return_inverse=True)
+                opp_sums = np.zeros((len(opp_names), len(cols)))
+                opp_counts = np.zeros((len(opp_names), len(cols)))
+                np.add.at(opp_sums, inv, filled)
+                np.add.at(opp_counts, inv, valid)
+                opp_rows = np.bincount(inv, minlength=len(opp_names))
+
+                # Buffer final: con n_games + (máx. partidos contra un mismo rival)
+                # siempre quedan n_games partidos tras excluir a cualquier rival
+                tail_len = min(len(group), self.n_games + int(opp_rows.max()))
+                tail_vals = vals[-tail_len:]
+                window = tail_vals[-self.n_games:]
+                window_valid = ~np.isnan(window)
+
+                self.cells[(team, div, as_home)] = {
+                    'n': len(group),
+                    'sums': filled.sum(axis=0),
+                    'counts': valid.sum(axis=0),
+                    'opp_index': {name: i for i, name in enumerate(opp_names)},
+                    'opp_rows': opp_rows,
+                    'opp_sums': opp_sums,
+                    'opp_counts': opp_counts,
+                    'tail_opps': opps[-tail_len:].astype(str),
+                    'tail_vals': tail_vals,
+                    'window_mean': _nan_mean(np.where(window_valid, window, 0.0).sum(axis=0),
+                                             window_valid.sum(axis=0)),
+                    'window_n': len(window),
+                }
+
+    def history_stats(self, team_name, div, as_home=True, exclude_opponent=None):
+        """
+        Medias de todo el historial del equipo en (liga, rol).
+
+        Returns:
+            tuple: (dict {'shots', 'shots_target', 'corners'}, n) o None si no hay datos
+        """
+        cell = self.cells.get((team_name, div, as_home))
+        if cell is None:
+            return None
+
+        n, sums, counts = cell['n'], cell['sums'], cell['counts']
+        if exclude_opponent and exclude_opponent in cell['opp_index']:
+            i = cell['opp_index'][exclude_opponent]
+            n = n - cell['opp_rows'][i]
+            sums = sums - cell['opp_sums'][i]
+            counts = counts - cell['opp_counts'][i]
+
+        if n <= 0:
+            return None
+        return dict(zip(self.STATS, _nan_mean(sums, counts))), int(n)
+
+    def window_stats(self, team_name, div, as_home=True, n_games=None, exclude_opponent=None):
+        """
+        Medias de los últimos n_games partidos del equipo en (liga, rol).
+        n_games no puede superar el tamaño de ventana con el que se construyó.
+
+        Returns:
+            tuple: (dict {'shots', 'shots_target', 'corners'}, n) o None si no hay datos
+        """
+        n_games = self.n_games if n_games is None else n_games
+        cell = self.cells.get((team_name, div, as_home))
+        if cell is None:
+            return None
+
+        opps = cell['tail_opps']
+        excluded = bool(exclude_opponent) and exclude_opponent in cell['opp_index']
+        if n_games == self.n_games and not (excluded and (opps[-n_games:] == exclude_opponent).any()):
+            return dict(zip(self.STATS, cell['window_mean'])), cell['window_n']
+
+        vals = cell['tail_vals']
+        if excluded:
+            vals = vals[opps != exclude_opponent]
+        vals = vals[-n_games:]
+        if len(vals) == 0:
+            return None
+        valid = ~np.isnan(vals)
+        means = _nan_mean(np.where(valid, vals, 0.0).sum(axis=0), valid.sum(axis=0))
+        return dict(zip(self.STATS, means)), len(vals)
+
+
+class TeamMeans:
+    """
+    Tabla de medias por (equipo, rol) + medias globales para fill_missing_stats.
+    Los valores de relleno ya vienen resueltos (media del equipo, si es NaN la
+    global, si también es NaN 0.0), así rellenar una fila es un solo lookup.
+    """
+
+    def __init__(self, df, cols=FILL_COLS, domestic_teams=None):
+        self.cols = [c for c in cols if c in df.columns]
+        # Candidatos para resolver alias de equipos que no están en la tabla
+        self.domestic_teams = frozenset(domestic_team_names(df)) if domestic_teams is None else domestic_teams
+        self.cols_array = np.array(self.cols, dtype=object)
+
+        global_means = df[self.cols].mean().to_numpy(dtype=float)
+        self.global_fill = np.nan_to_num(global_means, nan=0.0)
+
+        self.index = {}
+        self.tables = {}
+        for as_home in (True, False):
+            role_col = 'HomeTeam' if as_home else 'AwayTeam'
+            table = df.groupby(role_col)[self.cols].mean()
+            team_means = table.to_numpy(dtype=float)
+            self.tables[as_home] = np.where(np.isnan(team_means), self.global_fill, team_means)
+            self.index[as_home] = {team: i for i, team in enumerate(table.index)}
+
+    def has_team(self, team_name, as_home=True):
+        return team_name in self.index[as_home]
+
+    def resolve(self, team_name):
+        """resolve_team_name sobre los equipos domésticos precalculados."""
+        return resolve_in_teams(team_name, self.domestic_teams)
+
+    def fill_values(self, team_name, as_home=True):
+        """Vector de relleno (alineado con self.cols) para el equipo en ese rol."""
+        i = self.index[as_home].get(team_name)
+        return self.global_fill if i is None else self.tables[as_home][i]
+
+
+class TeamContexts:
+    """
+    Última fila por (liga, equipo, rol) y por (equipo, rol), más los contextos
+    CL (70% CL + 30% doméstica) ya mezclados para todos los equipos con
+    partidos de Champions. Las filas se guardan como una matriz float64 de las
+    columnas numéricas (layout) y los índices apuntan a filas de esa matriz:
+    servir una fila es copiar un vector, sin tocar el DataFrame.
+    """
+
+    def __init__(self, df, domestic_teams=None):
+        # Candidatos para resolver alias de equipos sin fila propia
+        self.domestic_teams = frozenset(domestic_team_names(df)) if domestic_teams is None else domestic_teams
+        numeric_mask = numeric_column_mask(df)
+        bool_mask = (df.dtypes == bool).to_numpy()
+        columns = df.columns[numeric_mask | bool_mask]
+        self.layout = RowLayout(columns)
+        # Solo se mezclan las columnas numéricas (no los indicadores bool)
+        self.blend_mask = numeric_mask[numeric_mask | bool_mask]
+
+        # Orden estable por fecha: la última posición de cada grupo es la fila más reciente
+        positions = {}
+        order = np.argsort(df['Date'].to_numpy(), kind='mergesort')
+        divs = df['Div'].to_numpy()[order]
+        for as_home in (True, False):
+            role_col = 'HomeTeam' if as_home else 'AwayTeam'
+            teams = df[role_col].to_numpy()[order]
+            for (div, team), pos in zip(zip(divs, teams), order):
+                positions[(div, team, as_home)] = int(pos)
+                positions[(team, as_home)] = int(pos)
+
+        # Matriz con las filas referenciadas (cada fila del dataset una vez)
+        used = sorted(set(positions.values()))
+        row_of = {pos: i for i, pos in enumerate(used)}
+        values = df[list(columns)].iloc[used].to_numpy(dtype=np.float64)
+        self.latest = {k: row_of[p] for k, p in positions.items() if len(k) == 3}
+        self.latest_any = {k: row_of[p] for k, p in positions.items() if len(k) == 2}
+        self.cl_contexts = {}
+        self.values = self._build_cl_contexts(df, values)
+
+    def _build_cl_contexts(self, df, values):
+        blended = []
+        cl_keys = [(team, as_home) for (div, team, as_home) in self.latest if div == 'CL']
+        for team, as_home in cl_keys:
+            cl_i = self.latest[('CL', team, as_home)]
+            domestic_league = get_domestic_league(team, df)
+            dom_i = None
+            if domestic_league:
+                domestic_name = resolve_team_name(team, df)
+                dom_i = self.latest.get((domestic_league, domestic_name, as_home))
+                if dom_i is None and domestic_name != team:
+                    dom_i = self.latest.get((domestic_league, team, as_home))
+
+            if dom_i is None:
+                self.cl_contexts[(team, as_home)] = cl_i
+                continue
+            # Misma mezcla que blend_rows: solo donde ambos valores existen
+            row = values[cl_i].copy()
+            both = self.blend_mask & ~np.isnan(values[cl_i]) & ~np.isnan(values[dom_i])
+            row[both] = values[cl_i][both] * 0.7 + values[dom_i][both] * (1 - 0.7)
+            self.cl_contexts[(team, as_home)] = len(values) + len(blended)
+            blended.append(row)
+        if blended:
+            values = np.vstack([values, np.array(blended)])
+        return values
+
+    def resolve(self, team_name):
+        """resolve_team_name sobre los equipos domésticos precalculados."""
+        return resolve_in_teams(team_name, self.domestic_teams)
+
+    def row(self, i):
+        """TeamRow (copia, se puede rellenar) de la fila i."""
+        return TeamRow(self.values[i].copy(), self.layout)
+
+
+class MatchHistory:
+    """
+    Resultados de todos los partidos en arrays (fecha, goles, resultado) con
+    las posiciones de cada equipo por rol y de cada emparejamiento. Forma
+    reciente y H2H salen de gathers sobre estos arrays, con los mismos
+    resultados que get_recent_form y get_h2h sin filtrar el DataFrame.
+    """
+
+    def __init__(self, df):
+        n = len(df)
+        dates = df['Date']
+        # NaT queda como el mínimo int64: al ordenar descendente va al final
+        self.dates = dates.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        self.home_goals = df['FTHG'].to_numpy(dtype=float) if 'FTHG' in df else np.zeros(n)
+        self.away_goals = df['FTAG'].to_numpy(dtype=float) if 'FTAG' in df else np.zeros(n)
+        ftr = df['FTR'].to_numpy(dtype=object) if 'FTR' in df else np.full(n, np.nan, dtype=object)
+        self.result = np.array([r if isinstance(r, str) else '' for r in ftr], dtype=object)
+        self.valid = (df['FTR'].notna().to_numpy() if 'FTR' in df else np.zeros(n, dtype=bool)) \
+            & dates.notna().to_numpy()
+        self.home_teams = df['HomeTeam'].to_numpy(dtype=object)
+
+        self.home_rows, self.away_rows, self.pairs = {}, {}, {}
+        for pos, (home, away) in enumerate(zip(self.home_teams, df['AwayTeam'].to_numpy(dtype=object))):
+            self.home_rows.setdefault(home, []).append(pos)
+            self.away_rows.setdefault(away, []).append(pos)
+            self.pairs.setdefault((home, away), []).append(pos)
+        for table in (self.home_rows, self.away_rows, self.pairs):
+            for key, rows in table.items():
+                table[key] = np.array(rows, dtype=np.intp)
+
+    _EMPTY = np.array([], dtype=np.intp)
+
+    def recent_form(self, team_name, n=5):
+        """get_recent_form(df, team_name, n) sin escanear el dataset."""
+        home = self.home_rows.get(team_name, self._EMPTY)
+        away = self.away_rows.get(team_name, self._EMPTY)
+        home, away = home[self.valid[home]], away[self.valid[away]]
+        if len(home) + len(away) == 0:
+            return {
+                'form_points': 7.5, 'form_ratio': 0.5,
+                'form_goals_scored': 1.3, 'form_goals_conceded': 1.1,
+                'form_wins': 2, 'form_streak': 0
+            }
+
+        dates = np.concatenate([self.dates[home], self.dates[away]])
+        gf = np.concatenate([self.home_goals[home], self.away_goals[away]])
+        ga = np.concatenate([self.away_goals[home], self.home_goals[away]])
+        res = np.concatenate([self.result[home], self.result[away]])
+        pts = np.concatenate([np.where(res[:len(home)] == 'H', 3, 0), np.where(res[len(home):] == 'A', 3, 0)])
+        pts = np.where(res == 'D', 1, pts)
+        # Descendente estable (~x invierte el orden sin desbordar)
+        recent = np.argsort(~dates, kind='stable')[:n]
+        pts, gf, ga = pts[recent].tolist(), gf[recent].tolist(), ga[recent].tolist()
+
+        streak = 0
+        for p in pts:
+            if p != pts[0]:
+                break
+            streak += 1
+        if pts[0] == 0:
+            streak = -streak  # Racha negativa = derrotas
+
+        total_pts = sum(pts)
+        return {
+            'form_points': total_pts,
+            'form_ratio': total_pts / (n * 3),
+            'form_goals_scored': sum(gf) / len(pts),
+            'form_goals_conceded': sum(ga) / len(pts),
+            'form_wins': sum(1 for p in pts if p == 3),
+            'form_streak': streak
+        }
+
+    def h2h(self, team_a, team_b, n=10):
+        """get_h2h(df, team_a, team_b, n) sin escanear el dataset."""
+        names_a = {team_a, NAME_ALIASES[team_a]} if team_a in NAME_ALIASES else {team_a}
+        names_b = {team_b, NAME_ALIASES[team_b]} if team_b in NAME_ALIASES else {team_b}
+        rows = [self.pairs[key] for x in names_a for y in names_b
+                for key in ((x, y), (y, x)) if key in self.pairs]
+        if not rows:
+            return {
+                'h2h_matches': 0, 'h2h_wins_a': 0, 'h2h_wins_b': 0,
+                'h2h_draws': 0, 'h2h_goals_a': 1.2, 'h2h_goals_b': 1.2,
+                'h2h_advantage_a': 0.0
+            }
+        # Orden del dataset y después fecha descendente estable (como sort_values)
+        rows = np.unique(np.concatenate(rows))
+        rows = rows[np.argsort(~self.dates[rows], kind='stable')][:n]
+
+        wins_a = wins_b = draws = 0
+        goals_a, goals_b = [], []
+        for pos in rows:
+            ftr = self.result[pos]
+            hg, ag = self.home_goals[pos], self.away_goals[pos]
+            hg, ag = float(hg or 0), float(ag or 0)
+            if self.home_teams[pos] in names_a:
+                goals_a.append(hg)
+                goals_b.append(ag)
+                if ftr == 'H': wins_a += 1
+                elif ftr == 'A': wins_b += 1
+                else: draws += 1
+            else:
+                goals_a.append(ag)
+                goals_b.append(hg)
+                if ftr == 'A': wins_a += 1
+                elif ftr == 'H': wins_b += 1
+                else: draws += 1
+
+        total = len(rows)
+        return {
+            'h2h_matches': total,
+            'h2h_wins_a': wins_a,
+            'h2h_wins_b': wins_b,
+            'h2h_draws': draws,
+            'h2h_goals_a': np.mean(goals_a),
+            'h2h_goals_b': np.mean(goals_b),
+            'h2h_advantage_a': (wins_a - wins_b) / total
+        }
+
+
+class ServingState:
+    """
+    Contenedor de las estructuras precalculadas que usa predict.py.
+    Se identifica por la huella del dataset del que se construyó.
+    """
+
+    def __init__(self, df, fingerprint=None):
+        self.version = STATE_VERSION
+        self.fingerprint = fingerprint
+        # Equipos domésticos y su liga más frecuente: resolución de nombres
+        # nuevos (fuera del dataset) sin escanear df
+        self.domestic_teams = frozenset(domestic_team_names(df))
+        self.league_modes = domestic_league_modes(df)
+        self.role_aggregates = RoleAggregates(df)
+        self.fill_means = TeamMeans(df, domestic_teams=self.domestic_teams)
+        self.contexts = TeamContexts(df, domestic_teams=self.domestic_teams)
+        # Clasificación actual por liga (última temporada)
+        self.standings = {div: get_current_standings(df, div) for div in df['Div'].dropna().unique()}
+        # Alias y liga doméstica de todos los equipos del dataset
+        teams = set(df['HomeTeam'].dropna().unique()) | set(df['AwayTeam'].dropna().unique())
+        self.resolved_names = {team: resolve_in_teams(team, self.domestic_teams) for team in teams}
+        self.domestic_leagues = {team: get_domestic_league(team, df) for team in teams}
+        # Goles medios por liga y rho de Dixon-Coles (score_matrix.py)
+        self.goal_params = fit_goal_params(df)
+        # Equipos por liga con PJ, alias e índice de búsqueda (menús de main.py)
+        self.catalog = TeamCatalog(df)
+        # Resultados indexados por equipo y emparejamiento (forma reciente y H2H)
+        self.history = MatchHistory(df)
+        # Detección de liga cuando no se indica: liga más común como local
+        # (la primera alfabéticamente si empatan, como mode()[0]) y partidos CL
+        home_divs = df.groupby('HomeTeam')['Div'].value_counts()
+        self.home_leagues = {}
+        for (team, div), n in home_divs.items():
+            best = self.home_leagues.get(team)
+            if best is None or n > best[1] or (n == best[1] and div < best[0]):
+                self.home_leagues[team] = (div, n)
+        self.home_leagues = {team: div for team, (div, _) in self.home_leagues.items()}
+        cl = df[df['is_CL'] == 1] if 'is_CL' in df else df.iloc[:0]
+        self.cl_matches = (cl['HomeTeam'].value_counts().add(cl['AwayTeam'].value_counts(), fill_value=0)
+                           .astype(int).to_dict())
+
+    def resolve_name(self, team_name, df=None):
+        """resolve_team_name con la tabla precalculada (equipos nuevos: sobre los equipos domésticos)."""
+        if team_name in self.resolved_names:
+            return self.resolved_names[team_name]
+        return resolve_in_teams(team_name, self.domestic_teams)
+
+    def domestic_league(self, team_name, df=None):
+        """get_domestic_league con la tabla precalculada (equipos nuevos: sobre las ligas más frecuentes)."""
+        if team_name in self.domestic_leagues:
+            return self.domestic_leagues[team_name]
+        return domestic_league_in(team_name, self.domestic_teams, self.league_modes)
+
+    def recent_form(self, team_name, df, n=5):
+        """get_recent_form desde el historial indexado."""
+        return self.history.recent_form(team_name, n=n)
+
+    def h2h(self, team_a, team_b, df, n=10):
+        """get_h2h desde el historial indexado."""
+        return self.history.h2h(team_a, team_b, n=n)
+
+
+def build_serving_state(df, dataset_path=DATASET_PATH):
+    """Construye el estado de serving desde el dataset ya cargado (Date en datetime)."""
+    return ServingState(df, fingerprint=dataset_fingerprint(dataset_path))
+
+
+def save_serving_state(state, path=SERVING_STATE_PATH):
+    """
+    Guarda el estado de serving junto al dataset. Se escribe en un temporal y
+    se renombra: varios procesos (y los watchers de recarga) pueden guardarlo
+    a la vez y un lector nunca ve un pickle a medias.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.tmp-{os.getpid()}-{threading.get_ident()}'
+    try:
+        joblib.dump(state, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def load_serving_state(df, dataset_path=DATASET_PATH, path=SERVING_STATE_PATH):
+    """
+    Carga el estado de serving si corresponde al dataset actual.
+    Si falta o está desfasado (dataset regenerado), lo reconstruye desde df
+    y lo vuelve a guardar.
+    """
+    fingerprint = dataset_fingerprint(dataset_path)
+    if fingerprint is not None and os.path.exists(path):
+        try:
+            state = joblib.load(path)
+            if getattr(state, 'version', None) == STATE_VERSION and \
+               getattr(state, 'fingerprint', None) == fingerprint:
+                return state
+        except Exception as e:
+            print(f"[WARN] Estado de serving ilegible, se reconstruye: {e}")
+
+    state = ServingState(df, fingerprint=fingerprint)
+    try:
+        save_serving_state(state, path)
+    except Exception as e:
+        print(f"[WARN] No se pudo guardar el estado de serving: {e}")
+    return state
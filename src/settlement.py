@@ -0,0 +1,307 @@
+"""
+Liquidación de apuestas del log de predicciones contra los resultados reales.
+
+Las predicciones pendientes se cruzan con los CSV de liga (data/<Liga>/*.csv)
+por (local, visitante) con un join hash y, dentro de cada emparejamiento, por
+fecha: el partido es el primero jugado en la fecha de la predicción o en los
+SETTLE_WINDOW_DAYS días siguientes (la predicción se registra el día en que
+se hace, que puede ser anterior al partido). Del partido se toma el valor
+real del mercado (corners/tiros/a puerta/goles del equipo de la apuesta o
+del total) y se calculan Status, Result_Value y Payout de todo el log de una
+vez, sin recorrer filas en Python.
+
+Reglas (over):
+    valor > línea  -> Win   Payout = stake * (cuota - 1)
+    valor = línea  -> Push  Payout = 0 (líneas enteras: se devuelve el stake)
+    valor < línea  -> Loss  Payout = -stake
+"""
+
+import argparse
+import glob
+import os
+import sys
+import numpy as np
+import pandas as pd
+from team_context import NAME_ALIASES
+
+RESULTS_DIR = 'data'
+SETTLE_WINDOW_DAYS = 7
+
+RESULT_COLUMNS = ['HS', 'AS', 'HST', 'AST', 'HC', 'AC', 'FTHG', 'FTAG']
+
+# Mercado (prefijo de Event_Type, en minúsculas) -> columnas (local, visitante).
+# El orden importa: 'shots target' antes que 'shots'.
+EVENT_STATS = (
+    ('corners', ('HC', 'AC')),
+    ('shots target', ('HST', 'AST')),
+    ('shots_target', ('HST', 'AST')),
+    ('a puerta', ('HST', 'AST')),
+    ('shots', ('HS', 'AS')),
+    ('tiros', ('HS', 'AS')),
+    ('goals', ('FTHG', 'FTAG')),
+    ('goles', ('FTHG', 'FTAG')),
+)
+
+
+def _per_unique(values, fn):
+    """
+    Aplica fn (lista de str -> lista) una vez por valor distinto y lo expande
+    a todas las filas: el log repite mucho equipos y mercados.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object).fillna(''), use_na_sentinel=False)
+    return np.asarray(fn([str(u) for u in uniques]), dtype=object)[codes]
+
+
+def _alias_canon(aliases):
+    """
+    Nombre -> representante fijo de su grupo de alias. NAME_ALIASES va en
+    ambos sentidos ('Manchester City' <-> 'Man City'): aplicarlo tal cual
+    intercambia los nombres en vez de unificarlos.
+    """
+    groups = {}
+    for a, b in aliases.items():
+        merged = groups.get(a, {a}) | groups.get(b, {b})
+        for name in merged:
+            groups[name] = merged
+    return {name: min(group) for name, group in groups.items()}
+
+
+_ALIAS_CANON = _alias_canon(NAME_ALIASES)
+
+
+def _canon_names(names):
+    names = [n.strip() for n in names]
+    return [_ALIAS_CANON.get(n, n).casefold() for n in names]
+
+
+def _canon(names):
+    """Nombres de equipo normalizados para el join (alias del dataset, sin mayúsculas)."""
+    return _per_unique(names, _canon_names)
+
+
+def load_results(data_dir=RESULTS_DIR):
+    """
+    Resultados reales de todos los CSV de liga.
+
+    Returns:
+        pd.DataFrame: Date, HomeTeam, AwayTeam, Div y RESULT_COLUMNS, un partido por fila
+    """
+    files = [f for f in glob.glob(os.path.join(data_dir, '**', '*.csv'), recursive=True)
+             if 'dataset_final.csv' not in f and 'champions_league_matches' not in f]
+    frames = []
+    for f in files:
+        try:
+            temp = pd.read_csv(f, encoding='utf-8-sig')
+        except UnicodeDecodeError:
+            temp = pd.read_csv(f, encoding='latin-1')
+        if not {'Date', 'HomeTeam', 'AwayTeam'}.issubset(temp.columns):
+            continue
+        temp['Date'] = pd.to_datetime(temp['Date'], dayfirst=True, errors='coerce')
+        frames.append(temp.reindex(columns=['Date', 'HomeTeam', 'AwayTeam', 'Div'] + RESULT_COLUMNS))
+    if not frames:
+        return pd.DataFrame(columns=['Date', 'HomeTeam', 'AwayTeam', 'Div'] + RESULT_COLUMNS)
+    results = pd.concat(frames, ignore_index=True).dropna(subset=['Date', 'HomeTeam', 'AwayTeam'])
+    return results.drop_duplicates(subset=['Date', 'HomeTeam', 'AwayTeam'], keep='last')
+
+
+def match_results(predictions, results, window_days=SETTLE_WINDOW_DAYS):
+    """
+    Partido real de cada predicción (join por equipos + fecha hacia delante).
+
+    Args:
+        predictions: DataFrame con Date_Prediction, HomeTeam, AwayTeam
+        results: load_results()
+
+    Returns:
+        pd.DataFrame: alineado con predictions, columnas Match_Date y RESULT_COLUMNS (NaN sin partido)
+    """
+    left = pd.DataFrame({
+        'pos': np.arange(len(predictions)),
+        'Date': pd.to_datetime(predictions['Date_Prediction'], errors='coerce').to_numpy(),
+        'home': _canon(predictions['HomeTeam']),
+        'away': _canon(predictions['AwayTeam']),
+    }).dropna(subset=['Date'])
+    right = pd.DataFrame({
+        'Date': results['Date'].to_numpy(),
+        'Match_Date': results['Date'].to_numpy(),
+        'home': _canon(results['HomeTeam']),
+        'away': _canon(results['AwayTeam']),
+        **{c: pd.to_numeric(results[c], errors='coerce').to_numpy() for c in RESULT_COLUMNS},
+    })
+    if left.empty or right.empty:
+        return pd.DataFrame(np.nan, index=predictions.index, columns=['Match_Date'] + RESULT_COLUMNS)
+    joined = pd.merge_asof(left.sort_values('Date'), right.sort_values('Date'), on='Date',
+                           by=['home', 'away'], direction='forward',
+                           tolerance=pd.Timedelta(days=window_days))
+    joined = joined.set_index('pos').reindex(np.arange(len(predictions)))
+    joined.index = predictions.index
+    return joined[['Match_Date'] + RESULT_COLUMNS]
+
+
+def market_values(predictions, matched):
+    """
+    Valor real del mercado de cada predicción.
+
+    El mercado sale del prefijo de Event_Type ('Corners +4.5' -> corners) y el
+    equipo de 'Equipo: <nombre>' en Notes: si es el local o el visitante se
+    usa su valor; si no, el total del partido.
+
+    Returns:
+        np.ndarray: float (NaN si no hay partido o el mercado no se reconoce)
+    """
+    def _event_stat(events):
+        # Índice en EVENT_STATS del prefijo de cada mercado (-1 si no se reconoce)
+        events = [e.strip().casefold() for e in events]
+        return [next((k for k, (prefix, _) in enumerate(EVENT_STATS) if e.startswith(prefix)), -1)
+                for e in events]
+
+    def _bet_team(notes):
+        teams = [n.split('Equipo:', 1)[1] if 'Equipo:' in n else '' for n in notes]
+        return _canon_names(teams)
+
+    stat_idx = _per_unique(predictions['Event_Type'], _event_stat).astype(int)
+    team = _per_unique(predictions['Notes'], _bet_team)
+    is_home = team == _canon(predictions['HomeTeam'])
+    is_away = (team == _canon(predictions['AwayTeam'])) & ~is_home
+
+    value = np.full(len(predictions), np.nan)
+    for k, (_, (home_col, away_col)) in enumerate(EVENT_STATS):
+        mask = stat_idx == k
+        if not mask.any():
+            continue
+        home_v, away_v = matched[home_col].to_numpy(float), matched[away_col].to_numpy(float)
+        stat = np.where(is_home, home_v, np.where(is_away, away_v, home_v + away_v))
+        value[mask] = stat[mask]
+    return value
+
+
+def settle_frame(predictions, results, window_days=SETTLE_WINDOW_DAYS):
+    """
+    Liquida un DataFrame de predicciones (vectorizado).
+
+    Las filas sin partido conservan su Result_Value manual si lo tienen; las
+    que siguen sin valor quedan en Pending.
+
+    Returns:
+        pd.DataFrame: copia con Result_Value, Status y Payout actualizados
+    """
+    df = predictions.copy()
+    matched = match_results(df, results, window_days)
+    value = market_values(df, matched)
+    manual = pd.to_numeric(df['Result_Value'], errors='coerce').to_numpy(float)
+    value = np.where(np.isnan(value), manual, value)
+
+    line = pd.to_numeric(df['Over_Line'], errors='coerce').to_numpy(float)
+    stake = pd.to_numeric(df['Kelly_Amount'], errors='coerce').fillna(0).to_numpy(float)
+    odds = pd.to_numeric(df['Cuota'], errors='coerce').to_numpy(float)
+    known = ~np.isnan(value) & ~np.isnan(line)
+
+    status = np.select([known & (value > line), known & (value == line), known & (value < line)],
+                       ['Win', 'Push', 'Loss'], default='Pending')
+    payout = np.select([status == 'Win', status == 'Push', status == 'Loss'],
+                       [stake * (odds - 1), 0.0, -stake], default=np.nan)
+    df['Result_Value'] = np.where(known, value, np.nan)
+    df['Status'] = status
+    df['Payout'] = payout
+    return df
+
+
+def roi_summary(settled):
+    """
+    Resumen de las apuestas liquidadas (solo filas con stake > 0).
+
+    Returns:
+        dict: n, wins, losses, pushes, staked, profit, roi (fracción), hit_rate
+    """
+    done = settled[settled['Status'].isin(['Win', 'Loss', 'Push'])]
+    staked_mask = pd.to_numeric(done['Kelly_Amount'], errors='coerce').fillna(0) > 0
+    bets = done[staked_mask]
+    staked = float(pd.to_numeric(bets['Kelly_Amount']).sum())
+    profit = float(pd.to_numeric(bets['Payout']).sum())
+    decided = done[done['Status'] != 'Push']
+    return {
+        'n': int(len(done)),
+        'bets': int(len(bets)),
+        'wins': int((done['Status'] == 'Win').sum()),
+        'losses': int((done['Status'] == 'Loss').sum()),
+        'pushes': int((done['Status'] == 'Push').sum()),
+        'staked': staked,
+        'profit': profit,
+        'won': float(pd.to_numeric(bets.loc[bets['Status'] == 'Win', 'Payout']).sum()),
+        'lost': float(pd.to_numeric(bets.loc[bets['Status'] == 'Loss', 'Payout']).sum()),
+        'roi': profit / staked if staked > 0 else 0.0,
+        'hit_rate': float((decided['Status'] == 'Win').mean()) if len(decided) else 0.0,
+    }
+
+
+def settle_store(store, results=None, data_dir=RESULTS_DIR):
+    """
+    Liquida las predicciones pendientes de un LogStore y guarda solo las que cambian.
+
+    Returns:
+        int: predicciones liquidadas en esta pasada
+    """
+    pending = store.read('predictions', 'Status = ?', ('Pending',))
+    if pending.empty:
+        return 0
+    if results is None:
+        results = load_results(data_dir)
+    settled = settle_frame(pending, results)
+    changed = settled[settled['Status'] != 'Pending']
+    if not changed.empty:
+        store.update('predictions', changed['id'].tolist(), {
+            'Result_Value': changed['Result_Value'].tolist(),
+            'Status': changed['Status'].tolist(),
+            'Payout': changed['Payout'].tolist(),
+        })
+    return len(changed)
+
+
+def check_aliases():
+    """
+    Comprobación de regresión: cada par de alias se normaliza al mismo nombre
+    y una apuesta registrada con un nombre se liquida contra un CSV que usa
+    el otro (con el valor del equipo, no el total del partido).
+
+    Returns:
+        list: descripciones de los fallos (vacía si todo está bien)
+    """
+    failures = [f"{a!r} y {b!r} no se unifican" for a, b in NAME_ALIASES.items()
+                if _canon_names([a]) != _canon_names([b])]
+    for logged, played in (('Manchester City', 'Man City'), ('Man City', 'Manchester City')):
+        other = 'Manchester City' if logged == 'Man City' else 'Man City'
+        predictions = pd.DataFrame({
+            'Date_Prediction': ['2025-01-10'], 'HomeTeam': [logged], 'AwayTeam': ['Liverpool'],
+            'Event_Type': ['Corners +4.5'], 'Over_Line': [4.5], 'Notes': [f'Equipo: {other}'],
+            'Result_Value': [np.nan], 'Kelly_Amount': [1.0], 'Cuota': [1.9],
+        })
+        results = pd.DataFrame({
+            'Date': pd.to_datetime(['2025-01-12']), 'HomeTeam': [played], 'AwayTeam': ['Liverpool'],
+            'Div': ['E0'], 'HS': [12], 'AS': [9], 'HST': [5], 'AST': [3],
+            'HC': [7], 'AC': [3], 'FTHG': [2], 'FTAG': [1],
+        })
+        row = settle_frame(predictions, results).iloc[0]
+        if row['Status'] != 'Win' or row['Result_Value'] != 7:
+            failures.append(f"'{logged}' (log) vs '{played}' (CSV): {row['Status']} "
+                            f"con valor {row['Result_Value']} (esperado Win con 7)")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Liquidación de apuestas")
+    parser.add_argument('--check', action='store_true',
+                        help="Comprobar la normalización de alias con datos sintéticos")
+    args = parser.parse_args(argv)
+    if not args.check:
+        parser.print_help()
+        return 0
+    failures = check_aliases()
+    for failure in failures:
+        print(f"[ERROR] {failure}")
+    if not failures:
+        print("[OK] Alias de equipos normalizados en la liquidación")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
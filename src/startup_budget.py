@@ -0,0 +1,121 @@
+"""
+Presupuesto de arranque de los puntos de entrada.
+
+Cada entrada se importa en un proceso nuevo con `python -X importtime` y se
+comprueba:
+    - el tiempo de importación (mejor de varias ejecuciones) frente a su presupuesto
+    - que no haya cargado ninguna de sus dependencias pesadas prohibidas
+      (p. ej. el menú de main.py no debe pagar pandas ni xgboost: se importan
+      cuando se elige una opción que los usa)
+
+Uso:
+    python src/startup_budget.py            # todas las entradas
+    python src/startup_budget.py main --runs 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Módulo -> (presupuesto de importación en ms, módulos que no debe importar)
+ENTRY_POINTS = {
+    'main': (250, ('pandas', 'numpy', 'xgboost', 'scipy', 'sklearn')),
+    'pipeline': (50, ('pandas', 'numpy', 'xgboost', 'scipy')),
+    'log_analytics': (900, ('xgboost', 'scipy', 'sklearn')),
+    'batch_predict': (900, ('xgboost', 'scipy', 'sklearn')),
+    'model_registry': (150, ('pandas', 'xgboost', 'sklearn')),
+    'model_diagnostics': (900, ('matplotlib', 'xgboost')),
+    'predict': (1500, ('xgboost', 'sklearn', 'matplotlib')),
+}
+
+_SRC = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure(module):
+    """
+    Importa module en un intérprete nuevo.
+
+    Returns:
+        tuple: (ms de importación acumulados, {paquete importado por la entrada: ms})
+    """
+    env = dict(os.environ, PYTHONPATH=_SRC + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          capture_output=True, text=True, env=env, cwd=os.path.dirname(_SRC))
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'error')
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        try:
+            _, cumulative, name = line.split('|')
+            rows.append((int(cumulative) / 1000, name.rstrip()))
+        except ValueError:
+            continue  # cabecera
+    # -X importtime escribe cada módulo después de sus dependencias: el
+    # subárbol de la entrada son las líneas anteriores más indentadas
+    end = next(i for i in range(len(rows) - 1, -1, -1) if rows[i][1].strip() == module)
+    depth = len(rows[end][1]) - len(rows[end][1].lstrip())
+    total, packages = rows[end][0], {}
+    for ms, name in reversed(rows[:end]):
+        if len(name) - len(name.lstrip()) <= depth:
+            break
+        top = name.strip().split('.')[0]
+        packages[top] = max(packages.get(top, 0.0), ms)
+    return total, packages
+
+
+def check(module, runs=3):
+    """
+    Mide una entrada contra su presupuesto.
+
+    Returns:
+        dict: module, ms, budget, heaviest (3 paquetes más caros), forbidden (importados), ok
+    """
+    budget, banned = ENTRY_POINTS[module]
+    best, packages = None, {}
+    for _ in range(runs):
+        ms, found = measure(module)
+        if best is None or ms < best:
+            best, packages = ms, found
+    heaviest = sorted(((p, ms) for p, ms in packages.items() if p != module),
+                      key=lambda x: -x[1])[:3]
+    forbidden = [p for p in banned if p in packages]
+    return {
+        'module': module, 'ms': best, 'budget': budget, 'heaviest': heaviest,
+        'forbidden': forbidden, 'ok': best <= budget and not forbidden,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tiempo de arranque de los puntos de entrada")
+    parser.add_argument('modules', nargs='*', help=f"Entradas ({', '.join(ENTRY_POINTS)})")
+    parser.add_argument('--runs', type=int, default=3, help="Ejecuciones por entrada (se toma la mejor)")
+    args = parser.parse_args(argv)
+
+    modules = args.modules or list(ENTRY_POINTS)
+    unknown = [m for m in modules if m not in ENTRY_POINTS]
+    if unknown:
+        print(f"[ERROR] Entradas desconocidas: {', '.join(unknown)}")
+        return 1
+
+    failed = 0
+    for module in modules:
+        try:
+            r = check(module, runs=max(1, args.runs))
+        except RuntimeError as e:
+            print(f"[ERROR] {module}: {e}")
+            failed += 1
+            continue
+        tag = '[OK]' if r['ok'] else '[WARN]'
+        heaviest = ', '.join(f"{p} {ms:.0f}ms" for p, ms in r['heaviest'])
+        print(f"{tag} {module:18s} {r['ms']:7.0f} ms (presupuesto {r['budget']} ms)  {heaviest}")
+        if r['forbidden']:
+            print(f"      importa {', '.join(r['forbidden'])} al arrancar")
+        failed += not r['ok']
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Catálogo de equipos del dataset (equipo, liga, partidos jugados, alias).
+
+Se construye una vez por versión del dataset (forma parte del ServingState)
+con un par de groupby, en lugar de filtrar el DataFrame por cada liga y por
+cada equipo cada vez que se abre un menú. Incluye un índice de búsqueda:
+    - prefijo: nombres normalizados ordenados + bisect
+    - subcadena: índice de trigramas (intersección de candidatos y verificación)
+Los alias de NAME_ALIASES ('Manchester City' -> 'Man City') también se
+indexan y devuelven el nombre del dataset.
+"""
+
+import bisect
+import pandas as pd
+from team_context import NAME_ALIASES
+
+
+def _norm(text):
+    return str(text).strip().casefold()
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TeamCatalog:
+    """
+    Equipos por liga con su número de partidos y búsqueda indexada.
+
+    Args:
+        df: Dataset completo (Div, HomeTeam, AwayTeam)
+    """
+
+    def __init__(self, df):
+        matches = df[['Div', 'HomeTeam', 'AwayTeam']].dropna()
+        # Partidos por liga
+        self.leagues = {str(div): int(n) for div, n in matches['Div'].value_counts().sort_index().items()}
+
+        # PJ por (liga, equipo): apariciones como local + como visitante
+        played = pd.concat([
+            matches[['Div', 'HomeTeam']].set_axis(['Div', 'Team'], axis=1),
+            matches[['Div', 'AwayTeam']].set_axis(['Div', 'Team'], axis=1),
+        ]).groupby(['Div', 'Team']).size()
+        self.teams = {}
+        self.team_leagues = {}
+        for (div, team), n in played.items():
+            self.teams.setdefault(div, []).append((team, int(n)))
+            self.team_leagues.setdefault(team, {})[div] = int(n)
+        for div in self.teams:
+            self.teams[div].sort()
+
+        # Alias en ambos sentidos, solo hacia equipos que existen en el dataset
+        self.aliases = {}
+        for alias_from, alias_to in NAME_ALIASES.items():
+            if alias_to in self.team_leagues:
+                self.aliases.setdefault(alias_to, set()).add(alias_from)
+            if alias_from in self.team_leagues:
+                self.aliases.setdefault(alias_from, set()).add(alias_to)
+
+        # Entradas de búsqueda: (nombre normalizado, equipo del dataset)
+        entries = {(_norm(team), team) for team in self.team_leagues}
+        entries |= {(_norm(alias), team) for team, names in self.aliases.items() for alias in names}
+        self._entries = sorted(entries)
+        self._keys = [key for key, _ in self._entries]
+        self._trigram_index = {}
+        for i, key in enumerate(self._keys):
+            for gram in _trigrams(key):
+                self._trigram_index.setdefault(gram, []).append(i)
+
+    def league_teams(self, div):
+        """Lista ordenada de (equipo, partidos jugados) de una liga."""
+        return self.teams.get(div, [])
+
+    def played(self, team, div=None):
+        """Partidos del equipo en la liga div (o en todas si div es None)."""
+        leagues = self.team_leagues.get(team, {})
+        return leagues.get(div, 0) if div is not None else sum(leagues.values())
+
+    def search(self, query, league=None, limit=None):
+        """
+        Equipos cuyo nombre (o alias) contiene la búsqueda, sin distinguir
+        mayúsculas. Primero los que empiezan por ella, después el resto.
+
+        Args:
+            query (str): Texto a buscar
+            league (str, optional): Restringir a los equipos de una liga
+            limit (int, optional): Máximo de resultados
+
+        Returns:
+            list: Nombres de equipo del dataset (sin repetidos)
+        """
+        q = _norm(query)
+        if not q:
+            return []
+        # Prefijo: rango contiguo en las claves ordenadas
+        lo = bisect.bisect_left(self._keys, q)
+        hi = bisect.bisect_left(self._keys, q + '\uffff')
+        prefix = list(range(lo, hi))
+        # Subcadena: candidatos que contienen todos los trigramas de la búsqueda
+        if len(q) >= 3:
+            postings = sorted((self._trigram_index.get(g, []) for g in _trigrams(q)), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+        else:
+            candidates = range(len(self._keys))
+        inner = sorted(i for i in candidates if not lo <= i < hi and q in self._keys[i])
+
+        found = []
+        seen = set()
+        for i in prefix + inner:
+            team = self._entries[i][1]
+            if team in seen or (league is not None and league not in self.team_leagues[team]):
+                continue
+            seen.add(team)
+            found.append(team)
+            if limit is not None and len(found) >= limit:
+                break
+        return found
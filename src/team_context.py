@@ -92,37 +92,72 @@ TEAM_LEAGUE_MAP = {
 }
 
 
-def resolve_team_name(team_name, df):
+def domestic_team_names(df):
     """
-    Resuelve el nombre de un equipo CL al nombre que usa en la liga doméstica.
-    Busca tanto por alias directo como por coincidencia en el dataset.
-    
+    Equipos con partidos fuera de la Champions: los candidatos a los que
+    resolve_team_name traduce un nombre.
+
     Args:
-        team_name: Nombre del equipo (como aparece en CL)
         df: Dataset completo
-        
+
+    Returns:
+        set: Nombres de equipo de las ligas domésticas
+    """
+    dom_teams = df[df['Div'] != 'CL']
+    return set(dom_teams['HomeTeam'].unique()) | set(dom_teams['AwayTeam'].unique())
+
+
+def domestic_league_modes(df):
+    """
+    Liga doméstica más frecuente de cada equipo (local + visitante), como
+    team_matches['Div'].mode()[0] en get_domestic_league: si empatan, la
+    primera alfabéticamente.
+
+    Args:
+        df: Dataset completo
+
+    Returns:
+        dict: equipo -> código de liga
+    """
+    dom = df[df['Div'] != 'CL']
+    counts = pd.concat([
+        dom[['HomeTeam', 'Div']].set_axis(['Team', 'Div'], axis=1),
+        dom[['AwayTeam', 'Div']].set_axis(['Team', 'Div'], axis=1),
+    ]).groupby(['Team', 'Div']).size()
+    modes = {}
+    for (team, div), n in counts.items():
+        best = modes.get(team)
+        if best is None or n > best[1] or (n == best[1] and div < best[0]):
+            modes[team] = (div, n)
+    return {team: div for team, (div, _) in modes.items()}
+
+
+def resolve_in_teams(team_name, domestic_teams):
+    """
+    resolve_team_name sobre los equipos domésticos ya calculados
+    (domestic_team_names), sin tocar el dataset.
+
+    Args:
+        team_name: Nombre del equipo (como aparece en CL)
+        domestic_teams: Conjunto de equipos de las ligas domésticas
+
     Returns:
         str: Nombre doméstico del equipo (o el original si no hay alias)
     """
-    # 1. Alias directo
+    # 1. Alias directo (solo si el alias existe realmente en el dataset doméstico)
     if team_name in NAME_ALIASES:
         alias = NAME_ALIASES[team_name]
-        # Verificar que el alias existe realmente en el dataset doméstico
-        dom_teams = df[df['Div'] != 'CL']
-        all_teams = set(dom_teams['HomeTeam'].unique()) | set(dom_teams['AwayTeam'].unique())
-        if alias in all_teams:
+        if alias in domestic_teams:
             return alias
     
     # 2. Ya existe con su nombre actual
-    dom_teams = df[df['Div'] != 'CL']
-    all_teams = set(dom_teams['HomeTeam'].unique()) | set(dom_teams['AwayTeam'].unique())
-    if team_name in all_teams:
+    if team_name in domestic_teams:
         return team_name
     
     # 3. Búsqueda fuzzy: primera/última palabra
     team_lower = team_name.lower()
     words = team_lower.split()
-    for t in all_teams:
+    for t in domestic_teams:
         t_lower = t.lower()
         # Coincidencia parcial significativa
         if (len(words) > 0 and words[0] in t_lower and len(words[0]) > 3) or \
@@ -132,18 +167,23 @@ def resolve_team_name(team_name, df):
     return team_name  # sin alias encontrado
 
 
-def get_domestic_league(team_name, df=None):
+def resolve_team_name(team_name, df):
     """
-    Detecta la liga doméstica de un equipo.
-    Primero busca en el mapeo manual, luego auto-detecta del dataset.
+    Resuelve el nombre de un equipo CL al nombre que usa en la liga doméstica.
+    Busca tanto por alias directo como por coincidencia en el dataset.
     
     Args:
-        team_name: Nombre del equipo
-        df: Dataset completo (opcional, para auto-detección)
+        team_name: Nombre del equipo (como aparece en CL)
+        df: Dataset completo
         
     Returns:
-        str: Código de liga doméstica o None
+        str: Nombre doméstico del equipo (o el original si no hay alias)
     """
+    return resolve_in_teams(team_name, domestic_team_names(df))
+
+
+def _mapped_domestic_league(team_name):
+    """Liga doméstica según el mapeo manual (directo o por alias), o None."""
     # 1. Mapeo manual (incluye alias)
     if team_name in TEAM_LEAGUE_MAP:
         return TEAM_LEAGUE_MAP[team_name]
@@ -154,6 +194,41 @@ def get_domestic_league(team_name, df=None):
             return TEAM_LEAGUE_MAP[alias_to]
         if team_name == alias_to and alias_from in TEAM_LEAGUE_MAP:
             return TEAM_LEAGUE_MAP[alias_from]
+    return None
+
+
+def domestic_league_in(team_name, domestic_teams, league_modes):
+    """
+    get_domestic_league con los equipos domésticos (domestic_team_names) y
+    sus ligas (domestic_league_modes) ya calculados, sin tocar el dataset.
+    """
+    league = _mapped_domestic_league(team_name)
+    if league is not None:
+        return league
+    if team_name in league_modes:
+        return league_modes[team_name]
+    resolved = resolve_in_teams(team_name, domestic_teams)
+    if resolved != team_name:
+        return league_modes.get(resolved)
+    return None
+
+
+def get_domestic_league(team_name, df=None):
+    """
+    Detecta la liga doméstica de un equipo.
+    Primero busca en el mapeo manual, luego auto-detecta del dataset.
+    
+    Args:
+        team_name: Nombre del equipo
+        df: Dataset completo (opcional, para auto-detección)
+        
+    Returns:
+        str: Código de liga doméstica o None
+    """
+    # 1-2. Mapeo manual, directo o por alias
+    league = _mapped_domestic_league(team_name)
+    if league is not None:
+        return league
     
     # 3. Auto-detección del dataset
     if df is not None:
@@ -326,11 +401,107 @@ def get_h2h(df, team_a, team_b, n=10):
     }
 
 
-def get_team_data_with_context(df, team_name, as_home=True, match_league='CL'):
+def numeric_column_mask(df):
+    """
+    Máscara booleana (alineada con df.columns) de las columnas numéricas que
+    se pueden mezclar entre filas CL y domésticas (excluye bool y texto/fechas).
+    """
+    return np.array([
+        pd.api.types.is_numeric_dtype(dt) and not pd.api.types.is_bool_dtype(dt)
+        for dt in df.dtypes
+    ])
+
+
+def blend_rows(cl_row, domestic_row, numeric_mask, cl_weight=0.7):
+    """
+    Mezcla una fila CL con la fila doméstica del mismo equipo en una sola
+    operación numpy sobre el bloque numérico. Solo se mezclan las columnas
+    donde ambos valores existen; el resto conserva el valor CL.
+    """
+    blended_row = cl_row.copy()
+    num_pos = np.flatnonzero(numeric_mask)
+    cl_vals = cl_row.to_numpy()[num_pos].astype(float)
+    dom_vals = domestic_row.to_numpy()[num_pos].astype(float)
+    both = ~np.isnan(cl_vals) & ~np.isnan(dom_vals)
+    blended_row.iloc[num_pos[both]] = cl_vals[both] * cl_weight + dom_vals[both] * (1 - cl_weight)
+    return blended_row
+
+
+class RowLayout:
+    """
+    Columnas numéricas de las filas de equipo (orden fijo) con su índice
+    nombre -> posición. Las posiciones de cada conjunto de columnas pedido
+    (el de cada modelo, el de fill_missing_stats) se calculan una vez.
+    """
+
+    def __init__(self, columns):
+        self.columns = tuple(columns)
+        self.index = {col: i for i, col in enumerate(self.columns)}
+        self._positions = {}
+
+    def positions(self, cols):
+        """
+        Returns:
+            tuple: (posiciones en la fila, posiciones en cols) de las columnas presentes
+        """
+        cols = tuple(cols)
+        found = self._positions.get(cols)
+        if found is None:
+            pairs = [(self.index[col], i) for i, col in enumerate(cols) if col in self.index]
+            found = self._positions[cols] = (np.array([p for p, _ in pairs], dtype=np.intp),
+                                             np.array([i for _, i in pairs], dtype=np.intp))
+        return found
+
+
+class TeamRow:
+    """
+    Fila de un equipo para predecir: vector float64 propio + RowLayout
+    compartido. Es lo que devuelve get_team_data_with_context con contextos
+    precalculados; get/take son un lookup de diccionario y un gather de numpy.
+    """
+
+    __slots__ = ('values', 'layout')
+
+    def __init__(self, values, layout):
+        self.values = values
+        self.layout = layout
+
+    def get(self, col, default=None):
+        i = self.layout.index.get(col)
+        return default if i is None else self.values[i]
+
+    def take(self, cols):
+        """Valores de cols (NaN en las que la fila no tiene)."""
+        src, dst = self.layout.positions(cols)
+        out = np.full(len(cols), np.nan)
+        out[dst] = self.values[src]
+        return out
+
+
+def get_team_data_with_context(df, team_name, as_home=True, match_league='CL', contexts=None):
     """
     Obtiene datos de un equipo, mezclando Champions League + Liga Doméstica.
     Usa alias para encontrar equipos con nombres diferentes entre CL y liga doméstica.
+    contexts: TeamContexts precalculado (serving_state). Si se pasa, la última
+              fila de cada equipo y los contextos CL ya mezclados salen de
+              índices en lugar de filtrar y ordenar df, y se devuelve un
+              TeamRow (copia) en vez de una Serie.
     """
+    if contexts is not None:
+        if match_league == 'CL':
+            i = contexts.cl_contexts.get((team_name, as_home))
+            if i is not None:
+                return contexts.row(i)
+
+        i = contexts.latest.get((match_league, team_name, as_home))
+        if i is None:
+            i = contexts.latest_any.get((team_name, as_home))
+        if i is None:
+            domestic_name = contexts.resolve(team_name)
+            if domestic_name != team_name:
+                i = contexts.latest_any.get((domestic_name, as_home))
+        return contexts.row(i) if i is not None else None
+    
     role_col = 'HomeTeam' if as_home else 'AwayTeam'
     
     # Resolver alias para búsqueda doméstica
@@ -356,20 +527,8 @@ def get_team_data_with_context(df, team_name, as_home=True, match_league='CL'):
                 
                 if not domestic_data.empty:
                     domestic_row = domestic_data.sort_values('Date').iloc[-1]
-                    
                     # Mezclar: 70% CL + 30% Doméstica
-                    blended_row = cl_row.copy()
-                    for col in blended_row.index:
-                        try:
-                            cl_val = cl_row[col]
-                            dom_val = domestic_row[col] if col in domestic_row.index else None
-                            if pd.notna(cl_val) and pd.notna(dom_val):
-                                if isinstance(cl_val, (int, float, np.integer, np.floating)) and \
-                                   isinstance(dom_val, (int, float, np.integer, np.floating)):
-                                    blended_row[col] = cl_val * 0.7 + dom_val * 0.3
-                        except:
-                            pass
-                    return blended_row
+                    return blend_rows(cl_row, domestic_row, numeric_column_mask(df))
             
             return cl_row
     
@@ -392,11 +551,54 @@ def get_team_data_with_context(df, team_name, as_home=True, match_league='CL'):
     return None
 
 
-def get_cl_stats(df, team_name, as_home=True, exclude_opponent=None):
+def get_current_standings(df, league):
+    """
+    Calcula standings actuales desde los datos del dataset.
+    Usa solo la temporada más reciente (últimos 12 meses) de la liga.
+    
+    Returns:
+        dict: equipo -> {'position': int, 'points': int, 'gd': float}
+    """
+    league_df = df[df['Div'] == league].copy()
+    if league_df.empty:
+        return {}
+    # Usar solo la temporada más reciente (últimos 12 meses)
+    max_date = league_df['Date'].max()
+    season_start = max_date - pd.Timedelta(days=365)
+    league_df = league_df[league_df['Date'] >= season_start]
+    
+    teams = {}
+    for _, row in league_df.iterrows():
+        ht, at = row['HomeTeam'], row['AwayTeam']
+        hg, ag = row.get('FTHG', 0), row.get('FTAG', 0)
+        ftr = row.get('FTR', 'D')
+        for t in [ht, at]:
+            if t not in teams:
+                teams[t] = {'points': 0, 'gd': 0}
+        if ftr == 'H':
+            teams[ht]['points'] += 3
+        elif ftr == 'A':
+            teams[at]['points'] += 3
+        else:
+            teams[ht]['points'] += 1
+            teams[at]['points'] += 1
+        teams[ht]['gd'] += (hg - ag) if pd.notna(hg) else 0
+        teams[at]['gd'] += (ag - hg) if pd.notna(ag) else 0
+    
+    sorted_teams = sorted(teams.items(), key=lambda x: (-x[1]['points'], -x[1]['gd']))
+    standings = {}
+    for pos, (team, data) in enumerate(sorted_teams, 1):
+        standings[team] = {'position': pos, 'points': data['points'], 'gd': data['gd']}
+    return standings
+
+
+def get_cl_stats(df, team_name, as_home=True, exclude_opponent=None, aggregates=None):
     """
     Obtiene promedios REALES de un equipo en Champions League (home o away).
     Sirve para corregir la predicción del modelo en partidos CL.
     exclude_opponent: excluir partidos contra este rival (evita data leakage)
+    aggregates: RoleAggregates precalculado (serving_state). Si se pasa, las
+                medias salen de sumas parciales sin escanear df.
     
     Returns:
         dict: {
@@ -406,6 +608,18 @@ def get_cl_stats(df, team_name, as_home=True, exclude_opponent=None):
             'cl_n': número de partidos CL en ese rol
         } o None si no hay datos
     """
+    if aggregates is not None:
+        res = aggregates.history_stats(team_name, 'CL', as_home, exclude_opponent)
+        if res is None:
+            return None
+        means, n = res
+        return {
+            'cl_shots': means['shots'],
+            'cl_shots_target': means['shots_target'],
+            'cl_corners': means['corners'],
+            'cl_n': n
+        }
+
     cl_data = df[df['Div'] == 'CL']
     
     if as_home:
@@ -430,16 +644,30 @@ def get_cl_stats(df, team_name, as_home=True, exclude_opponent=None):
     }
 
 
-def get_league_role_stats(df, team_name, div, as_home=True, n_games=8, exclude_opponent=None):
+def get_league_role_stats(df, team_name, div, as_home=True, n_games=8, exclude_opponent=None,
+                          aggregates=None):
     """
     Obtiene promedios REALES de un equipo en su liga doméstica por rol (home/away).
     Útil para corregir el modelo cuando sus rolling features mezclan competiciones
     (ej: Bayern tiene CL + Bundesliga en su rolling_ST, pero para un partido de
     Bundesliga solo nos interesa el rendimiento en Bundesliga as away).
+    aggregates: RoleAggregates precalculado (usa su ventana si n_games cabe en ella)
 
     Returns:
         dict: {'shots', 'shots_target', 'corners', 'n'} o None si no hay datos
     """
+    if aggregates is not None and n_games <= aggregates.n_games:
+        res = aggregates.window_stats(team_name, div, as_home, n_games, exclude_opponent)
+        if res is None:
+            return None
+        means, n = res
+        return {
+            'shots': means['shots'],
+            'shots_target': means['shots_target'],
+            'corners': means['corners'],
+            'n': n
+        }
+
     div_data = df[df['Div'] == div]
 
     if as_home:
@@ -465,21 +693,47 @@ def get_league_role_stats(df, team_name, div, as_home=True, n_games=8, exclude_o
     }
 
 
-def fill_missing_stats(row, df, team_name, as_home=True):
+# Columnas que fill_missing_stats rellena con promedios reales
+FILL_COLS = [
+    'Expected_Corners_Home', 'Expected_Corners_Away',
+    'Expected_Shots_Home', 'Expected_Shots_Away',
+    'Expected_ST_Home', 'Expected_ST_Away',
+    'Expected_Shots_Home_With_Possession', 'Expected_Shots_Away_With_Possession',
+    'Expected_ST_Home_Possession', 'Expected_ST_Away_Possession',
+    'Corner_Share_Home', 'Corner_Share_Away',
+    'Shot_Share_Home', 'Shot_Share_Away',
+    'HC', 'AC', 'HS', 'AS', 'HST', 'AST'
+]
+
+
+def fill_missing_stats(row, df, team_name, as_home=True, means=None):
     """
     Rellena valores NaN con promedios REALES del equipo del dataset.
     Nunca inventa números - solo usa datos que existen.
+    row: Serie o TeamRow (se rellena en el sitio y se devuelve)
+    means: TeamMeans precalculado (serving_state). Si se pasa, el relleno es
+           un lookup vectorizado en vez de calcular medias sobre df.
     """
-    cols_to_fill = [
-        'Expected_Corners_Home', 'Expected_Corners_Away',
-        'Expected_Shots_Home', 'Expected_Shots_Away',
-        'Expected_ST_Home', 'Expected_ST_Away',
-        'Expected_Shots_Home_With_Possession', 'Expected_Shots_Away_With_Possession',
-        'Expected_ST_Home_Possession', 'Expected_ST_Away_Possession',
-        'Corner_Share_Home', 'Corner_Share_Away',
-        'Shot_Share_Home', 'Shot_Share_Away',
-        'HC', 'AC', 'HS', 'AS', 'HST', 'AST'
-    ]
+    if means is not None:
+        # Equipo directo o, si no aparece en ese rol, su alias
+        name = team_name
+        if not means.has_team(team_name, as_home):
+            resolved = means.resolve(team_name)
+            if resolved != team_name:
+                name = resolved
+        
+        if isinstance(row, TeamRow):
+            src, dst = row.layout.positions(means.cols)
+            missing = np.isnan(row.values[src])
+            if missing.any():
+                row.values[src[missing]] = means.fill_values(name, as_home)[dst[missing]]
+            return row
+
+        missing = row[means.cols].isna().to_numpy()
+        if missing.any():
+            fill_vals = means.fill_values(name, as_home)
+            row[means.cols_array[missing]] = fill_vals[missing]
+        return row
     
     role_col = 'HomeTeam' if as_home else 'AwayTeam'
     
@@ -491,7 +745,7 @@ def fill_missing_stats(row, df, team_name, as_home=True):
         if resolved != team_name:
             team_data = df[df[role_col] == resolved]
     
-    for col in cols_to_fill:
+    for col in FILL_COLS:
         if col in row.index and pd.isna(row[col]):
             if col in team_data.columns and not team_data.empty:
                 avg_val = team_data[col].mean()
@@ -1,12 +1,24 @@
-import pandas as pd
 import xgboost as xgb
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, mean_absolute_error
-import joblib
-import os
+from model_registry import save_models
+from serving_state import dataset_fingerprint
+from data_cache import DATA_CACHE
 
-def train_dynamic_brain():
-    df = pd.read_csv('data/dataset_final.csv', low_memory=False).copy()
+def train_dynamic_brain(df=None):
+    """
+    Entrena y guarda los 8 modelos XGBoost.
+
+    Args:
+        df (pd.DataFrame, optional): Dataset ya cargado; por defecto el de
+            DATA_CACHE (no se vuelve a leer el CSV si ya está en memoria)
+
+    Returns:
+        str: versión de modelos guardada
+    """
+    if df is None:
+        df = DATA_CACHE.get('data/dataset_final.csv')
+    df = df.copy()
     
     # Limpieza estricta de NaNs para evitar errores de XGBoost
     df = df.dropna(subset=['HC', 'AC', 'HS', 'AS', 'HST', 'AST', 'FTR', 'AvgH'])
@@ -231,17 +243,14 @@ def train_dynamic_brain():
     m8.fit(X_tr_ast, y_tr_ast, sample_weight=w_tr_ast)
     print(f"Tiros a Puerta Visitante (AST) MAE: {mean_absolute_error(y_te_ast, m8.predict(X_te_ast)):.2f}")
 
-    # Guardar todos los modelos
-    os.makedirs('models', exist_ok=True)
-    joblib.dump(m1, 'models/result_model.pkl')
-    joblib.dump(m2, 'models/corners_model.pkl')
-    joblib.dump(m3, 'models/shots_total_model.pkl')
-    joblib.dump(m4, 'models/shots_target_model.pkl')
-    joblib.dump(m5, 'models/shots_home_model.pkl')
-    joblib.dump(m6, 'models/shots_away_model.pkl')
-    joblib.dump(m7, 'models/shots_target_home_model.pkl')
-    joblib.dump(m8, 'models/shots_target_away_model.pkl')
-    print("\n8 modelos entrenados y guardados.")
+    # Guardar todos los modelos en formato nativo XGBoost (escritura atómica +
+    # manifest al final, así un predictor en marcha solo recarga conjuntos completos)
+    version = save_models({
+        'result': m1, 'corners': m2, 'shots_total': m3, 'shots_target': m4,
+        'shots_home': m5, 'shots_away': m6, 'shots_target_home': m7, 'shots_target_away': m8,
+    }, data_fingerprint=dataset_fingerprint('data/dataset_final.csv'))
+    print(f"\n8 modelos entrenados y guardados (versión {version}).")
+    return version
 
 if __name__ == "__main__":
     train_dynamic_brain()
\ No newline at end of file